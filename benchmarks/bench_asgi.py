@@ -0,0 +1,134 @@
+"""
+bench_asgi.py
+
+Compares the WSGI (gunicorn) and ASGI (uvicorn) serving modes.
+
+Each mode is started as a real server on a local port with the same number
+of workers. While a few clients download a large table export over and
+over, many short-request clients poll the Tables partial; the benchmark
+reports how many short requests got through and their p50/p99 latency,
+i.e. how much the long exports starve everything else.
+
+    python -m benchmarks.bench_asgi --workers 2 --exporters 4 --pollers 32 --seconds 10
+"""
+
+import argparse
+import http.client
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from sqlflask.config import DB_PATH
+
+MODES = {
+    "wsgi": [sys.executable, "-m", "gunicorn", "-w", "{workers}", "-b", "127.0.0.1:{port}", "sqlflask.run:app"],
+    "asgi": [sys.executable, "-m", "uvicorn", "sqlflask.asgi:app", "--workers", "{workers}", "--port", "{port}", "--log-level", "warning"],
+}
+TABLE = "bench_asgi"
+
+
+def seed(rows):
+    # Requests without a session use db.sqlite in the data directory
+    db_path = DB_PATH.parent / "db.sqlite"
+    os.makedirs(db_path.parent, exist_ok=True)
+    with sqlite3.connect(db_path) as db:
+        db.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        db.execute(f"CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY, name TEXT, amount REAL)")
+        db.executemany(
+            f"INSERT INTO {TABLE} (name, amount) VALUES (?, ?)", ((f"row{i}", i * 0.5) for i in range(rows))
+        )
+
+
+def start(mode, workers, port):
+    command = [part.format(workers=workers, port=port) for part in MODES[mode]]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/metrics")
+            conn.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"{mode} server did not start: {' '.join(command)}")
+
+
+def client(port, path, headers, stop, results):
+    latencies, failures = [], 0
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            failures += 1
+    conn.close()
+    results.append((path, latencies, failures))
+
+
+def run(mode, workers, port, exporters, pollers, seconds):
+    server = start(mode, workers, port)
+    try:
+        stop, results = threading.Event(), []
+        jobs = [(f"/export/{TABLE}.csv", {})] * exporters + [("/tables/", {"HX-Request": "true"})] * pollers
+        threads = [threading.Thread(target=client, args=(port, path, headers, stop, results)) for path, headers in jobs]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {}
+    for kind, path in (("export", f"/export/{TABLE}.csv"), ("poll", "/tables/")):
+        latencies = sorted(lat for p, lats, _ in results if p == path for lat in lats)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+        report[kind] = {
+            "req_per_sec": len(latencies) / seconds,
+            "p50_ms": quantiles[49] * 1000,
+            "p99_ms": quantiles[98] * 1000,
+            "failed": sum(n for p, _, n in results if p == path),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--exporters", type=int, default=4, help="clients downloading the export in a loop")
+    parser.add_argument("--pollers", type=int, default=32, help="clients polling the Tables partial")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    print(f"{'mode':<6} {'kind':<7} {'req/sec':>10} {'p50 ms':>10} {'p99 ms':>10} {'failed':>8}")
+    for mode in args.modes:
+        report = run(mode, args.workers, args.port, args.exporters, args.pollers, args.seconds)
+        for kind, r in report.items():
+            print(f"{mode:<6} {kind:<7} {r['req_per_sec']:>10.1f} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {r['failed']:>8}")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
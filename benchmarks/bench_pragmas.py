@@ -0,0 +1,105 @@
+"""
+bench_pragmas.py
+
+Read/write concurrency benchmark for the PRAGMA profiles in config.py.
+
+For each profile a fresh database is seeded, then reader and writer threads
+(each with its own connection, like separate gunicorn workers) hammer it for
+a fixed duration. Reports operations per second, p99 latency and how many
+operations failed with "database is locked".
+
+    python -m benchmarks.bench_pragmas --readers 8 --writers 2 --seconds 5
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlflask.config import PRAGMA_PROFILES
+from sqlflask.pragmas import connect
+
+
+def seed(db_path, profile, rows):
+    conn = connect(db_path, profile=profile)
+    conn.execute("CREATE TABLE details (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO details (name) VALUES (?)", ((f"row{i}",) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def worker(db_path, profile, kind, rows, stop, results):
+    conn = connect(db_path, profile=profile)
+    # Without a busy_timeout in the profile, fail fast so lock errors are visible
+    if "busy_timeout" not in profile:
+        conn.execute("PRAGMA busy_timeout = 0")
+    latencies, locked = [], 0
+    i = 0
+    while not stop.is_set():
+        i += 1
+        started = time.perf_counter()
+        try:
+            if kind == "read":
+                conn.execute("SELECT count(*), max(name) FROM details WHERE id > ?", (i % rows,)).fetchone()
+            else:
+                conn.execute("INSERT INTO details (name) VALUES (?)", (f"w{i}",))
+                conn.commit()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+            if conn.in_transaction:
+                conn.rollback()
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    results.append((kind, latencies, locked))
+
+
+def run(profile_name, readers, writers, seconds, rows):
+    profile = PRAGMA_PROFILES[profile_name]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.sqlite")
+        seed(db_path, profile, rows)
+        stop, results = threading.Event(), []
+        threads = [
+            threading.Thread(target=worker, args=(db_path, profile, kind, rows, stop, results))
+            for kind in ["read"] * readers + ["write"] * writers
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+    report = {}
+    for kind in ("read", "write"):
+        latencies = [lat for k, lats, _ in results if k == kind for lat in lats]
+        locked = sum(n for k, _, n in results if k == kind)
+        p99 = statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) > 1 else 0.0
+        report[kind] = {"ops_per_sec": len(latencies) / seconds, "p99_ms": p99, "locked": locked}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--profiles", nargs="+", default=list(PRAGMA_PROFILES))
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'kind':<6} {'ops/sec':>10} {'p99 ms':>10} {'locked':>8}")
+    for name in args.profiles:
+        report = run(name, args.readers, args.writers, args.seconds, args.rows)
+        for kind, r in report.items():
+            print(f"{name:<12} {kind:<6} {r['ops_per_sec']:>10.0f} {r['p99_ms']:>10.2f} {r['locked']:>8}")
+
+
+if __name__ == "__main__":
+    main()
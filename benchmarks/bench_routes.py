@@ -0,0 +1,389 @@
+"""
+bench_routes.py
+
+Latency and throughput benchmark for every blueprint route.
+
+Synthetic databases of a configurable size are generated in a scratch data
+directory (SQLFLASK_DATA_DIR, so data/ is never touched). A fixed mix of
+scenarios - the read views, HTMX partials, query API, exports, imports,
+row writes and a create/rename/drop cycle for databases, tables, columns
+and indexes - is then driven either in process through the Flask test
+client or against a real gunicorn server by concurrent HTTP clients.
+
+For every route the benchmark reports requests per second, p50/p95/p99
+latency and failures, plus the peak RSS of the process(es) serving them.
+Each run is appended to benchmarks/results/routes.jsonl together with the
+commit it ran on, and the table shows the change in p95 against the
+previous run with the same parameters.
+
+    python -m benchmarks.bench_routes --modes client gunicorn --rows 10000 --iterations 50
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import random
+import re
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from http.client import HTTPConnection, HTTPException
+from http.cookies import SimpleCookie
+
+RESULTS = os.path.join(os.path.dirname(__file__), "results", "routes.jsonl")
+TYPES = ("INTEGER", "REAL", "TEXT")
+
+
+def generate(data_dir, databases, tables, columns, rows, seed=0):
+    """Create bench0.sqlite ... with tables t0 ... of (id, name, c0 ...) filled with random values."""
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    for d in range(databases):
+        path = os.path.join(data_dir, f"bench{d}.sqlite")
+        if os.path.exists(path):
+            os.remove(path)
+        with sqlite3.connect(path) as db:
+            db.execute("PRAGMA journal_mode = WAL")
+            for t in range(tables):
+                types = [TYPES[c % len(TYPES)] for c in range(columns)]
+                definition = ", ".join(f"c{c} {kind}" for c, kind in enumerate(types))
+                db.execute(f"CREATE TABLE t{t} (id INTEGER PRIMARY KEY, name TEXT, {definition})")
+
+                def values(kind):
+                    if kind == "INTEGER":
+                        return rng.randrange(1000)
+                    if kind == "REAL":
+                        return rng.random() * 1000
+                    return f"v{rng.randrange(10_000)}"
+
+                db.executemany(
+                    f"INSERT INTO t{t} (name, {', '.join(f'c{c}' for c in range(columns))}) "
+                    f"VALUES (?, {', '.join('?' * columns)})",
+                    ((f"row{i}", *(values(kind) for kind in types)) for i in range(rows)),
+                )
+
+
+class ClientSession:
+    """Requests through the Flask test client, in process."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, headers=None, files=None):
+        if files:
+            data = dict(data or {}, **{name: (io.BytesIO(body), filename) for name, (filename, body) in files.items()})
+        response = self.client.open(path, method=method, data=data, headers=headers)
+        body = response.get_data()
+        response.close()
+        return response.status_code, body
+
+
+class HttpSession:
+    """Requests over HTTP/1.1 keep-alive, carrying the session cookie."""
+
+    def __init__(self, port):
+        self.port = port
+        self.cookies = SimpleCookie()
+        self.conn = HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def request(self, method, path, data=None, headers=None, files=None):
+        headers = dict(headers or {})
+        body = None
+        if files:
+            boundary = uuid.uuid4().hex
+            parts = []
+            for name, value in (data or {}).items():
+                parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+            for name, (filename, content) in files.items():
+                parts.append(
+                    f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                    f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+                )
+            body = b"".join(parts) + f"--{boundary}--\r\n".encode()
+            headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={m.value}" for k, m in self.cookies.items())
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            content = response.read()
+        except (OSError, HTTPException):
+            self.conn.close()
+            self.conn = HTTPConnection("127.0.0.1", self.port, timeout=60)
+            return 0, b""
+        for cookie in response.headers.get_all("Set-Cookie") or []:
+            self.cookies.load(cookie)
+        return response.status, content
+
+
+def row_id(body, name):
+    """id of the listed row whose link or label is `name`, from a _rows.html fragment."""
+    match = re.search(rf'id="row-(\d+)">\s*<td>\s*(?:<a [^>]*>)?\s*{re.escape(name)}\s*[<\n]', body.decode())
+    return int(match.group(1)) if match else None
+
+
+def scenarios(rows, columns):
+    """(label, function(call, i)) pairs; call(label, method, path, **kwargs) returns (status, body)."""
+    hx = {"HX-Request": "true"}
+    csv = "name," + ",".join(f"c{c}" for c in range(columns)) + "\n"
+    csv += "".join(f"imported{i}," + ",".join(str(c) for c in range(columns)) + "\n" for i in range(100))
+    # Deletes take seeded rows from the top down so every delete hits a row
+    doomed = itertools.count(rows, -1)
+
+    def reads(call, i):
+        n = i % rows + 1
+        call("GET /", "GET", "/")
+        call("GET /favicon.ico", "GET", "/favicon.ico")
+        call("GET /databases/", "GET", "/databases/", headers=hx)
+        call("GET /tables/", "GET", "/tables/", headers=hx)
+        call("GET /tables/ (page)", "GET", "/tables/")
+        call("GET /tables/edit/<id>", "GET", "/tables/edit/0")
+        call("GET /columns/", "GET", "/columns/", headers=hx)
+        call("GET /columns/edit/<id>", "GET", "/columns/edit/1")
+        call("GET /columns/migration", "GET", "/columns/migration")
+        call("GET /relationships/", "GET", f"/relationships/?limit=100&id__ge={n}")
+        call("GET /relationships/edit/<id>", "GET", f"/relationships/edit/{n}")
+        call("GET /data-list/<table>", "GET", "/data-list/t0")
+        call("GET /data-list/<table> (next page)", "GET", f"/data-list/t0?after={n}&limit=100", headers=hx)
+        call("GET /data-entry/<table>", "GET", "/data-entry/t0")
+        call("GET /data-edit/<table>/<id>", "GET", f"/data-edit/t0/{n}")
+        call("GET /query/<table>", "GET", f"/query/t0?c0__lt={n % 1000}&sort=-id&limit=50&format=json")
+        call("GET /query/<table>/indexes", "GET", "/query/t0/indexes")
+        call("GET /indexes/", "GET", "/indexes/")
+        call("GET /import/<table>", "GET", "/import/t0")
+        call("GET /metrics", "GET", "/metrics")
+        call("GET /columns/select/<column>", "GET", "/columns/select/name")
+        call("GET /relationships/select/<id>", "GET", f"/relationships/select/{n}")
+        call("GET /tables/select/<table>", "GET", "/tables/select/t0")
+
+    def exports(call, i):
+        for fmt in ("csv", "ndjson", "parquet", "arrow"):
+            call(f"GET /export/<table>.{fmt}", "GET", f"/export/t1.{fmt}")
+        call("GET /data-list/<table> (stream)", "GET", "/data-list/t1?stream=1")
+
+    def writes(call, i):
+        values = {f"c{c}": str(i) for c in range(columns)}
+        call("POST /data-entry/<table>", "POST", "/data-entry/t0", data={"name": f"entry{i}", **values})
+        call("POST /data-delete/<table>/<id>", "POST", f"/data-delete/t0/{next(doomed)}")
+        call("POST /relationships/add", "POST", "/relationships/add", data={"name": f"rel{i}"})
+        call("PUT /relationships/update/<id>", "PUT", f"/relationships/update/{i % rows + 1}", data={"name": f"upd{i}"})
+        call("DELETE /relationships/delete/<id>", "DELETE", f"/relationships/delete/{next(doomed)}")
+        call("POST /import/<table>", "POST", "/import/t0", data={"format": "csv"}, files={"file": ("rows.csv", csv.encode())})
+
+    def schema(call, i):
+        suffix = f"{os.getpid()}_{threading.get_ident()}_{i}"
+        table = f"tmp_{suffix}"
+        _, body = call("POST /tables/add", "POST", "/tables/add", data={"name": table})
+        table_id = row_id(body, table)
+        call("POST /columns/add", "POST", "/columns/add", data={"name": "extra"})
+        call("PUT /columns/update/<id>", "PUT", "/columns/update/2", data={"name": "renamed"})
+        call("DELETE /columns/delete/<id>", "DELETE", "/columns/delete/2")
+        call("POST /indexes/create", "POST", "/indexes/create", data={"table": table, "columns": "name"})
+        call("DELETE /indexes/delete/<name>", "DELETE", f"/indexes/delete/ix_{table}_name")
+        if table_id is not None:
+            call("GET /tables/edit/<id>", "GET", f"/tables/edit/{table_id}")
+            _, body = call("PUT /tables/update/<id>", "PUT", f"/tables/update/{table_id}", data={"name": f"{table}_r"})
+            table_id = row_id(body, f"{table}_r")
+        if table_id is not None:
+            call("DELETE /tables/delete/<id>", "DELETE", f"/tables/delete/{table_id}")
+        call("GET /tables/select/<table>", "GET", "/tables/select/t0")
+
+        database = f"tmp_{suffix}"
+        _, body = call("POST /databases/add", "POST", "/databases/add", data={"name": database})
+        db_id = row_id(body, f"{database}.sqlite")
+        # Maintenance runs on bench0: a running job would make the rename below wait its turn (409)
+        bench_id = row_id(body, "bench0.sqlite")
+        if bench_id is not None:
+            call("POST /databases/maintenance/<id>/<job>", "POST", f"/databases/maintenance/{bench_id}/integrity")
+            call("GET /databases/maintenance/<id>", "GET", f"/databases/maintenance/{bench_id}")
+        if db_id is not None:
+            call("GET /databases/edit/<id>", "GET", f"/databases/edit/{db_id}")
+            _, body = call("PUT /databases/update/<id>", "PUT", f"/databases/update/{db_id}", data={"name": f"{database}_r.sqlite"})
+            db_id = row_id(body, f"{database}_r.sqlite")
+        if db_id is not None:
+            call("DELETE /databases/delete/<id>", "DELETE", f"/databases/delete/{db_id}")
+
+    return [("reads", reads), ("exports", exports), ("writes", writes), ("schema", schema)]
+
+
+def drive(sessions, work, iterations):
+    """Run work(call, i) on every session in its own thread; returns {label: [latencies]}, {label: failures}."""
+    latencies, failures = {}, {}
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def loop(session):
+        def call(label, method, path, **kwargs):
+            started = time.perf_counter()
+            status, body = session.request(method, path, **kwargs)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if 200 <= status < 400:
+                    latencies.setdefault(label, []).append(elapsed)
+                else:
+                    failures[label] = failures.get(label, 0) + 1
+            return status, body
+
+        call("GET /databases/select/<name>", "GET", "/databases/select/bench0.sqlite")
+        call("GET /tables/select/<table>", "GET", "/tables/select/t0")
+        while (i := next(counter)) < iterations:
+            for _, scenario in work:
+                scenario(call, i)
+
+    threads = [threading.Thread(target=loop, args=(session,)) for session in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, failures
+
+
+def summarize(latencies, failures, seconds):
+    report = {}
+    for label in sorted(set(latencies) | set(failures)):
+        values = sorted(latencies.get(label, []))
+        quantiles = statistics.quantiles(values, n=100) if len(values) > 1 else [values[0] if values else 0.0] * 99
+        report[label] = {
+            "requests": len(values),
+            "req_per_sec": len(values) / seconds if seconds else 0.0,
+            "p50_ms": quantiles[49] * 1000,
+            "p95_ms": quantiles[94] * 1000,
+            "p99_ms": quantiles[98] * 1000,
+            "failed": failures.get(label, 0),
+        }
+    return report
+
+
+def peak_rss_kib(pid):
+    """Peak RSS of pid and its children (gunicorn workers), from /proc; None elsewhere."""
+    total = 0
+    try:
+        pids = [pid]
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(child) for child in f.read().split()]
+        for p in pids:
+            with open(f"/proc/{p}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration, ValueError):
+        return None
+    return total
+
+
+def run_client(args, work):
+    from sqlflask.app import app
+
+    started = time.perf_counter()
+    latencies, failures = drive([ClientSession(app)], work, args.iterations)
+    seconds = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    return summarize(latencies, failures, seconds), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_gunicorn(args, work):
+    from .bench_asgi import start
+
+    server = start("wsgi", args.workers, args.port)
+    try:
+        started = time.perf_counter()
+        latencies, failures = drive([HttpSession(args.port) for _ in range(args.concurrency)], work, args.iterations)
+        seconds = time.perf_counter() - started
+        rss = peak_rss_kib(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    return summarize(latencies, failures, seconds), rss
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous(params):
+    """The last stored run with the same parameters, or None."""
+    last = None
+    if os.path.exists(RESULTS):
+        with open(RESULTS) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["params"] == params:
+                    last = entry
+    return last
+
+
+def store(entry):
+    os.makedirs(os.path.dirname(RESULTS), exist_ok=True)
+    with open(RESULTS, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--modes", nargs="+", choices=["client", "gunicorn"], default=["client"])
+    parser.add_argument("--databases", type=int, default=2)
+    parser.add_argument("--tables", type=int, default=3)
+    parser.add_argument("--columns", type=int, default=6)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=50, help="passes over the scenario mix")
+    parser.add_argument("--scenarios", nargs="+", default=["reads", "exports", "writes", "schema"])
+    parser.add_argument("--concurrency", type=int, default=8, help="HTTP clients in gunicorn mode")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--data-dir", help="where to generate the databases (default: a temporary directory)")
+    parser.add_argument("--no-store", action="store_true", help=f"do not append the results to {RESULTS}")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        # Must be set before sqlflask is imported; gunicorn inherits it
+        os.environ["SQLFLASK_DATA_DIR"] = data_dir
+        generate(data_dir, max(1, args.databases), max(2, args.tables), args.columns, args.rows)
+        work = [(name, fn) for name, fn in scenarios(args.rows, args.columns) if name in args.scenarios]
+
+        for mode in args.modes:
+            params = {
+                "mode": mode,
+                **{k: getattr(args, k) for k in ("databases", "tables", "columns", "rows", "iterations", "scenarios")},
+                **({"concurrency": args.concurrency, "workers": args.workers} if mode == "gunicorn" else {}),
+            }
+            report, rss = (run_client if mode == "client" else run_gunicorn)(args, work)
+            baseline = previous(params)
+            print(f"\n{mode}: peak RSS {rss / 1024:.1f} MiB" if rss else f"\n{mode}: peak RSS unknown")
+            print(f"{'route':<45} {'req/sec':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'failed':>7} {'p95 vs prev':>12}")
+            for label, r in report.items():
+                before = (baseline or {}).get("routes", {}).get(label)
+                change = f"{(r['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}%" if before and before["p95_ms"] else "-"
+                print(
+                    f"{label:<45} {r['req_per_sec']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                    f"{r['p99_ms']:>9.2f} {r['failed']:>7} {change:>12}"
+                )
+            sys.stdout.flush()
+            if not args.no_store:
+                store({
+                    "commit": commit(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "params": params,
+                    "peak_rss_kib": rss,
+                    "routes": report,
+                })
+
+
+if __name__ == "__main__":
+    main()
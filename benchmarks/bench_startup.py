@@ -0,0 +1,129 @@
+"""
+bench_startup.py
+
+Import-time and cold-start benchmark for the web app.
+
+Every sample runs in a fresh interpreter, the way a new container or
+gunicorn worker starts: it times importing sqlflask.app (which builds the
+app through create_app()) and then the first request, and records which
+heavy optional modules ended up loaded. The template bytecode cache is
+cleared before the first sample, so the first sample is the true cold start
+and the others show the warm-cache start.
+
+The run fails (exit status 1) when the median start time exceeds the
+budget, when it is slower than the previous stored run by more than the
+tolerance, or when one of the heavy modules is imported at startup.
+Results are appended to benchmarks/results/startup.jsonl with the commit.
+
+    python -m benchmarks.bench_startup --samples 10 --budget-ms 1500
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .bench_routes import commit
+
+RESULTS = os.path.join(os.path.dirname(__file__), "results", "startup.jsonl")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Must only be imported by the routes that need them
+HEAVY = ("polars", "pyarrow", "pandas", "shiny", "openpyxl", "sentry_sdk")
+
+SAMPLE = """
+import json, sys, time
+started = time.perf_counter()
+from sqlflask.app import app
+imported = time.perf_counter()
+with app.test_client() as client:
+    status = client.get("/databases/").status_code
+answered = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (answered - imported) * 1000,
+    "status": status,
+    "heavy": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def sample(env):
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", SAMPLE % (HEAVY,)], capture_output=True, text=True, check=True, cwd=ROOT, env=env,
+    ).stdout
+    result = json.loads(out.splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def previous(params):
+    last = None
+    if os.path.exists(RESULTS):
+        with open(RESULTS) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["params"] == params:
+                    last = entry
+    return last
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=1500, help="maximum median import + first request time")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the previous run")
+    parser.add_argument("--no-store", action="store_true", help=f"do not append the results to {RESULTS}")
+    args = parser.parse_args()
+
+    shutil.rmtree(os.path.join(ROOT, ".template_cache"), ignore_errors=True)
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = {**os.environ, "SQLFLASK_DATA_DIR": data_dir}
+        env.pop("SENTRY_DSN", None)
+        samples = [sample(env) for _ in range(max(1, args.samples))]
+
+    params = {"samples": args.samples}
+    report = {
+        key: {"cold": samples[0][key], "median": statistics.median(s[key] for s in samples[1:] or samples)}
+        for key in ("import_ms", "first_request_ms", "process_ms")
+    }
+    start_ms = report["import_ms"]["median"] + report["first_request_ms"]["median"]
+    baseline = previous(params)
+    print(f"{'':<18} {'cold ms':>9} {'median ms':>10}")
+    for key, r in report.items():
+        print(f"{key:<18} {r['cold']:>9.1f} {r['median']:>10.1f}")
+
+    failures = []
+    heavy = sorted({name for s in samples for name in s["heavy"]})
+    if heavy:
+        failures.append(f"imported at startup: {', '.join(heavy)}")
+    if any(s["status"] != 200 for s in samples):
+        failures.append("first request failed")
+    if start_ms > args.budget_ms:
+        failures.append(f"median start {start_ms:.1f} ms exceeds the budget of {args.budget_ms:.0f} ms")
+    if baseline and start_ms > baseline["start_ms"] * (1 + args.tolerance):
+        failures.append(f"median start {start_ms:.1f} ms vs {baseline['start_ms']:.1f} ms in the previous run")
+
+    if not args.no_store:
+        os.makedirs(os.path.dirname(RESULTS), exist_ok=True)
+        with open(RESULTS, "a") as f:
+            f.write(json.dumps({
+                "commit": commit(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "params": params,
+                "start_ms": start_ms,
+                "heavy": heavy,
+                "report": report,
+            }) + "\n")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
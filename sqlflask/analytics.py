@@ -0,0 +1,243 @@
+"""
+analytics.py
+
+Group-by, aggregate and pivot queries over tables, run on Polars lazy frames.
+
+scan() wraps a table in a LazyFrame backed by a Polars IO source. When the
+plan is collected, Polars hands the source the columns and the row count
+it needs; the source turns them into the SELECT list and LIMIT of one SQL
+query whose WHERE clause holds the request's filters, so SQLite only ever
+returns the rows and columns the aggregation uses. Rows are read from the
+cursor in EXPORT_BATCH_SIZE batches and converted to Arrow record batches
+(typed like the Arrow export from the declared types and the first
+batch, see export.py), and the streaming engine
+aggregates them batch by batch.
+
+Results are kept in an LRU of frames, bounded by entry count and estimated
+size, and revalidated against the database file's stat token, so repeated
+reporting queries cost no SQL until the database is written to.
+
+Query-string syntax (filters as in query.py):
+
+    group=region,year       group-by columns
+    agg=sum:amount,count    aggregates: count, sum, mean, min, max, n_unique
+    pivot=year              one column per value of `year`, rows per group
+    sort=-sum_amount        sort keys over the result columns
+    limit=50                row limit (capped)
+    amount__gt=0            filters, pushed into the SQL WHERE clause
+
+Result columns are named "count" and "<func>_<column>", like summaries.
+Polars and pyarrow are imported on first use.
+"""
+
+import threading
+from collections import OrderedDict
+
+from werkzeug.datastructures import MultiDict
+
+from .config import ANALYTICS_CACHE_MAX_BYTES, ANALYTICS_CACHE_MAX_ENTRIES, EXPORT_BATCH_SIZE, QUERY_MAX_LIMIT
+from .export import arrow_schema, record_batches
+from .fragment_cache import database_token
+from .query import QueryError, compile_filters, parse_query, quote
+
+FUNCTIONS = ("count", "sum", "mean", "min", "max", "n_unique")
+KEYS = {"group", "agg", "pivot", "sort", "limit", "format"}
+
+
+class AnalyticsError(QueryError):
+    pass
+
+
+def _split(text):
+    return [part.strip() for part in (text or "").split(",") if part.strip()]
+
+
+def parse_analytics(args, columns):
+    """
+    Validate query-string args against a table's column names.
+
+    Returns a dict with "group" columns, "aggregates" as (function, column)
+    tuples, "pivot", "filters" as in parse_query(), "sort" as (result
+    column, descending) tuples and "limit". Raises QueryError.
+    """
+    known = set(columns)
+
+    def check(column):
+        if column not in known:
+            raise AnalyticsError(f"Unknown column '{column}'")
+        return column
+
+    group = [check(c) for c in _split(args.get("group"))]
+    aggregates = []
+    for item in _split(args.get("agg")) or ["count"]:
+        func, _, column = item.partition(":")
+        func, column = func.strip().lower(), column.strip() or None
+        if func not in FUNCTIONS:
+            raise AnalyticsError(f"Unknown aggregate '{func}', expected one of: {', '.join(FUNCTIONS)}")
+        if (func == "count") != (column is None):
+            raise AnalyticsError(f"'{item}': count takes no column, {', '.join(FUNCTIONS[1:])} need one")
+        if column:
+            check(column)
+        if (func, column) not in aggregates:
+            aggregates.append((func, column))
+
+    pivot = args.get("pivot") or None
+    if pivot:
+        check(pivot)
+        if not group:
+            raise AnalyticsError("pivot needs at least one group column")
+        if pivot in group:
+            raise AnalyticsError(f"Column '{pivot}' cannot be both a group and the pivot")
+
+    pairs = args.items(multi=True) if hasattr(args, "getlist") else args.items()
+    filters = parse_query(MultiDict([(k, v) for k, v in pairs if k not in KEYS]), columns, default_limit=None)["filters"]
+
+    sort = [(key.lstrip("-"), key.startswith("-")) for key in _split(args.get("sort"))]
+    limit = args.get("limit")
+    try:
+        limit = QUERY_MAX_LIMIT if limit is None else max(1, min(int(limit), QUERY_MAX_LIMIT))
+    except ValueError:
+        raise AnalyticsError(f"Invalid limit '{limit}'")
+
+    return {"group": group, "aggregates": aggregates, "pivot": pivot, "filters": filters, "sort": sort, "limit": limit}
+
+
+def result_name(func, column):
+    return "count" if func == "count" else f"{func}_{column}"
+
+
+def scan(conn, table, table_info, columns, where="", params=(), batch_size=EXPORT_BATCH_SIZE):
+    """
+    LazyFrame over `columns` of `table`. The projection and row limit of
+    the collected plan, and the given WHERE clause, run in SQLite.
+    """
+    import polars as pl
+    import pyarrow as pa
+    from polars.io.plugins import register_io_source
+
+    # Polars needs the schema before the plan runs; it is typed like the Arrow export, from one batch
+    select = ", ".join(quote(c) for c in columns)
+    first = conn.execute(f"SELECT {select} FROM {quote(table)}{where} LIMIT {int(batch_size)}", params).fetchall()
+    schema = arrow_schema(pa, table_info, columns, first, complete=len(first) < batch_size)
+
+    def source(with_columns, predicate, n_rows, _batch_size):
+        names = with_columns or columns
+        sql = f"SELECT {', '.join(quote(c) for c in names)} FROM {quote(table)}{where}"
+        if n_rows is not None:
+            sql += f" LIMIT {int(n_rows)}"
+        projected = pa.schema([schema.field(name) for name in names])
+        for batch in record_batches(conn.execute(sql, params), projected, batch_size):
+            frame = pl.from_arrow(batch)
+            # Predicates Polars adds on top of the SQL filters run on the Arrow batch
+            yield frame.filter(predicate) if predicate is not None else frame
+
+    return register_io_source(source, schema=pl.from_arrow(schema.empty_table()).schema)
+
+
+def _expression(pl, func, column):
+    if func == "count":
+        return pl.len().alias("count")
+    return getattr(pl.col(column), func)().alias(result_name(func, column))
+
+
+def compute(conn, table, table_info, spec):
+    """Run a parsed analytics query and return the result as a Polars DataFrame."""
+    import polars as pl
+
+    keys = spec["group"] + ([spec["pivot"]] if spec["pivot"] else [])
+    needed = list(dict.fromkeys(keys + [column for _, column in spec["aggregates"] if column]))
+    # A bare count still has to read one column to see the rows
+    needed = needed or [table_info[0]["name"]]
+    where, params = compile_filters(spec["filters"])
+
+    frame = scan(conn, table, table_info, needed, where, params)
+    exprs = [_expression(pl, func, column) for func, column in spec["aggregates"]]
+    frame = frame.group_by(keys).agg(exprs) if keys else frame.select(exprs)
+    try:
+        result = frame.collect(engine="streaming")
+        if spec["pivot"]:
+            values = [result_name(func, column) for func, column in spec["aggregates"]]
+            result = result.pivot(on=spec["pivot"], index=spec["group"], values=values)
+    except pl.exceptions.PolarsError as e:
+        raise AnalyticsError(str(e).splitlines()[0])
+
+    unknown = [column for column, _ in spec["sort"] if column not in result.columns]
+    if unknown:
+        raise AnalyticsError(f"Unknown result column '{', '.join(unknown)}'")
+    sort = spec["sort"] or [(column, False) for column in spec["group"]]
+    if sort:
+        result = result.sort([c for c, _ in sort], descending=[d for _, d in sort], nulls_last=True)
+    return result.head(spec["limit"])
+
+
+def cache_key(table, spec):
+    return (
+        table,
+        tuple(spec["group"]),
+        tuple(spec["aggregates"]),
+        spec["pivot"],
+        tuple((column, op, tuple(value) if isinstance(value, list) else value) for column, op, value in spec["filters"]),
+        tuple(spec["sort"]),
+        spec["limit"],
+    )
+
+
+class FrameCache:
+    """LRU of result frames, revalidated by the database file's stat token."""
+
+    def __init__(self, max_bytes=ANALYTICS_CACHE_MAX_BYTES, max_entries=ANALYTICS_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (stat, frame, size)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, stat):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stat:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, stat, frame):
+        size = frame.estimated_size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (stat, frame, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+cache = FrameCache()
+
+
+def run(conn, db_file, table, table_info, spec):
+    """compute() through the result cache; `db_file` is the file `conn` reads."""
+    key = (str(db_file),) + cache_key(table, spec)
+    # Taken before computing, so a write during the scan invalidates the entry
+    stat = database_token(db_file)
+    frame = cache.get(key, stat)
+    if frame is None:
+        frame = compute(conn, table, table_info, spec)
+        cache.put(key, stat, frame)
+    return frame
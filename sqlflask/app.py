@@ -3,44 +3,73 @@ sqlflask.py
 
 Main application entry point for the SQLFlask project.
 
-This module initializes the Flask app, configures global settings,
-registers blueprints for modular route handling, and manages
-application-wide context and session logic.
+create_app() builds and configures the Flask app, registers blueprints for
+modular route handling, and manages application-wide context and session
+logic. It keeps cold starts cheap: blueprints are imported when the app is
+built, heavy optional dependencies (Polars, PyArrow, the reporting tools)
+only when a route first needs them, Sentry only when SENTRY_DSN is set,
+project metadata is read once, and compiled templates are kept in a
+bytecode cache (see benchmarks/bench_startup.py). It also starts this
+node's replication role (replication.py).
 """
 
-import sentry_sdk
-from flask import Flask, session, render_template, request, g, send_from_directory, Blueprint
-from .views.databases import database_bp
-from .views.tables import tables_bp
-from .views.columns import columns_bp
-from .views.relationships import relationships_bp
-from .views.data_entry import data_entry_bp
-from .views.utils import get_db
-from .config import DB_PATH, EXCEL_DIR
+from flask import Flask, session, render_template, request, g, send_from_directory, current_app
+from jinja2 import FileSystemBytecodeCache
+from .views.utils import get_db, release_db, get_tables, get_table_info
+from .config import (
+    DB_PATH, EXCEL_DIR, TEMPLATE_CACHE_DIR,
+    REPLICATION_ROLE, REPLICATION_ADDRESS, REPLICATION_REPLICA_DIR, REPLICATION_PRIMARY_URL, REPLICATION_MAX_LAG,
+    REPLICATION_SECRET,
+)
+from . import replication
 import sqlite3
 import tomllib
 import os
 
 
-sentry_sdk.init(
-    dsn=os.getenv("SENTRY_DSN"),
-    # Add data like request headers and IP for users,
-    # see https://docs.sentry.io/platforms/python/data-management/data-collected/ for more info
-    send_default_pii=True,
-    traces_sample_rate=0.1,
-    environment="production",
-)
-
-app = Flask(__name__)
-app.config["DB_PATH"] = str(DB_PATH)  # <-- including db (file) name 
-app.config["DATA_DIR"] = str(DB_PATH.parent)  # <-- excluding db (file) name
-app.secret_key = os.urandom(24)
-
-app.register_blueprint(database_bp)
-app.register_blueprint(tables_bp)
-app.register_blueprint(columns_bp)
-app.register_blueprint(relationships_bp)
-app.register_blueprint(data_entry_bp)
+def init_sentry(dsn):
+    import sentry_sdk
+
+    sentry_sdk.init(
+        dsn=dsn,
+        # Add data like request headers and IP for users,
+        # see https://docs.sentry.io/platforms/python/data-management/data-collected/ for more info
+        send_default_pii=True,
+        traces_sample_rate=0.1,
+        environment="production",
+    )
+
+
+def register_blueprints(app):
+    from .views.databases import database_bp
+    from .views.tables import tables_bp
+    from .views.columns import columns_bp
+    from .views.relationships import relationships_bp
+    from .views.data_entry import data_entry_bp
+    from .views.imports import import_bp
+    from .views.exports import export_bp
+    from .views.query import query_bp
+    from .views.indexes import indexes_bp
+    from .views.metrics import metrics_bp
+    from .views.search import search_bp
+    from .views.summaries import summaries_bp
+    from .views.history import history_bp
+    from .views.analytics import analytics_bp
+
+    app.register_blueprint(database_bp)
+    app.register_blueprint(tables_bp)
+    app.register_blueprint(columns_bp)
+    app.register_blueprint(relationships_bp)
+    app.register_blueprint(data_entry_bp)
+    app.register_blueprint(import_bp)
+    app.register_blueprint(export_bp)
+    app.register_blueprint(query_bp)
+    app.register_blueprint(indexes_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(summaries_bp)
+    app.register_blueprint(history_bp)
+    app.register_blueprint(analytics_bp)
 
 
 def get_project_metadata():
@@ -53,43 +82,82 @@ def get_project_metadata():
         "project_version": project.get("version", ""),
     }
 
-@app.context_processor
-def inject_project_metadata():
-    return get_project_metadata()
 
-@app.teardown_appcontext
+def precompile_templates(app):
+    """Compile every template into the Jinja cache, e.g. while building the image."""
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config["DB_PATH"] = str(DB_PATH)  # <-- including db (file) name 
+    app.config["DATA_DIR"] = str(DB_PATH.parent)  # <-- excluding db (file) name
+    app.config["TEMPLATE_CACHE_DIR"] = TEMPLATE_CACHE_DIR
+    app.config["SENTRY_DSN"] = os.getenv("SENTRY_DSN")
+    app.config["REPLICATION_ROLE"] = REPLICATION_ROLE
+    app.config["REPLICATION_ADDRESS"] = REPLICATION_ADDRESS
+    app.config["REPLICATION_REPLICA_DIR"] = str(REPLICATION_REPLICA_DIR)
+    app.config["REPLICATION_PRIMARY_URL"] = REPLICATION_PRIMARY_URL
+    app.config["REPLICATION_MAX_LAG"] = REPLICATION_MAX_LAG
+    app.config["REPLICATION_SECRET"] = REPLICATION_SECRET
+    app.config.update(config or {})
+    # Shared by all workers and nodes when set, so sessions survive a change of process
+    app.secret_key = os.environ.get("SQLFLASK_SECRET_KEY") or os.urandom(24)
+
+    if app.config["SENTRY_DSN"]:
+        init_sentry(app.config["SENTRY_DSN"])
+    if app.config["TEMPLATE_CACHE_DIR"]:
+        os.makedirs(app.config["TEMPLATE_CACHE_DIR"], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(app.config["TEMPLATE_CACHE_DIR"]))
+
+    register_blueprints(app)
+    replication.start(app.config)
+    if app.config["REPLICATION_ROLE"] == "replica" and app.config["REPLICATION_PRIMARY_URL"]:
+        app.before_request(forward_writes)
+
+    # Read once; the context processor runs on every render
+    metadata = get_project_metadata()
+    app.context_processor(lambda: metadata)
+    app.teardown_appcontext(close_connection)
+    app.before_request(set_initial_context)
+    app.after_request(save_context)
+    app.add_url_rule("/", view_func=index)
+    app.add_url_rule("/favicon.ico", view_func=favicon)
+    app.cli.command("precompile-templates")(lambda: precompile_templates(app))
+    return app
+
+
 def close_connection(exception):
-    db = getattr(g, "_database", None)
-    if db is not None:
-        db.close()
+    release_db()
 
-@app.before_request
 def set_initial_context():
     if not hasattr(g, "context"):
         g.context = "None"  # Default context
     g.current_database = session.get("current_database", "none")  # Load from session
     g.current_table = "None"  # Default table
 
-@app.after_request
+def forward_writes():
+    # Replica nodes only read; writes are answered by the primary
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        return replication.forward(current_app.config["REPLICATION_PRIMARY_URL"], request)
+
 def save_context(response):
     session["current_database"] = g.get("current_database", "None")  # Save to session
     return response
 
-@app.route("/")
 def index():
     db = get_db()
     current_database = g.current_database
     current_table = g.current_table
 
-    # Check if the 'details' table exists
-    table_exists = db.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name='details';"
-    ).fetchone()
+    # Check if the 'details' table exists (served from the schema cache)
+    table_exists = "details" in get_tables(db)
 
     # Check if the 'name' column exists in the 'details' table
     name_column_exists = False
     if table_exists:
-        columns = db.execute("PRAGMA table_info(details)").fetchall()
+        columns = get_table_info(db, "details")
         name_column_exists = any(col["name"] == "name" for col in columns)
 
     if table_exists and name_column_exists:
@@ -105,10 +173,11 @@ def index():
         details=details
 )
 
-@app.route('/favicon.ico')
 def favicon():
     return send_from_directory('static', 'favicon.ico')
 
+app = create_app()
+
 if __name__ == "__main__":
     
     with sqlite3.connect(app.config["DB_PATH"]) as db:
@@ -0,0 +1,337 @@
+"""
+asgi.py
+
+ASGI entry point for the SQLFlask application.
+
+    uvicorn sqlflask.asgi:app --workers 4
+
+The Flask app is mounted unchanged through ThreadedWSGI, which runs each
+request on its own thread from a bounded pool, so one slow render does
+not hold up the other routes. Request bodies are not buffered: the
+thread pulls them from the client as the app reads wsgi.input. Table exports, which can stream for minutes,
+are served natively: the event loop only holds the client connection,
+while the SQLite work runs on a small thread pool dedicated to that
+database file and hands chunks back through a bounded queue, so a slow
+client throttles its producer instead of buffering the whole table.
+
+Every database file gets two bounded pools, one for short queries and one
+for streams, so long exports cannot take the threads short requests need,
+and one busy file cannot starve the others. Idle HTMX clients cost a
+socket and a coroutine rather than a worker.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import io
+import os
+import sys
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import ClientDisconnected
+
+from .app import app as flask_app
+from .config import ASGI_DB_THREADS, ASGI_STREAM_THREADS, ASGI_STREAM_QUEUE, ASGI_WSGI_THREADS, EXPORT_BATCH_SIZE
+from .export import FORMATS, export_chunks
+from .instrumentation import route_name
+from .pool import pool
+from .query import quote
+from .replication import read_path
+from .schema_cache import schema_cache
+
+_DONE = object()
+
+
+@contextmanager
+def pooled(db_path):
+    conn = pool.acquire(db_path)
+    try:
+        yield conn
+    finally:
+        pool.release(db_path, conn)
+
+
+async def iterate_in_thread(executor, produce, queue_size=ASGI_STREAM_QUEUE):
+    """
+    Async iterator over the iterable returned by produce(), which runs on
+    `executor`. At most queue_size items are buffered; the producer stops
+    (and its iterator is closed) when the consumer goes away.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    cancelled = threading.Event()
+
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                if cancelled.is_set():
+                    future.cancel()
+                    return False
+
+    def pump():
+        iterator = None
+        try:
+            iterator = iter(produce())
+            for item in iterator:
+                if cancelled.is_set() or not put(item):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+            put(_DONE)
+
+    # Copy the context so instrumentation sees the route name
+    ctx = contextvars.copy_context()
+    loop.run_in_executor(executor, ctx.run, pump)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        while not queue.empty():
+            queue.get_nowait()
+
+
+class DatabaseExecutors:
+    """Bounded thread pools per database file, one for short work and one for streams."""
+
+    def __init__(self, threads=ASGI_DB_THREADS, stream_threads=ASGI_STREAM_THREADS, queue_size=ASGI_STREAM_QUEUE):
+        self.sizes = {"short": threads, "stream": stream_threads}
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._executors = {}  # (db_path, kind) -> ThreadPoolExecutor
+
+    def executor(self, db_path, kind="short"):
+        with self._lock:
+            executor = self._executors.get((db_path, kind))
+            if executor is None:
+                executor = self._executors[(db_path, kind)] = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.sizes[kind], thread_name_prefix=f"sqlite-{kind}-{os.path.basename(db_path)}"
+                )
+            return executor
+
+    async def run(self, db_path, fn, *args):
+        """Await fn(conn, *args) on the database's short-query pool."""
+        def call():
+            with pooled(db_path) as conn:
+                return fn(conn, *args)
+
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor(db_path), ctx.run, call)
+
+    def stream(self, db_path, produce, *args):
+        """Async iterator over produce(conn, *args), run on the database's stream pool."""
+        def chunks():
+            with pooled(db_path) as conn:
+                yield from produce(conn, *args)
+
+        return iterate_in_thread(self.executor(db_path, "stream"), chunks, self.queue_size)
+
+    def shutdown(self):
+        with self._lock:
+            executors, self._executors = list(self._executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RequestBody(io.RawIOBase):
+    """
+    wsgi.input for a request thread: each read pulls the next body message
+    from the ASGI receive channel on the event loop, so an upload reaches
+    the app as it arrives and is never held in memory as a whole.
+    """
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._chunk = memoryview(b"")
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            self._chunk = memoryview(message.get("body", b""))
+            self._more = message.get("more_body", False)
+        n = min(len(buffer), len(self._chunk))
+        buffer[:n] = self._chunk[:n]
+        self._chunk = self._chunk[n:]
+        return n
+
+
+class ThreadedWSGI:
+    """
+    ASGI adapter that runs every request of a WSGI app on its own thread
+    from a bounded pool and streams the response back as it is produced.
+    (asgiref's WsgiToAsgi funnels all requests through a single thread.)
+    """
+
+    def __init__(self, wsgi_app, threads=ASGI_WSGI_THREADS, queue_size=ASGI_STREAM_QUEUE):
+        self.wsgi_app = wsgi_app
+        self.queue_size = queue_size
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+    @staticmethod
+    def environ(scope, body):
+        """WSGI environ for an ASGI HTTP scope; `body` is the file-like wsgi.input."""
+        root_path = scope.get("root_path", "")
+        path = scope["path"]
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": root_path.encode("utf8").decode("latin1"),
+            "PATH_INFO": path.encode("utf8").decode("latin1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope.get("headers", []):
+            name, value = name.decode("latin1"), value.decode("latin1")
+            if name == "content-type":
+                key = "CONTENT_TYPE"
+            elif name == "content-length":
+                key = "CONTENT_LENGTH"
+            else:
+                key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def __call__(self, scope, receive, send):
+        body = io.BufferedReader(RequestBody(receive, asyncio.get_running_loop()))
+        environ = self.environ(scope, body)
+
+        def response():
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                started[:] = [status, headers]
+
+            result = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in result:
+                    if started:
+                        yield ("start", *started)
+                        started.clear()
+                    if chunk:
+                        yield chunk
+                if started:
+                    yield ("start", *started)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+
+        async for item in iterate_in_thread(self.executor, response, self.queue_size):
+            if isinstance(item, tuple):
+                _, status, headers = item
+                await send({
+                    "type": "http.response.start",
+                    "status": int(status.split(" ", 1)[0]),
+                    "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers],
+                })
+            else:
+                await send({"type": "http.response.body", "body": item, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+executors = DatabaseExecutors()
+
+
+def session_db_path(request):
+    """
+    File to read the current database from, as get_db() would pick it: the
+    database in the Flask session cookie, or its replica copy on a replica node.
+    """
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    session = {}
+    cookie = request.cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    if cookie and serializer is not None:
+        try:
+            session = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+        except Exception:
+            session = {}
+    config = flask_app.config
+    db_path = os.path.join(config["DATA_DIR"], session.get("current_database", "db.sqlite"))
+    if config.get("REPLICATION_ROLE") == "replica" and request.method in ("GET", "HEAD"):
+        return read_path(db_path, config["REPLICATION_REPLICA_DIR"], config["REPLICATION_MAX_LAG"])
+    return db_path
+
+
+async def export_table(request):
+    table, fmt = request.path_params["table"], request.path_params["fmt"]
+    if fmt not in FORMATS:
+        return PlainTextResponse("Not Found", status_code=404)
+    route_name.set("asgi.export_table")
+    db_path = session_db_path(request)
+    table_info = await executors.run(db_path, lambda conn: schema_cache.table_info(conn, db_path, table))
+    if not table_info:
+        return PlainTextResponse(f"Table '{table}' does not exist.", status_code=404)
+    if fmt in ("parquet", "arrow"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return PlainTextResponse(f"Exporting to {fmt} requires pyarrow.", status_code=501)
+    try:
+        batch_size = max(1, int(request.query_params.get("batch_size", EXPORT_BATCH_SIZE)))
+    except ValueError:
+        batch_size = EXPORT_BATCH_SIZE
+
+    def produce(conn):
+        return export_chunks(conn.execute(f"SELECT * FROM {quote(table)}"), table_info, fmt, batch_size)
+
+    return StreamingResponse(
+        executors.stream(db_path, produce),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{fmt}"'},
+    )
+
+
+wsgi = ThreadedWSGI(flask_app)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    executors.shutdown()
+    wsgi.shutdown()
+
+
+app = Starlette(
+    routes=[
+        Route("/export/{table}.{fmt}", export_table),
+        Mount("/", wsgi),
+    ],
+    lifespan=lifespan,
+)
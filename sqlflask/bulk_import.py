@@ -0,0 +1,204 @@
+"""
+bulk_import.py
+
+Bulk loading of CSV and Parquet files into existing tables.
+
+Files are parsed with Polars in fixed-size batches so memory stays bounded,
+file columns are matched (case-insensitively) against PRAGMA table_info,
+and rows are inserted with executemany() inside large transactions. In the
+web app each batch is one write on the database's group-commit writer
+(writer.py) instead.
+Non-unique secondary indexes can optionally be dropped before the load and rebuilt
+afterwards, which is much faster than maintaining them row by row.
+
+Usable from the /import blueprint or the command line:
+
+    python -m sqlflask.bulk_import data/db.sqlite details rows.csv --rebuild-indexes
+"""
+
+import argparse
+import os
+import time
+
+from .config import BULK_IMPORT_BATCH_SIZE, BULK_IMPORT_COMMIT_ROWS
+
+FORMATS = ("csv", "parquet")
+
+
+def detect_format(filename):
+    ext = os.path.splitext(filename)[1].lower().lstrip(".")
+    if ext == "pq":
+        ext = "parquet"
+    if ext not in FORMATS:
+        raise ValueError(f"Unsupported file type '{ext}', expected one of: {', '.join(FORMATS)}")
+    return ext
+
+
+def read_batches(path, fmt, batch_size=BULK_IMPORT_BATCH_SIZE):
+    """Yield DataFrames of at most batch_size rows without loading the whole file."""
+    # Imported here so the web app does not pay for Polars until the first import
+    import polars as pl
+
+    if fmt == "csv":
+        # Read every field as text and let SQLite's column affinity convert it,
+        # so type inference cannot disagree between batches.
+        reader = pl.read_csv_batched(path, batch_size=batch_size, infer_schema_length=0)
+        while True:
+            batches = reader.next_batches(1)
+            if not batches:
+                break
+            yield from batches
+    elif fmt == "parquet":
+        frame = pl.scan_parquet(path)
+        total = frame.select(pl.len()).collect().item()
+        for offset in range(0, total, batch_size):
+            yield frame.slice(offset, batch_size).collect()
+    else:
+        raise ValueError(f"Unsupported format '{fmt}'")
+
+
+def map_columns(file_columns, table_info):
+    """Pair file columns with table columns; returns (pairs, skipped file columns)."""
+    by_name = {col[1].lower(): col[1] for col in table_info}
+    pairs = [(name, by_name[name.lower()]) for name in file_columns if name.lower() in by_name]
+    skipped = [name for name in file_columns if name.lower() not in by_name]
+    return pairs, skipped
+
+
+def drop_indexes(conn, table):
+    # UNIQUE indexes stay: rebuilding one after duplicates were committed
+    # would fail and lose the constraint for good.
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL", (table,)
+    ).fetchall()
+    # Read after sqlite_master, which reloads a schema changed by another connection; PRAGMAs do not
+    unique = {row[1] for row in conn.execute(f'PRAGMA index_list("{table}")') if row[2]}
+    indexes = [(name, sql) for name, sql in indexes if name not in unique]
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in indexes]
+
+
+def import_file(
+    conn,
+    table,
+    path,
+    fmt,
+    batch_size=BULK_IMPORT_BATCH_SIZE,
+    commit_rows=BULK_IMPORT_COMMIT_ROWS,
+    rebuild_indexes=False,
+    write=None,
+):
+    """
+    Load a CSV or Parquet file into an existing table.
+
+    `write`, if given, runs a callable taking a connection as one write,
+    e.g. writer.execute bound to the database; every batch then goes
+    through it and commit_rows does not apply. Otherwise the rows are
+    written on conn, committing every commit_rows rows.
+
+    Returns a dict with the number of rows inserted, elapsed seconds,
+    rows per second, the mapped and skipped columns and the number of
+    indexes rebuilt. Raises ValueError if the table does not exist or no
+    file column matches a table column.
+    """
+    table_info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    if not table_info:
+        raise ValueError(f"Table '{table}' does not exist.")
+
+    def run(work):
+        return work(conn) if write is None else write(work)
+
+    def restore(conn):
+        existing = {
+            row[0]
+            for row in conn.execute("SELECT sql FROM sqlite_master WHERE type='index' AND tbl_name=?", (table,))
+        }
+        for sql in index_sql:
+            if sql not in existing:
+                conn.execute(sql)
+
+    started = time.perf_counter()
+    rows = pending = 0
+    pairs = skipped = None
+    index_sql = []
+    try:
+        if rebuild_indexes:
+            index_sql = run(lambda conn: drop_indexes(conn, table))
+        for batch in read_batches(path, fmt, batch_size):
+            if pairs is None:
+                pairs, skipped = map_columns(batch.columns, table_info)
+                if not pairs:
+                    raise ValueError(f"None of the file columns match columns of '{table}'.")
+                targets = ", ".join(f'"{target}"' for _, target in pairs)
+                placeholders = ", ".join("?" * len(pairs))
+                insert = f"INSERT INTO {table} ({targets}) VALUES ({placeholders})"
+            batch = batch.select([source for source, _ in pairs])
+            run(lambda conn: conn.executemany(insert, batch.iter_rows()))
+            rows += batch.height
+            pending += batch.height
+            if write is None and pending >= commit_rows:
+                conn.commit()
+                pending = 0
+        run(lambda conn: [conn.execute(sql) for sql in index_sql])
+        if write is None:
+            conn.commit()
+    except Exception:
+        # Dropping the indexes was part of the rolled back transaction unless
+        # an intermediate commit already happened; restore any that are gone.
+        if write is None:
+            conn.rollback()
+            restore(conn)
+            conn.commit()
+        elif index_sql:
+            write(restore)
+        raise
+
+    seconds = time.perf_counter() - started
+    return {
+        "table": table,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds else 0.0,
+        "columns": [target for _, target in pairs or []],
+        "skipped": skipped or [],
+        "indexes_rebuilt": len(index_sql),
+    }
+
+
+def main():
+    from .pragmas import connect
+
+    parser = argparse.ArgumentParser(description="Bulk load a CSV or Parquet file into a SQLite table.")
+    parser.add_argument("database", help="path to the .sqlite file")
+    parser.add_argument("table", help="existing table to load into")
+    parser.add_argument("file", help="CSV or Parquet file")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=BULK_IMPORT_BATCH_SIZE)
+    parser.add_argument("--commit-rows", type=int, default=BULK_IMPORT_COMMIT_ROWS)
+    parser.add_argument("--rebuild-indexes", action="store_true", help="drop indexes during the load")
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    try:
+        stats = import_file(
+            conn,
+            args.table,
+            args.file,
+            args.format or detect_format(args.file),
+            batch_size=args.batch_size,
+            commit_rows=args.commit_rows,
+            rebuild_indexes=args.rebuild_indexes,
+        )
+    finally:
+        conn.close()
+    print(
+        f"Imported {stats['rows']} rows into {stats['table']} in {stats['seconds']:.2f}s "
+        f"({stats['rows_per_sec']:.0f} rows/sec)"
+    )
+    if stats["skipped"]:
+        print(f"Skipped columns not in table: {', '.join(stats['skipped'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+catalog.py
+
+Catalog of the database files in DATA_DIR for the SQLFlask application.
+
+Listing the databases used to call os.listdir() on every request and
+number the files in directory order, so IDs shifted whenever a file (or
+a -wal/-shm sidecar) appeared. The catalog keeps one row per .sqlite file
+in a small control database (CATALOG_NAME) with a stable AUTOINCREMENT id
+and the file's size, page count, table count and modification time.
+
+Lookups are served from memory. The directory is only rescanned when its
+mtime changes (files created, renamed or removed) or CATALOG_STAT_TTL has
+passed (files written in place), and a rescan only stat()s the files;
+a database is opened to count its pages and tables only if its stat
+changed. A file that disappears and reappears under another name with
+the same inode is treated as a rename and keeps its id, whichever
+process notices it first.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from .config import CATALOG_NAME, CATALOG_STAT_TTL
+from .schema_cache import INTERNAL_PREFIX
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS databases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER,
+    page_count INTEGER,
+    table_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+INSERT OR IGNORE INTO meta VALUES ('version', 0);
+"""
+
+
+def file_stat(path):
+    """(size, mtime_ns, inode) of a database file, counting its write-ahead log."""
+    st = os.stat(path)
+    try:
+        wal = os.stat(f"{path}-wal")
+    except FileNotFoundError:
+        return st.st_size, st.st_mtime_ns, st.st_ino
+    return st.st_size + wal.st_size, max(st.st_mtime_ns, wal.st_mtime_ns), st.st_ino
+
+
+def inspect(path):
+    """(page_count, table_count) of a database, or (None, None) if it cannot be read."""
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=1)
+    except sqlite3.Error:
+        return None, None
+    try:
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        table_count = conn.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "AND substr(name, 1, ?) != ?",
+            (len(INTERNAL_PREFIX), INTERNAL_PREFIX),
+        ).fetchone()[0]
+        return page_count, table_count
+    except sqlite3.Error:
+        return None, None
+    finally:
+        conn.close()
+
+
+class Catalog:
+    def __init__(self, name=CATALOG_NAME, ttl=CATALOG_STAT_TTL):
+        self.name = name
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._state = {}  # data_dir -> {"dir", "checked", "version", "rows"}
+
+    def _connect(self, data_dir):
+        conn = sqlite3.connect(os.path.join(data_dir, self.name), timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _scan(self, data_dir):
+        files = {}
+        for entry in os.scandir(data_dir):
+            if entry.name.endswith(".sqlite") and entry.is_file():
+                try:
+                    files[entry.name] = file_stat(entry.path)
+                except FileNotFoundError:
+                    pass
+        return files
+
+    def _refresh(self, data_dir, dir_token):
+        files = self._scan(data_dir)
+        conn = self._connect(data_dir)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            known = {row["name"]: row for row in conn.execute("SELECT * FROM databases")}
+            vanished = {row["inode"]: row for name, row in known.items() if name not in files}
+            changed = bool(vanished)
+            for name, (size, mtime_ns, inode) in files.items():
+                row = known.get(name)
+                if row is not None and (row["size"], row["mtime_ns"], row["inode"]) == (size, mtime_ns, inode):
+                    continue
+                changed = True
+                values = (name, size, mtime_ns, inode, *inspect(os.path.join(data_dir, name)))
+                if row is None:
+                    row = vanished.pop(inode, None)
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO databases (name, size, mtime_ns, inode, page_count, table_count) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        values,
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE databases SET name = ?, size = ?, mtime_ns = ?, inode = ?, page_count = ?, "
+                        "table_count = ? WHERE id = ?",
+                        (*values, row["id"]),
+                    )
+            for row in vanished.values():
+                conn.execute("DELETE FROM databases WHERE id = ?", (row["id"],))
+            if changed:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            rows = [
+                {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "size": row["size"],
+                    "page_count": row["page_count"],
+                    "table_count": row["table_count"],
+                    "modified": row["mtime_ns"] / 1e9,
+                }
+                for row in conn.execute("SELECT * FROM databases ORDER BY id")
+            ]
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return {"dir": dir_token, "checked": time.monotonic(), "version": version, "rows": rows}
+
+    def _current(self, data_dir):
+        st = os.stat(data_dir)
+        dir_token = (st.st_mtime_ns, st.st_ino)
+        with self._lock:
+            state = self._state.get(data_dir)
+            if state is None or state["dir"] != dir_token or time.monotonic() - state["checked"] >= self.ttl:
+                state = self._state[data_dir] = self._refresh(data_dir, dir_token)
+            return state
+
+    def databases(self, data_dir):
+        """Catalog rows for the .sqlite files in data_dir, ordered by id."""
+        return [dict(row) for row in self._current(data_dir)["rows"]]
+
+    def get(self, data_dir, db_id):
+        return next((dict(row) for row in self._current(data_dir)["rows"] if row["id"] == db_id), None)
+
+    def version(self, data_dir):
+        """Counter bumped whenever a rescan finds a change."""
+        return self._current(data_dir)["version"]
+
+    def claim(self, data_dir, key, interval):
+        """
+        True for exactly one caller, across processes, once every `interval`
+        seconds; used to run scheduled work in a single worker.
+        """
+        conn = self._connect(data_dir)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is not None and now < row["value"]:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, now + interval))
+            conn.execute("COMMIT")
+            return True
+        finally:
+            conn.close()
+
+    def forget(self, data_dir=None):
+        """Rescan on the next lookup, e.g. after a file was changed in place."""
+        with self._lock:
+            if data_dir is None:
+                self._state.clear()
+            else:
+                self._state.pop(data_dir, None)
+
+
+catalog = Catalog()
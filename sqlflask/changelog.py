@@ -0,0 +1,264 @@
+"""
+changelog.py
+
+Audit log of data and schema edits with per-operation undo and redo.
+
+Every edit made through the blueprints is one operation. tracked() wraps a
+row write so that, inside the same write transaction, the before and after
+images of the rows it touches are appended to a sidecar log: full rows
+for inserts and deletes, only the changed columns for updates. Column
+renames and drops are logged as DDL with the statements that reverse them
+in the transaction that makes the change; the values of a dropped column
+are copied row by row into a side table by SQL, never through Python.
+Large images are zlib compressed, and appends ride along in the
+group-commit writer's batches (writer.py), so logging costs a few small
+inserts per edit instead of a copy of the database file.
+
+undo() applies the inverse of one operation and redo() replays it. Both
+first check that the affected rows still look the way the operation left
+them (or found them) and raise ChangelogError otherwise, so undoing an old
+edit never overwrites a newer one.
+"""
+
+import base64
+import json
+import sqlite3
+import time
+import zlib
+
+from .config import CHANGELOG_COMPRESS_BYTES, CHANGELOG_KEEP_OPERATIONS
+from .query import quote
+from .schema_cache import INTERNAL_PREFIX
+
+OPERATIONS = f"{INTERNAL_PREFIX}operations"
+CHANGES = f"{INTERNAL_PREFIX}changes"
+COLUMN_VALUES = f"{INTERNAL_PREFIX}column_values"
+SCHEMA = (
+    f"CREATE TABLE IF NOT EXISTS {OPERATIONS} ("
+    "id INTEGER PRIMARY KEY, at REAL NOT NULL, label TEXT, tbl TEXT, undone INTEGER NOT NULL DEFAULT 0)",
+    f"CREATE TABLE IF NOT EXISTS {CHANGES} ("
+    "op INTEGER NOT NULL, seq INTEGER NOT NULL, kind TEXT NOT NULL, row INTEGER, before, after, "
+    "PRIMARY KEY (op, seq)) WITHOUT ROWID",
+    f"CREATE TABLE IF NOT EXISTS {COLUMN_VALUES} ("
+    "op INTEGER NOT NULL, row INTEGER NOT NULL, value, PRIMARY KEY (op, row)) WITHOUT ROWID",
+)
+
+
+class ChangelogError(Exception):
+    pass
+
+
+def _encode(value):
+    if value is None:
+        return None
+    text = json.dumps(value, default=lambda v: {"$blob": base64.b64encode(v).decode()})
+    # Large images (wide rows, dropped columns) are stored compressed
+    return zlib.compress(text.encode()) if len(text) > CHANGELOG_COMPRESS_BYTES else text
+
+
+def _decode(stored):
+    if stored is None:
+        return None
+    if isinstance(stored, bytes):
+        stored = zlib.decompress(stored).decode()
+    return json.loads(stored, object_hook=lambda d: base64.b64decode(d["$blob"]) if "$blob" in d else d)
+
+
+def _image(conn, table, rowid):
+    cursor = conn.execute(f"SELECT * FROM {quote(table)} WHERE rowid = ?", (rowid,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([desc[0] for desc in cursor.description], row))
+
+
+def append(conn, label, table, changes):
+    """Log one operation made of (kind, rowid, before, after) changes; returns its id."""
+    for sql in SCHEMA:
+        conn.execute(sql)
+    op = conn.execute(
+        f"INSERT INTO {OPERATIONS} (at, label, tbl) VALUES (?, ?, ?)", (time.time(), label, table)
+    ).lastrowid
+    conn.executemany(
+        f"INSERT INTO {CHANGES} (op, seq, kind, row, before, after) VALUES (?, ?, ?, ?, ?, ?)",
+        [(op, seq, kind, rowid, _encode(before), _encode(after)) for seq, (kind, rowid, before, after) in enumerate(changes)],
+    )
+    if op % 100 == 0:
+        oldest = op - CHANGELOG_KEEP_OPERATIONS
+        conn.execute(f"DELETE FROM {CHANGES} WHERE op <= ?", (oldest,))
+        conn.execute(f"DELETE FROM {COLUMN_VALUES} WHERE op <= ?", (oldest,))
+        conn.execute(f"DELETE FROM {OPERATIONS} WHERE id <= ?", (oldest,))
+    return op
+
+
+def tracked(label, table, sql, params=(), where=None, where_params=()):
+    """
+    Writer callable running `sql` and logging the rows it changes. `where`
+    selects the rows an UPDATE or DELETE touches; without it `sql` is taken
+    to be an INSERT of one row.
+    """
+    def work(conn):
+        rowids = [row[0] for row in conn.execute(f"SELECT rowid FROM {quote(table)} WHERE {where}", where_params)] if where else []
+        before = {rowid: _image(conn, table, rowid) for rowid in rowids}
+        cursor = conn.execute(sql, params)
+        if not where:
+            rowids = [cursor.lastrowid]
+        changes = []
+        for rowid in rowids:
+            old, new = before.get(rowid), _image(conn, table, rowid)
+            if old is not None and new is not None:
+                changed = [col for col in new if old.get(col) != new[col]]
+                if not changed:
+                    continue
+                changes.append(("update", rowid, {c: old.get(c) for c in changed}, {c: new[c] for c in changed}))
+            elif old is None and new is not None:
+                changes.append(("insert", rowid, None, new))
+            elif old is not None:
+                changes.append(("delete", rowid, old, None))
+        if changes:
+            append(conn, label, table, changes)
+        return {"rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
+    return work
+
+
+def column_change(table, action, column, new_name=None):
+    """
+    Log a column rename or drop in the transaction that makes it: returns
+    `log(conn, staged)`, run by migrations.alter() just before the ALTER
+    (or the swap of a background rebuild). `staged` names a (row, value)
+    table holding the dropped column's values, filled by the rebuild; for
+    in-place drops the values are copied from the table itself.
+    """
+    def work(conn, staged=None):
+        # Each side holds the statement that leads to it and the column name it has
+        if action == "rename":
+            before = {"sql": f"ALTER TABLE {quote(table)} RENAME COLUMN {quote(new_name)} TO {quote(column)}", "column": column}
+            after = {"sql": f"ALTER TABLE {quote(table)} RENAME COLUMN {quote(column)} TO {quote(new_name)}", "column": new_name}
+            label = f"rename column {table}.{column} to {new_name}"
+        else:
+            before = {"sql": None, "column": column, "definition": _definition(conn, table, column)}
+            after = {"sql": f"ALTER TABLE {quote(table)} DROP COLUMN {quote(column)}", "column": None}
+            label = f"drop column {table}.{column}"
+        op = append(conn, label, table, [("ddl", None, before, after)])
+        if action == "drop":
+            _keep_values(conn, op, table, column, staged)
+        return op
+    return work
+
+
+def _definition(conn, table, column):
+    info = next((col for col in conn.execute(f"PRAGMA table_info({quote(table)})") if col[1] == column), None)
+    if info is None:
+        raise ChangelogError(f"Column '{column}' does not exist.")
+    definition = f"{quote(column)} {info[2]}".strip()
+    if info[4] is not None:
+        definition += f" DEFAULT {info[4]}"
+    return definition
+
+
+def _keep_values(conn, op, table, column, staged=None):
+    """Copy the non-NULL values of a column about to be dropped, by rowid, into the log."""
+    conn.execute(f"DELETE FROM {COLUMN_VALUES} WHERE op = ?", (op,))
+    if staged is not None:
+        source = f"SELECT ?, row, value FROM {quote(staged)}"
+    else:
+        source = f"SELECT ?, rowid, {quote(column)} FROM {quote(table)} WHERE {quote(column)} IS NOT NULL"
+    conn.execute(f"INSERT INTO {COLUMN_VALUES} (op, row, value) {source}", (op,))
+
+
+def _columns(conn, table):
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({quote(table)})")]
+
+
+def _apply(conn, op, table, change, direction):
+    """Move one change forward ("redo") or back ("undo"), checking for later edits first."""
+    kind, rowid, before, after = change
+    source, target = (before, after) if direction == "redo" else (after, before)
+    if kind == "ddl":
+        if source["column"] is not None and source["column"] not in _columns(conn, table):
+            raise ChangelogError(f"Column '{source['column']}' of '{table}' no longer exists.")
+        if target["column"] is not None and target["column"] in _columns(conn, table):
+            raise ChangelogError(f"Column '{target['column']}' of '{table}' already exists.")
+        if target["sql"]:
+            if target["column"] is None:
+                # Redoing a drop: keep the values the column has now for the next undo
+                _keep_values(conn, op, table, source["column"])
+            conn.execute(target["sql"])
+        else:
+            # Undoing a drop: add the column back and restore its values
+            conn.execute(f"ALTER TABLE {quote(table)} ADD COLUMN {target['definition']}")
+            name = quote(_columns(conn, table)[-1])
+            conn.execute(
+                f"UPDATE {quote(table)} SET {name} = v.value FROM {COLUMN_VALUES} v "
+                f"WHERE v.op = ? AND v.row = {quote(table)}.rowid",
+                (op,),
+            )
+        return
+    current = _image(conn, table, rowid)
+    if kind == "update":
+        if current is None or any(current.get(col) != value for col, value in source.items()):
+            raise ChangelogError(f"Row {rowid} of '{table}' was changed since.")
+        assignments = ", ".join(f"{quote(col)} = ?" for col in target)
+        conn.execute(f"UPDATE {quote(table)} SET {assignments} WHERE rowid = ?", (*target.values(), rowid))
+    elif target is None:
+        if current != source:
+            raise ChangelogError(f"Row {rowid} of '{table}' was changed since.")
+        conn.execute(f"DELETE FROM {quote(table)} WHERE rowid = ?", (rowid,))
+    else:
+        if current is not None:
+            raise ChangelogError(f"Row {rowid} of '{table}' exists again.")
+        columns = [col for col in target if col in _columns(conn, table)]
+        conn.execute(
+            f"INSERT INTO {quote(table)} (rowid, {', '.join(quote(c) for c in columns)}) "
+            f"VALUES (?, {', '.join('?' * len(columns))})",
+            (rowid, *(target[c] for c in columns)),
+        )
+
+
+def _move(op, direction):
+    def work(conn):
+        try:
+            row = conn.execute(f"SELECT tbl, undone, label FROM {OPERATIONS} WHERE id = ?", (op,)).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row is None:
+            raise ChangelogError(f"Operation {op} is not in the log.")
+        table, undone, label = row
+        if bool(undone) == (direction == "undo"):
+            raise ChangelogError(f"Operation {op} ({label}) is already {'undone' if undone else 'applied'}.")
+        changes = [
+            (kind, rowid, _decode(before), _decode(after))
+            for kind, rowid, before, after in conn.execute(
+                f"SELECT kind, row, before, after FROM {CHANGES} WHERE op = ? ORDER BY seq", (op,)
+            )
+        ]
+        for change in (changes if direction == "redo" else reversed(changes)):
+            _apply(conn, op, table, change, direction)
+        conn.execute(f"UPDATE {OPERATIONS} SET undone = ? WHERE id = ?", (int(direction == "undo"), op))
+    return work
+
+
+def undo(op):
+    """Writer callable reverting operation `op`."""
+    return _move(op, "undo")
+
+
+def redo(op):
+    """Writer callable re-applying operation `op` after an undo."""
+    return _move(op, "redo")
+
+
+def operations(db, limit=100):
+    """Most recent operations first: {"id", "at", "label", "table", "undone", "changes"}."""
+    try:
+        rows = db.execute(
+            f"SELECT o.id, o.at, o.label, o.tbl, o.undone, (SELECT count(*) FROM {CHANGES} c WHERE c.op = o.id) "
+            f"FROM {OPERATIONS} o ORDER BY o.id DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    return [
+        {"id": row[0], "at": row[1], "label": row[2], "table": row[3], "undone": bool(row[4]), "changes": row[5]}
+        for row in rows
+    ]
@@ -1,5 +1,147 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "data" / "default.sqlite"
-EXCEL_DIR = BASE_DIR / "data" / "excel_versions"
\ No newline at end of file
+# SQLFLASK_DATA_DIR points the app at another data directory, e.g. for benchmarks
+DB_PATH = Path(os.environ.get("SQLFLASK_DATA_DIR", BASE_DIR / "data")) / "default.sqlite"
+EXCEL_DIR = BASE_DIR / "data" / "excel_versions"
+
+# Row listing (/data-list/<table_name>)
+DATA_LIST_PAGE_SIZE = 100  # rows per page when no ?limit= is given
+DATA_LIST_MAX_PAGE_SIZE = 1000  # upper bound for ?limit=
+DATA_LIST_STREAM_BATCH = 500  # rows fetched per fetchmany() when streaming
+
+# Connection pool (see pool.py); limits are per worker process
+POOL_MAX_PER_DB = 4  # connections checked out at once per database file
+POOL_MAX_OPEN = 64  # open connections across all database files
+POOL_IDLE_TIMEOUT = 300  # seconds before an idle connection is closed
+POOL_WAIT_TIMEOUT = 5  # seconds to wait for a free connection
+POOL_HEALTH_CHECK_AFTER = 5  # ping connections idle longer than this; file identity is checked on every checkout
+
+# SQLite PRAGMA profiles applied to every new connection (see pragmas.py)
+PRAGMA_PROFILES = {
+    # Plain SQLite defaults: rollback journal, writers block readers
+    "default": {},
+    "production": {
+        "busy_timeout": 5000,  # ms to wait on a lock instead of failing
+        "auto_vacuum": "INCREMENTAL",  # new files only: lets maintenance.py release free pages in steps
+        "journal_mode": "WAL",  # readers no longer block on writers
+        "synchronous": "NORMAL",  # durable at checkpoints; safe with WAL
+        "cache_size": -65536,  # negative means KiB: 64 MiB page cache
+        "mmap_size": 268435456,  # 256 MiB memory-mapped I/O
+        "temp_store": "MEMORY",
+    },
+    # Copies kept by a read replica (see replication.py): written only by the
+    # replication apply, under a rollback-journal lock readers wait on
+    "replica": {
+        "busy_timeout": 5000,
+        "query_only": 1,
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+}
+DEFAULT_PRAGMA_PROFILE = "production"
+# Per-database overrides keyed by file name, e.g. {"legacy.sqlite": "default"}
+DATABASE_PRAGMA_PROFILES = {}
+
+# Bulk import (see bulk_import.py)
+BULK_IMPORT_BATCH_SIZE = 50_000  # rows parsed and inserted per executemany()
+BULK_IMPORT_COMMIT_ROWS = 500_000  # rows per transaction
+
+# Streaming export (see export.py)
+EXPORT_BATCH_SIZE = 10_000  # rows per fetchmany() / Parquet row group / Arrow record batch
+
+# Versioned Excel snapshots (see reporting/snapshots.py)
+SNAPSHOT_DIR = EXCEL_DIR / "snapshots"
+SNAPSHOT_KEEP_LAST = 20  # newest snapshots always kept
+SNAPSHOT_MAX_AGE_DAYS = 90  # older snapshots beyond the newest ones are pruned
+SNAPSHOT_MAX_BYTES = 2 * 1024**3  # cap on stored snapshot data
+SNAPSHOT_XLSX_CACHE = 5  # materialized .xlsx files kept around
+
+# Query API (see query.py)
+QUERY_DEFAULT_LIMIT = 100
+QUERY_MAX_LIMIT = 1000
+
+# Index advisor (see index_advisor.py)
+INDEX_ADVISOR_MIN_HITS = 10  # executions of a query shape before an index is proposed
+INDEX_ADVISOR_AUTO_CREATE = False  # opt-in: create proposed indexes automatically
+INDEX_ADVISOR_MAX_COVERING = 4  # append selected columns to make an index covering, up to this many
+
+# Query instrumentation, /metrics and slow-query log (see instrumentation.py)
+INSTRUMENTATION_ENABLED = True
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)  # seconds
+METRICS_MAX_STATEMENTS = 500  # distinct statements tracked; the rest are counted as "other"
+SLOW_QUERY_SECONDS = 0.1  # statements slower than this are logged with their query plan
+SLOW_QUERY_LOG = DB_PATH.parent / "slow_queries.log"
+
+# HTMX fragment cache with ETag/304 (see fragment_cache.py)
+FRAGMENT_CACHE_MAX_BYTES = 8 * 1024**2  # rendered partials kept in memory per process
+FRAGMENT_CACHE_MAX_ENTRIES = 1024
+
+# ASGI serving mode (see asgi.py); per worker process. Short and streaming
+# threads per database together should not exceed POOL_MAX_PER_DB.
+ASGI_DB_THREADS = 2  # threads per database file for short queries
+ASGI_STREAM_THREADS = 2  # threads per database file for long streaming exports
+ASGI_STREAM_QUEUE = 8  # chunks buffered ahead of a slow client before the producer waits
+ASGI_WSGI_THREADS = 32  # threads running the mounted Flask app
+
+# Single-writer group commit (see writer.py)
+WRITER_MAX_BATCH = 256  # writes committed together at most
+WRITER_MAX_LATENCY = 0.002  # seconds the writer waits for more writes before committing
+WRITER_TIMEOUT = 30  # seconds a request waits for its write to be committed
+WRITER_IDLE_TIMEOUT = 60  # seconds before an idle writer thread closes its connection
+
+# Database catalog (see catalog.py)
+CATALOG_NAME = "_catalog.db"  # control database in DATA_DIR; not listed since it lacks the .sqlite suffix
+CATALOG_STAT_TTL = 5  # seconds before files are re-stat'ed even if the directory did not change
+
+# Maintenance jobs: backup, vacuum, optimize, integrity check (see maintenance.py)
+MAINTENANCE_BACKUP_DIR = DB_PATH.parent / "backups"
+MAINTENANCE_BACKUP_PAGES = 256  # pages copied per backup step
+MAINTENANCE_BACKUP_SLEEP = 0.01  # seconds between backup steps, letting writers in
+MAINTENANCE_KEEP_BACKUPS = 5  # newest backups kept per database
+MAINTENANCE_VACUUM_PAGES = 512  # free pages released per incremental_vacuum transaction
+MAINTENANCE_ANALYSIS_LIMIT = 1000  # rows per index sampled by ANALYZE
+MAINTENANCE_INTERVAL = 24 * 3600  # seconds between scheduled runs of every job; None disables the schedule
+
+# Background schema migrations (see migrations.py)
+MIGRATION_BACKGROUND_ROWS = 100_000  # tables spanning at least this many rowids are rebuilt in the background
+MIGRATION_CHUNK_ROWS = 5_000  # rows copied into the shadow table per write transaction
+MIGRATION_CHUNK_PAUSE = 0.01  # seconds between chunks, letting other writes in
+
+# Table and column profiling (see profiling.py)
+PROFILING_CHUNK_ROWS = 10_000  # rows read per step of a profiling scan
+PROFILING_HLL_PRECISION = 12  # 2**12 HyperLogLog registers per column, about 1.6% error on distinct counts
+PROFILING_TOPK = 5  # most frequent values shown per column
+PROFILING_TOPK_CAPACITY = 64  # frequent-value counters kept per column; more is more accurate
+PROFILING_FULL_SCAN_AGE = 7 * 24 * 3600  # seconds before a table is rescanned in full, to pick up updated rows
+
+# Full-text search (see search.py)
+SEARCH_RESULTS_LIMIT = 50  # results returned by /search across all tables
+SEARCH_SNIPPET_TOKENS = 12  # words of context around each match
+
+# Application startup (see app.py)
+TEMPLATE_CACHE_DIR = BASE_DIR / ".template_cache"  # Jinja bytecode cache shared by workers; None disables it
+
+# Read replicas (see replication.py). The primary serves its DATA_DIR over a
+# socket; a replica pulls changed pages into REPLICATION_REPLICA_DIR and
+# serves GET requests from there.
+REPLICATION_ROLE = os.environ.get("SQLFLASK_REPLICATION_ROLE")  # None, "primary" or "replica"
+REPLICATION_ADDRESS = os.environ.get("SQLFLASK_REPLICATION_ADDRESS", "127.0.0.1:8790")  # primary listens, replicas connect
+REPLICATION_REPLICA_DIR = Path(os.environ.get("SQLFLASK_REPLICA_DIR", DB_PATH.parent / "replica"))
+REPLICATION_PRIMARY_URL = os.environ.get("SQLFLASK_PRIMARY_URL")  # replicas forward writes here, e.g. http://primary:5000
+REPLICATION_INTERVAL = 0.5  # seconds between pulls on a replica
+REPLICATION_MAX_LAG = 5  # seconds; staler replicas are bypassed for reads when the primary file is local
+REPLICATION_SNAPSHOTS = 4  # page digest lists kept per database on the primary to compute deltas
+# Shared secret replicas authenticate with; without it the primary only binds loopback addresses
+REPLICATION_SECRET = os.environ.get("SQLFLASK_REPLICATION_SECRET")
+REPLICATION_MAX_MESSAGE = 64 * 1024 * 1024  # bytes; larger control messages are refused
+
+# Audit log with undo/redo (see changelog.py)
+CHANGELOG_KEEP_OPERATIONS = 10_000  # most recent operations kept per database
+CHANGELOG_COMPRESS_BYTES = 1024  # row images larger than this are stored zlib-compressed
+
+# Analytics over Polars lazy scans (see analytics.py)
+ANALYTICS_CACHE_MAX_ENTRIES = 64  # result frames kept in the in-process LRU
+ANALYTICS_CACHE_MAX_BYTES = 64 * 1024 * 1024  # total estimated size of the cached frames
@@ -0,0 +1,227 @@
+"""
+export.py
+
+Streaming table export for the SQLFlask application.
+
+Rows are read from an open cursor with fetchmany() in fixed-size batches
+and serialized batch by batch, so exporting a large table needs memory
+for one batch only and the first bytes go out immediately. CSV and NDJSON
+are plain text chunks; Parquet (one row group per batch) and Arrow IPC
+(one record batch per batch) are written with pyarrow.
+
+The Arrow schema has to be fixed before the first batch is written, and
+SQLite columns are dynamically typed, so it comes from the declared types
+checked against the first batch: a column whose first values do not fit
+its declared type is widened (to float64 or string), and NUMERIC or
+untyped columns are typed by what the batch holds (see arrow_type()). A
+later value that still does not fit its column ends the export with an
+ExportError rather than being written wrong.
+"""
+
+import base64
+import csv
+import io
+import json
+
+from .config import EXPORT_BATCH_SIZE
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+
+def batches(cursor, batch_size=EXPORT_BATCH_SIZE):
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        yield batch
+
+
+def csv_chunks(cursor, batch_size=EXPORT_BATCH_SIZE):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([d[0] for d in cursor.description])
+    yield buf.getvalue()
+    for batch in batches(cursor, batch_size):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(batch)
+        yield buf.getvalue()
+
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def ndjson_chunks(cursor, batch_size=EXPORT_BATCH_SIZE):
+    columns = [d[0] for d in cursor.description]
+    for batch in batches(cursor, batch_size):
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + "\n" for row in batch
+        )
+
+
+class ExportError(ValueError):
+    pass
+
+
+# SQLite storage class of each Python value a cursor returns
+STORAGE = {int: "integer", float: "real", str: "text", bytes: "blob"}
+
+
+def storage_classes(rows, columns):
+    """{column: set of storage classes} of the values in `rows`, e.g. the first batch."""
+    return {c: {STORAGE[type(row[i])] for row in rows if row[i] is not None} for i, c in enumerate(columns)}
+
+
+def affinity(declared):
+    # SQLite type affinity rules (https://www.sqlite.org/datatype3.html#determination_of_column_affinity)
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return "integer"
+    if any(t in declared for t in ("CHAR", "CLOB", "TEXT")):
+        return "text"
+    if "BLOB" in declared or not declared:
+        return "blob"
+    if any(t in declared for t in ("REAL", "FLOA", "DOUB")):
+        return "real"
+    return "numeric"
+
+
+def arrow_type(pa, declared, storage=None, complete=True):
+    """
+    Arrow type for a column from its declared type and the storage classes
+    seen in its first values; `complete` says those were all its values.
+
+    INTEGER, REAL and TEXT columns keep their type unless a value does not
+    fit. A BLOB column stays binary only while it holds blobs. NUMERIC
+    columns (DECIMAL, DATE, BOOLEAN, ...) and columns without a declared
+    type are numbers if only numbers were seen - float64, unless the whole
+    column was seen and holds integers only - and text otherwise, because
+    a NUMERIC column keeps non-numeric text such as ISO dates as text.
+    """
+    storage = storage or set()
+    kind = affinity(declared)
+    if kind == "integer" and not storage - {"integer"}:
+        return pa.int64()
+    if kind in ("integer", "real") and not storage - {"integer", "real"}:
+        return pa.float64()
+    if "BLOB" in (declared or "").upper() and not storage - {"blob"}:
+        return pa.binary()
+    if kind in ("numeric", "blob") and storage and not storage - {"integer", "real"}:
+        return pa.int64() if complete and storage == {"integer"} else pa.float64()
+    if kind == "blob" and storage == {"blob"}:
+        return pa.binary()
+    return pa.string()
+
+
+def _as_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    return str(value)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain().
+
+    tell() keeps counting across drains because the Parquet writer records
+    absolute offsets in its footer.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def arrow_schema(pa, table_info, columns, first=None, complete=False):
+    """Schema of an export of `columns`, typed from table_info and the `first` rows (see arrow_type())."""
+    declared = {col["name"]: col["type"] for col in table_info}
+    storage = storage_classes(first or [], columns)
+    return pa.schema([(name, arrow_type(pa, declared.get(name), storage[name], complete)) for name in columns])
+
+
+# Storage classes each non-text Arrow type takes
+_FITS = {"int64": {"integer"}, "double": {"integer", "real"}, "binary": {"blob"}}
+
+
+def _column(pa, values, field):
+    if pa.types.is_string(field.type):
+        # Dynamic typing: a TEXT column may hold numbers; Arrow needs strings
+        return pa.array([_as_text(v) for v in values], type=field.type)
+    try:
+        return pa.array(values, type=field.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        bad = next(v for v in values if v is not None and STORAGE.get(type(v)) not in _FITS[str(field.type)])
+        raise ExportError(
+            f"Column '{field.name}' holds {STORAGE.get(type(bad), type(bad).__name__)} value {bad!r} "
+            f"but was typed {field.type} from its first rows"
+        )
+
+
+def record_batches(cursor, schema, batch_size=EXPORT_BATCH_SIZE, first=None):
+    """Arrow record batches of `schema` from the rows of an open cursor, after the `first` rows already fetched."""
+    import pyarrow as pa
+
+    def rows():
+        if first:
+            yield first
+        yield from batches(cursor, batch_size)
+
+    for batch in rows():
+        values = [list(col) for col in zip(*batch)]
+        yield pa.record_batch([_column(pa, values[i], field) for i, field in enumerate(schema)], schema=schema)
+
+
+def arrow_chunks(cursor, table_info, fmt, batch_size=EXPORT_BATCH_SIZE):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    first = cursor.fetchmany(batch_size)
+    columns = [d[0] for d in cursor.description]
+    schema = arrow_schema(pa, table_info, columns, first, complete=len(first) < batch_size)
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    else:
+        writer = pa.ipc.new_file(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        for batch in record_batches(cursor, schema, batch_size, first):
+            writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(cursor, table_info, fmt, batch_size=EXPORT_BATCH_SIZE):
+    if fmt == "csv":
+        return csv_chunks(cursor, batch_size)
+    if fmt == "ndjson":
+        return ndjson_chunks(cursor, batch_size)
+    if fmt in ("parquet", "arrow"):
+        return arrow_chunks(cursor, table_info, fmt, batch_size)
+    raise ValueError(f"Unsupported export format '{fmt}'")
@@ -0,0 +1,152 @@
+"""
+fragment_cache.py
+
+Response cache for HTMX partials in the SQLFlask application.
+
+Views decorated with @cached_partial(describe) keep their rendered
+fragment in an in-process LRU (bounded by entry count and total bytes)
+and answer with a strong ETag, so a polling browser gets 304 Not Modified.
+
+describe() returns (key, stat, version) for the current request:
+  key     - what the fragment depends on besides the URL, e.g. the database
+            path and the session's current table;
+  stat    - a token from os.stat() of the underlying files, compared on
+            every request without running any SQL or Jinja;
+  version - a callable returning the logical version, e.g. PRAGMA
+            schema_version. It is only called when stat changed, so a
+            write that does not touch the schema refreshes the stat token
+            and the cached fragment is still served.
+
+Only argument-less HTMX GETs are cached; anything else goes straight to
+the view.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from .config import FRAGMENT_CACHE_MAX_BYTES, FRAGMENT_CACHE_MAX_ENTRIES
+
+
+def file_token(*paths):
+    """(mtime_ns, size) for each path, None for files that do not exist."""
+    token = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            token.append(None)
+        else:
+            token.append((st.st_mtime_ns, st.st_size))
+    return tuple(token)
+
+
+def database_token(db_path):
+    return file_token(db_path, f"{db_path}-wal")
+
+
+class FragmentCache:
+    def __init__(self, max_bytes=FRAGMENT_CACHE_MAX_BYTES, max_entries=FRAGMENT_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> {"stat", "version", "etag", "body", "mimetype"}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        size = len(entry["body"])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old["body"])
+            self._entries[key] = entry
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted["body"])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def lookup(self, key, stat, version):
+        """Cached entry still valid for this stat token, or None."""
+        entry = self.get(key)
+        if entry is None:
+            return None
+        if entry["stat"] != stat:
+            if version() != entry["version"]:
+                return None
+            # Files changed but not in a way this fragment depends on
+            entry["stat"] = stat
+        return entry
+
+
+fragment_cache = FragmentCache()
+
+
+def cached_partial(describe):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET" or request.args or request.headers.get("HX-Request") != "true":
+                return view(*args, **kwargs)
+            key, stat, version = describe()
+            key = (request.endpoint, key)
+            entry = fragment_cache.lookup(key, stat, version)
+            if entry is None:
+                fragment_cache.misses += 1
+                # Read the version before rendering so a concurrent change re-renders next time
+                current = version()
+                rendered = make_response(view(*args, **kwargs))
+                if rendered.status_code != 200:
+                    return rendered
+                body = rendered.get_data()
+                entry = {
+                    "stat": stat,
+                    "version": current,
+                    "etag": hashlib.sha256(body).hexdigest()[:32],
+                    "body": body,
+                    "mimetype": rendered.mimetype,
+                }
+                fragment_cache.put(key, entry)
+            else:
+                fragment_cache.hits += 1
+            response = Response(entry["body"], mimetype=entry["mimetype"])
+            response.set_etag(entry["etag"])
+            # Let the browser keep the fragment but revalidate it on every poll
+            response.headers["Cache-Control"] = "no-cache"
+            response.vary.add("HX-Request")
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                fragment_cache.not_modified += 1
+            return response
+        return wrapper
+    return decorator
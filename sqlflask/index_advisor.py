@@ -0,0 +1,220 @@
+"""
+index_advisor.py
+
+Workload-driven index advisor for the SQLFlask application.
+
+Views report each query they run through the query API as a *shape*:
+the equality columns, range columns, ORDER BY keys and selected columns,
+ignoring the literal values. For shapes that run often, the advisor runs
+EXPLAIN QUERY PLAN on a sample statement and, when SQLite has to scan the
+table or sort in a temporary b-tree, proposes an index: equality columns
+first, then one range column or the ORDER BY keys, then (if few) the
+selected columns so the index is covering.
+
+Each proposal carries an estimate of rows examined before and after.
+Once an index is created, later executions of the same shape are timed
+separately so the Indexes view can show the measured gain next to the
+estimate. Creating indexes automatically is opt-in via
+INDEX_ADVISOR_AUTO_CREATE.
+"""
+
+import threading
+import time
+
+from .config import INDEX_ADVISOR_MIN_HITS, INDEX_ADVISOR_AUTO_CREATE, INDEX_ADVISOR_MAX_COVERING
+from .query import compile_query, quote
+from .writer import writer
+
+EQUALITY_OPS = {"eq", "in", "isnull"}
+RANGE_OPS = {"lt", "le", "gt", "ge", "like"}
+
+
+def query_shape(table, query):
+    eq = tuple(sorted({c for c, op, _ in query["filters"] if op in EQUALITY_OPS}))
+    rng = tuple(sorted({c for c, op, _ in query["filters"] if op in RANGE_OPS} - set(eq)))
+    return table, eq, rng, tuple(query["sort"]), tuple(query["select"])
+
+
+def explain(db, sql, params=()):
+    """Detail lines of EXPLAIN QUERY PLAN for a statement."""
+    # A cached EXPLAIN statement is not re-prepared after DDL and would keep
+    # reporting the old plan, so make the text unique per schema version.
+    version = db.execute("PRAGMA schema_version").fetchone()[0]
+    return [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql} -- schema {version}", params).fetchall()]
+
+
+def plan_needs_index(plan, filtered=True):
+    # Without a WHERE clause a full scan is inherent; only an extra sort is avoidable
+    if any("TEMP B-TREE" in line for line in plan):
+        return True
+    return filtered and any(line.startswith("SCAN") and "INDEX" not in line for line in plan)
+
+
+def rowid_alias(db, table):
+    pk = [col for col in db.execute(f"PRAGMA table_info({quote(table)})").fetchall() if col[5]]
+    return pk[0][1] if len(pk) == 1 and pk[0][2].upper() == "INTEGER" else None
+
+
+def existing_indexes(db, table):
+    """{index name: [columns]} for a table."""
+    indexes = {}
+    for index in db.execute(f"PRAGMA index_list({quote(table)})").fetchall():
+        indexes[index[1]] = [col[2] for col in db.execute(f"PRAGMA index_info({quote(index[1])})").fetchall()]
+    return indexes
+
+
+def estimate_rows(db, table, eq, rng, sample_size=1000):
+    """
+    Rough (rows examined without index, rows examined with index).
+
+    Table size comes from the rowid range, which is O(1); equality
+    selectivity from the number of distinct values in a small sample;
+    a range predicate is assumed to keep a quarter of the rows.
+    """
+    low, high = db.execute(f"SELECT min(rowid), max(rowid) FROM {quote(table)}").fetchone()
+    rows = (high - low + 1) if high is not None else 0
+    after = float(rows)
+    for column in eq:
+        sampled, distinct = db.execute(
+            f"SELECT count(*), count(DISTINCT {quote(column)}) FROM (SELECT {quote(column)} FROM {quote(table)} LIMIT ?)",
+            (sample_size,),
+        ).fetchone()
+        if sampled:
+            after /= max(distinct, 1)
+    if rng:
+        after /= 4
+    return rows, max(1, round(after)) if rows else 0
+
+
+class IndexAdvisor:
+    def __init__(self, min_hits=INDEX_ADVISOR_MIN_HITS, auto_create=INDEX_ADVISOR_AUTO_CREATE):
+        self.min_hits = min_hits
+        self.auto_create = auto_create
+        self._lock = threading.Lock()
+        self._shapes = {}  # (db_path, shape) -> stats dict
+
+    def record(self, db_path, table, query, seconds, db=None):
+        """Count one execution of a query; may create an index in auto mode."""
+        shape = query_shape(table, query)
+        with self._lock:
+            stats = self._shapes.get((db_path, shape))
+            if stats is None:
+                sql, params = compile_query(table, query)
+                stats = self._shapes[(db_path, shape)] = {
+                    "table": table,
+                    "eq": shape[1],
+                    "range": shape[2],
+                    "sort": shape[3],
+                    "select": shape[4],
+                    "sql": sql,
+                    "params": params,
+                    "count": 0,
+                    "before": [0, 0.0],  # executions, seconds before the advisor created an index
+                    "after": [0, 0.0],
+                    "index": None,
+                }
+            stats["count"] += 1
+            bucket = stats["after"] if stats["index"] else stats["before"]
+            bucket[0] += 1
+            bucket[1] += seconds
+            due = self.auto_create and db is not None and stats["count"] == self.min_hits and not stats["index"]
+        if due:
+            for proposal in self.proposals(db, db_path, table):
+                self.create(db, db_path, proposal)
+
+    def workload(self, db_path, table=None):
+        with self._lock:
+            return [
+                dict(stats)
+                for (path, _), stats in self._shapes.items()
+                if path == db_path and (table is None or stats["table"] == table)
+            ]
+
+    def propose(self, db, stats):
+        """Index proposal for one shape, or None if the current plan is fine."""
+        table = stats["table"]
+        plan = explain(db, stats["sql"], stats["params"])
+        if not plan_needs_index(plan, bool(stats["eq"] or stats["range"])):
+            return None
+        alias = rowid_alias(db, table)
+        columns = [c for c in stats["eq"] if c != alias]
+        if stats["range"]:
+            columns.append(stats["range"][0])
+        elif stats["sort"] and not any(desc != stats["sort"][0][1] for _, desc in stats["sort"]):
+            columns += [c for c, _ in stats["sort"] if c not in columns and c != alias]
+        if not columns:
+            return None
+        extra = [c for c in stats["select"] if c not in columns and c != alias]
+        if len(extra) <= INDEX_ADVISOR_MAX_COVERING:
+            columns += extra
+        if any(cols[: len(columns)] == columns for cols in existing_indexes(db, table).values()):
+            return None
+        before, after = estimate_rows(db, table, stats["eq"], stats["range"])
+        return {
+            "table": table,
+            "columns": columns,
+            "name": f"ix_{table}_{'_'.join(columns)}",
+            "plan": plan,
+            "hits": stats["count"],
+            "est_rows_before": before,
+            "est_rows_after": after,
+            "est_speedup": before / after if after else None,
+        }
+
+    def proposals(self, db, db_path, table=None):
+        seen, result = set(), []
+        for stats in self.workload(db_path, table):
+            if stats["count"] < self.min_hits or stats["index"]:
+                continue
+            proposal = self.propose(db, stats)
+            if proposal and proposal["name"] not in seen:
+                seen.add(proposal["name"])
+                result.append(proposal)
+        return sorted(result, key=lambda p: p["hits"], reverse=True)
+
+    def create(self, db, db_path, proposal):
+        """Create a proposed index and start timing its shapes separately."""
+        table, columns, name = proposal["table"], proposal["columns"], proposal["name"]
+        sql = f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({', '.join(quote(c) for c in columns)})"
+        writer.execute(db_path, (sql, ()))
+        with self._lock:
+            for (path, _), stats in self._shapes.items():
+                if path == db_path and stats["table"] == table and stats["index"] is None:
+                    if any(name in line for line in explain(db, stats["sql"], stats["params"])):
+                        stats["index"] = name
+        return name
+
+    def forget_index(self, db_path, name):
+        """Reset shapes served by a dropped index so they are timed and proposed again."""
+        with self._lock:
+            for (path, _), stats in self._shapes.items():
+                if path == db_path and stats["index"] == name:
+                    stats["index"] = None
+                    stats["after"] = [0, 0.0]
+
+    def measured_gains(self, db_path):
+        """Average latency before/after for shapes served by an advisor-created index."""
+        gains = []
+        for stats in self.workload(db_path):
+            (n_before, s_before), (n_after, s_after) = stats["before"], stats["after"]
+            if stats["index"] and n_before and n_after:
+                before_ms, after_ms = s_before / n_before * 1000, s_after / n_after * 1000
+                gains.append({
+                    "index": stats["index"],
+                    "table": stats["table"],
+                    "sql": stats["sql"],
+                    "before_ms": before_ms,
+                    "after_ms": after_ms,
+                    "speedup": before_ms / after_ms if after_ms else None,
+                })
+        return gains
+
+
+def timed(db, sql, params):
+    """Run a query and return (rows, seconds) for recording."""
+    started = time.perf_counter()
+    rows = db.execute(sql, params).fetchall()
+    return rows, time.perf_counter() - started
+
+
+advisor = IndexAdvisor()
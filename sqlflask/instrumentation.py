@@ -0,0 +1,268 @@
+"""
+instrumentation.py
+
+Statement-level timing for every SQLite connection the app opens.
+
+pragmas.connect() creates connections with InstrumentedConnection as the
+sqlite3 factory, so every execute(), executemany(), executescript() and
+commit() - whether called on the connection or on one of its cursors - is
+timed and recorded in an in-memory histogram keyed by statement text,
+Flask endpoint and database file. Time spent in fetchone/fetchmany/fetchall
+is added to a separate per-statement counter, since SQLite does part of a
+query's work lazily while rows are fetched.
+
+Statements slower than SLOW_QUERY_SECONDS are written to the slow-query
+log together with their EXPLAIN QUERY PLAN. The /metrics blueprint renders
+the registry in the Prometheus text exposition format.
+"""
+
+import bisect
+import contextvars
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from flask import has_request_context, request
+
+from .config import METRICS_BUCKETS, METRICS_MAX_STATEMENTS, SLOW_QUERY_SECONDS, SLOW_QUERY_LOG
+
+slow_log = logging.getLogger("sqlflask.slow_query")
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def normalize(sql):
+    return re.sub(r"\s+", " ", sql).strip()[:300]
+
+
+# Set by handlers that run outside a Flask request context (see asgi.py)
+route_name = contextvars.ContextVar("sqlflask_route", default=None)
+
+
+def current_route():
+    if has_request_context():
+        return request.endpoint or "-"
+    return route_name.get() or "-"
+
+
+class Metrics:
+    def __init__(self, buckets=METRICS_BUCKETS, max_statements=METRICS_MAX_STATEMENTS, slow_seconds=SLOW_QUERY_SECONDS):
+        self.buckets = tuple(buckets)
+        self.max_statements = max_statements
+        self.slow_seconds = slow_seconds
+        self._lock = threading.Lock()
+        self._series = {}  # (statement, route, db) -> [bucket counts..., sum, count, fetch seconds]
+        self._statements = set()
+        self.slow = 0
+
+    def _key(self, sql, db):
+        statement = normalize(sql)
+        if statement not in self._statements:
+            if len(self._statements) >= self.max_statements:
+                statement = "other"
+            else:
+                self._statements.add(statement)
+        return statement, current_route(), db
+
+    def observe(self, conn, sql, params, seconds):
+        db = os.path.basename(getattr(conn, "db_path", "") or "-")
+        with self._lock:
+            key = self._key(sql, db)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0, 0.0]
+            index = bisect.bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-3] += seconds
+            series[-2] += 1
+            slow = seconds >= self.slow_seconds
+            if slow:
+                self.slow += 1
+        if slow:
+            log_slow_query(conn, key, sql, params, seconds)
+        return key
+
+    def add_fetch(self, key, seconds):
+        with self._lock:
+            series = self._series.get(key)
+            if series is not None:
+                series[-1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}, self.slow
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._statements.clear()
+            self.slow = 0
+
+
+def _slow_handler():
+    if SLOW_QUERY_LOG and not slow_log.handlers:
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+        handler = logging.FileHandler(SLOW_QUERY_LOG)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.WARNING)
+
+
+def log_slow_query(conn, key, sql, params, seconds):
+    statement, route, db = key
+    plan = []
+    # params is None for executemany/executescript/commit, which have no single plan
+    if params is not None and sql.lstrip().upper().startswith(EXPLAINABLE):
+        try:
+            # Bypass the instrumented execute so the EXPLAIN itself is not recorded, and key
+            # the text by schema version: cached EXPLAIN statements are not re-prepared after DDL
+            version = sqlite3.Connection.execute(conn, "PRAGMA schema_version").fetchone()[0]
+            rows = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql} -- schema {version}", params).fetchall()
+            plan = [row[3] for row in rows]
+        except sqlite3.Error as e:
+            plan = [f"(no plan: {e})"]
+    _slow_handler()
+    slow_log.warning(
+        "slow query %.1f ms db=%s route=%s sql=%s plan=%s",
+        seconds * 1000, db, route, statement, " | ".join(plan) or "-",
+    )
+
+
+metrics = Metrics()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _metric_key = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._metric_key = metrics.observe(self.connection, sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._metric_key = metrics.observe(self.connection, sql, None, time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._metric_key = metrics.observe(self.connection, sql_script, None, time.perf_counter() - started)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            if self._metric_key is not None:
+                metrics.add_fetch(self._metric_key, time.perf_counter() - started)
+
+    def fetchone(self):
+        return self._fetch(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(sqlite3.Cursor.fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(sqlite3.Cursor.fetchall)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection factory that records every statement in `metrics`."""
+
+    db_path = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The C implementations of these skip Cursor.execute, so route them through a cursor
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            metrics.observe(self, "COMMIT", None, time.perf_counter() - started)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def render_prometheus(pool_stats=None, schema_cache=None, fragment_stats=None, writer_stats=None, replication_stats=None):
+    """Prometheus text exposition of the statement histograms and pool counters."""
+    series, slow = metrics.snapshot()
+    lines = [
+        "# HELP sqlflask_sql_duration_seconds Time spent executing SQL statements.",
+        "# TYPE sqlflask_sql_duration_seconds histogram",
+    ]
+    for (statement, route, db), values in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip(metrics.buckets, values):
+            cumulative += count
+            lines.append(f"sqlflask_sql_duration_seconds_bucket{_labels(statement=statement, route=route, db=db, le=bound)} {cumulative}")
+        labels = _labels(statement=statement, route=route, db=db)
+        lines.append(f"sqlflask_sql_duration_seconds_bucket{_labels(statement=statement, route=route, db=db, le='+Inf')} {values[-2]}")
+        lines.append(f"sqlflask_sql_duration_seconds_sum{labels} {values[-3]}")
+        lines.append(f"sqlflask_sql_duration_seconds_count{labels} {values[-2]}")
+    lines += [
+        "# HELP sqlflask_sql_fetch_seconds_total Time spent fetching rows after execute().",
+        "# TYPE sqlflask_sql_fetch_seconds_total counter",
+    ]
+    for (statement, route, db), values in sorted(series.items()):
+        lines.append(f"sqlflask_sql_fetch_seconds_total{_labels(statement=statement, route=route, db=db)} {values[-1]}")
+    lines += [
+        "# HELP sqlflask_sql_slow_total Statements slower than the slow-query threshold.",
+        "# TYPE sqlflask_sql_slow_total counter",
+        f"sqlflask_sql_slow_total {slow}",
+    ]
+    for name, value in (pool_stats or {}).items():
+        kind = "gauge" if name in ("open", "in_use", "idle", "databases") else "counter"
+        metric = f"sqlflask_pool_{name}" + ("" if kind == "gauge" else "_total")
+        lines += [f"# TYPE {metric} {kind}", f"{metric} {value}"]
+    if schema_cache is not None:
+        lines += [
+            "# TYPE sqlflask_schema_cache_hits_total counter",
+            f"sqlflask_schema_cache_hits_total {schema_cache.hits}",
+            "# TYPE sqlflask_schema_cache_misses_total counter",
+            f"sqlflask_schema_cache_misses_total {schema_cache.misses}",
+        ]
+    for name, value in (fragment_stats or {}).items():
+        kind = "gauge" if name in ("entries", "bytes") else "counter"
+        metric = f"sqlflask_fragment_cache_{name}" + ("" if kind == "gauge" else "_total")
+        lines += [f"# TYPE {metric} {kind}", f"{metric} {value}"]
+    if writer_stats:
+        for name in next(iter(writer_stats.values())):
+            kind = "gauge" if name in ("queued", "max_batch") else "counter"
+            metric = f"sqlflask_writer_{name}" + ("" if kind == "gauge" else "_total")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines += [f"{metric}{_labels(db=db)} {stats[name]}" for db, stats in sorted(writer_stats.items())]
+    if replication_stats:
+        for name in next(iter(replication_stats.values())):
+            kind = "gauge" if name == "lag_seconds" else "counter"
+            metric = f"sqlflask_replication_{name}" + ("" if kind == "gauge" else "_total")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines += [f"{metric}{_labels(db=db)} {stats[name]}" for db, stats in sorted(replication_stats.items())]
+    return "\n".join(lines) + "\n"
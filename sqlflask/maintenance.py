@@ -0,0 +1,235 @@
+"""
+maintenance.py
+
+Background maintenance jobs for the SQLFlask databases.
+
+Deleting rows or dropping columns leaves free pages behind, the planner
+statistics are never refreshed, and nothing checks the files for damage.
+The Maintenance runner executes these jobs one at a time on a background
+thread:
+
+  backup    - hot copy through sqlite3.Connection.backup(), copying
+              MAINTENANCE_BACKUP_PAGES pages per step with a pause in
+              between. In WAL mode the copy only reads, so writers go on.
+  vacuum    - PRAGMA incremental_vacuum, MAINTENANCE_VACUUM_PAGES pages per
+              short write transaction. Files created before auto_vacuum was
+              part of the PRAGMA profile are skipped and reported.
+  convert   - one full VACUUM switching such a file to incremental
+              auto-vacuum. It rewrites the file and blocks writers while it
+              runs, so it is never scheduled, only run on request.
+  optimize  - ANALYZE (bounded by analysis_limit) and PRAGMA optimize.
+  integrity - PRAGMA quick_check.
+  profile   - table and column statistics (see profiling.py).
+
+Each job records its state, progress, message and the bytes it freed; the
+Databases view polls them through HTMX. Every MAINTENANCE_INTERVAL seconds
+the SCHEDULED jobs are queued for every database in the catalog; the
+catalog hands that run to a single worker process.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from .catalog import catalog
+from .config import (
+    MAINTENANCE_BACKUP_DIR,
+    MAINTENANCE_BACKUP_PAGES,
+    MAINTENANCE_BACKUP_SLEEP,
+    MAINTENANCE_KEEP_BACKUPS,
+    MAINTENANCE_VACUUM_PAGES,
+    MAINTENANCE_ANALYSIS_LIMIT,
+    MAINTENANCE_INTERVAL,
+)
+from .pragmas import connect
+from .profiling import profile_database
+
+JOBS = ("backup", "vacuum", "convert", "optimize", "integrity", "profile")
+SCHEDULED = tuple(kind for kind in JOBS if kind != "convert")
+
+
+def backup(db_path, report, backup_dir=MAINTENANCE_BACKUP_DIR, keep=MAINTENANCE_KEEP_BACKUPS):
+    """Copy db_path into backup_dir and prune its older backups."""
+    os.makedirs(backup_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    target = os.path.join(backup_dir, f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}.sqlite")
+
+    def progress(status, remaining, total):
+        report(1 - remaining / total if total else 1.0)
+
+    source = connect(db_path, row_factory=None)
+    destination = sqlite3.connect(target)
+    try:
+        source.backup(destination, pages=MAINTENANCE_BACKUP_PAGES, progress=progress, sleep=MAINTENANCE_BACKUP_SLEEP)
+    finally:
+        destination.close()
+        source.close()
+    backups = sorted(
+        name for name in os.listdir(backup_dir)
+        if name.startswith(f"{stem}-") and name[len(stem) + 1:len(stem) + 2].isdigit()
+    )
+    for name in backups[:-keep] if keep else []:
+        os.remove(os.path.join(backup_dir, name))
+    return {"message": os.path.basename(target)}
+
+
+def vacuum(db_path, report, pages=MAINTENANCE_VACUUM_PAGES):
+    """Release free pages to the file system in small transactions."""
+    conn = connect(db_path, row_factory=None)
+    conn.isolation_level = None  # every incremental_vacuum step commits on its own
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return {"message": f"skipped, {free} free pages: not in incremental auto-vacuum mode, run convert"}
+        remaining = free
+        while remaining:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if left >= remaining:
+                break
+            remaining = left
+            report(1 - remaining / free)
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        saved = page_count - conn.execute("PRAGMA page_count").fetchone()[0]
+        return {"message": f"{free - remaining} free pages released", "saved_bytes": max(0, saved) * page_size}
+    finally:
+        conn.close()
+
+
+def convert(db_path, report):
+    """Switch a file to incremental auto-vacuum with one full VACUUM; blocks writers."""
+    conn = connect(db_path, row_factory=None)
+    conn.isolation_level = None
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return {"message": "already in incremental auto-vacuum mode"}
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        report(0.0, "rewriting the file")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        saved = page_count - conn.execute("PRAGMA page_count").fetchone()[0]
+        return {"message": "converted to incremental auto-vacuum", "saved_bytes": max(0, saved) * page_size}
+    finally:
+        conn.close()
+
+
+def optimize(db_path, report):
+    """Refresh the query planner statistics."""
+    conn = connect(db_path, row_factory=None)
+    conn.isolation_level = None
+    try:
+        conn.execute(f"PRAGMA analysis_limit = {int(MAINTENANCE_ANALYSIS_LIMIT)}").fetchall()
+        conn.execute("ANALYZE")
+        report(0.5)
+        conn.execute("PRAGMA optimize").fetchall()
+        return {"message": "statistics updated"}
+    finally:
+        conn.close()
+
+
+def integrity(db_path, report):
+    """PRAGMA quick_check; raises if the file is damaged."""
+    conn = connect(db_path, row_factory=None)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA quick_check(20)")]
+    finally:
+        conn.close()
+    if problems != ["ok"]:
+        raise sqlite3.DatabaseError("; ".join(problems))
+    return {"message": "ok"}
+
+
+class Maintenance:
+    def __init__(self, interval=MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self.functions = {"backup": backup, "vacuum": vacuum, "convert": convert, "optimize": optimize,
+                          "integrity": integrity, "profile": profile_database}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._jobs = {}  # (db_path, kind) -> job
+        self._data_dirs = set()
+        self._thread = None
+        self._pid = None
+        self.version = 0  # bumped whenever a job changes, for cached views
+
+    def _ensure_thread(self):
+        # Called with the lock held; threads do not survive a fork
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+            self._thread.start()
+
+    def submit(self, db_path, kind):
+        """Queue a job for db_path unless one of that kind is already pending."""
+        if kind not in self.functions:
+            raise ValueError(f"Unknown maintenance job '{kind}', expected one of: {', '.join(JOBS)}")
+        with self._lock:
+            job = self._jobs.get((db_path, kind))
+            if job is not None and job["state"] in ("queued", "running"):
+                return dict(job)
+            job = self._jobs[(db_path, kind)] = {
+                "kind": kind,
+                "state": "queued",
+                "progress": 0.0,
+                "message": "",
+                "saved_bytes": 0,
+                "started": None,
+                "finished": None,
+            }
+            self.version += 1
+            self._ensure_thread()
+            self._queue.put((db_path, kind))
+            return dict(job)
+
+    def jobs(self, db_path):
+        """The latest job of each kind for db_path."""
+        with self._lock:
+            return [dict(self._jobs[(db_path, kind)]) for kind in JOBS if (db_path, kind) in self._jobs]
+
+    def schedule(self, data_dir):
+        """Run the SCHEDULED jobs on the databases in data_dir each `interval` seconds."""
+        if not self.interval:
+            return
+        with self._lock:
+            self._data_dirs.add(data_dir)
+            self._ensure_thread()
+
+    def _update(self, job, **changes):
+        with self._lock:
+            job.update(changes)
+            self.version += 1
+
+    def _run_schedule(self):
+        for data_dir in list(self._data_dirs):
+            if catalog.claim(data_dir, "maintenance_next_run", self.interval):
+                for db in catalog.databases(data_dir):
+                    for kind in SCHEDULED:
+                        self.submit(os.path.join(data_dir, db["name"]), kind)
+
+    def _run(self):
+        while True:
+            try:
+                db_path, kind = self._queue.get(timeout=60 if self.interval else None)
+            except queue.Empty:
+                self._run_schedule()
+                continue
+            job = self._jobs[(db_path, kind)]
+            self._update(job, state="running", started=time.time())
+
+            def report(progress, message=None):
+                self._update(job, progress=progress, **({"message": message} if message else {}))
+
+            try:
+                result = self.functions[kind](db_path, report)
+            except Exception as e:
+                self._update(job, state="failed", message=str(e), finished=time.time())
+            else:
+                self._update(job, state="done", progress=1.0, finished=time.time(), **result)
+
+
+maintenance = Maintenance()
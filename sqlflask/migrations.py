@@ -0,0 +1,280 @@
+"""
+migrations.py
+
+Background column renames and drops for large tables.
+
+ALTER TABLE ... DROP COLUMN rewrites the whole table in one transaction,
+and RENAME COLUMN re-parses the schema under the same lock; on tables with
+millions of rows either one holds the write lock for minutes. Tables that
+span at least MIGRATION_BACKGROUND_ROWS rowids are instead rebuilt by a
+background job:
+
+  1. The new table definition is derived by replaying the table, its
+     indexes and triggers in an in-memory database and running the ALTER
+     there, so SQLite itself rewrites the DDL and rejects invalid changes
+     (e.g. dropping an indexed column) before anything is touched.
+  2. A shadow table is created, with triggers on the original that copy
+     every concurrent INSERT/UPDATE/DELETE into it.
+  3. Rows are copied by rowid in chunks of MIGRATION_CHUNK_ROWS, each one
+     short write transaction on the database's group-commit writer, so
+     other writes interleave and readers are never blocked (WAL).
+  4. One final transaction drops the original, renames the shadow into its
+     place and recreates the indexes and triggers.
+
+A column drop also keeps the dropped values in a staging table, filled
+chunk by chunk alongside the copy and kept current by the same triggers,
+for the audit log (changelog.py). alter() takes a `log` callable that runs
+in the transaction making the change - the in-place ALTER or the final
+swap - so a change is logged exactly when it happens.
+
+Progress is kept per table and polled by the Columns view. Small tables,
+WITHOUT ROWID tables and tables with generated columns are altered in
+place as before. Adding a column never rewrites a table, so ADD COLUMN is
+always run in place.
+"""
+
+import sqlite3
+import threading
+import time
+
+from .config import MIGRATION_BACKGROUND_ROWS, MIGRATION_CHUNK_ROWS, MIGRATION_CHUNK_PAUSE
+from .query import quote
+from .schema_cache import INTERNAL_PREFIX
+from .writer import writer
+
+ACTIONS = ("rename", "drop")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def alter_statement(table, action, column, new_name=None):
+    if action == "rename":
+        return f"ALTER TABLE {quote(table)} RENAME COLUMN {quote(column)} TO {quote(new_name)}"
+    if action == "drop":
+        return f"ALTER TABLE {quote(table)} DROP COLUMN {quote(column)}"
+    raise MigrationError(f"Unknown migration '{action}', expected one of: {', '.join(ACTIONS)}")
+
+
+def plan_rebuild(db, table, action, column, new_name=None):
+    """
+    Statements for rebuilding `table` through a shadow copy, or None if it
+    has to be altered in place. Raises sqlite3.OperationalError if SQLite
+    would reject the ALTER.
+    """
+    row = db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if row is None:
+        raise MigrationError(f"Table '{table}' does not exist.")
+    columns = db.execute(f"PRAGMA table_xinfo({quote(table)})").fetchall()
+    if any(col[6] for col in columns) or " ".join(row[0].upper().split()).endswith("WITHOUT ROWID"):
+        return None
+    if db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? AND substr(name, 1, ?) = ?",
+        (table, len(INTERNAL_PREFIX), INTERNAL_PREFIX),
+    ).fetchone():
+        # Search index and summary triggers (search.py, summaries.py) would not survive the swap
+        return None
+    extras = [
+        sql for (sql,) in db.execute(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+            "AND sql IS NOT NULL AND substr(name, 1, ?) != ? ORDER BY type",
+            (table, len(INTERNAL_PREFIX), INTERNAL_PREFIX),
+        )
+    ]
+    shadow = f"{INTERNAL_PREFIX}shadow_{table}"
+    scratch = sqlite3.connect(":memory:")
+    try:
+        try:
+            scratch.execute(row[0])
+            for sql in extras:
+                scratch.execute(sql)
+        except sqlite3.Error:
+            # Triggers that refer to other tables cannot be replayed on their own
+            return None
+        scratch.execute(alter_statement(table, action, column, new_name))
+        recreate = [sql for (sql,) in scratch.execute(
+            "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL ORDER BY type"
+        )]
+        scratch.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(shadow)}")
+        create = scratch.execute("SELECT sql FROM sqlite_master WHERE name = ?", (shadow,)).fetchone()[0]
+    finally:
+        scratch.close()
+
+    old = [col[1] for col in columns]
+    if action == "rename":
+        pairs = [(name, new_name if name == column else name) for name in old]
+    else:
+        pairs = [(name, name) for name in old if name != column]
+    source = ", ".join(["rowid"] + [quote(name) for name, _ in pairs])
+    target = ", ".join(["rowid"] + [quote(name) for _, name in pairs])
+    new_values = ", ".join(["NEW.rowid"] + [f"NEW.{quote(name)}" for name, _ in pairs])
+    capture = f"{INTERNAL_PREFIX}capture_{table}"
+    staged = f"{INTERNAL_PREFIX}dropped_{table}" if action == "drop" else None
+    keep = {"insert": "", "update": "", "delete": ""}
+    if staged:
+        value = f"NEW.{quote(column)}"
+        put = f"INSERT OR REPLACE INTO {quote(staged)} (row, value) SELECT NEW.rowid, {value} WHERE {value} IS NOT NULL; "
+        remove = f"DELETE FROM {quote(staged)} WHERE row = OLD.rowid; "
+        keep = {"insert": put, "update": remove + put, "delete": remove}
+    return {
+        "table": table,
+        "shadow": shadow,
+        "create": create,
+        "capture": [
+            f"CREATE TRIGGER {quote(capture + '_insert')} AFTER INSERT ON {quote(table)} BEGIN "
+            f"INSERT OR REPLACE INTO {quote(shadow)} ({target}) VALUES ({new_values}); {keep['insert']}END",
+            f"CREATE TRIGGER {quote(capture + '_update')} AFTER UPDATE ON {quote(table)} BEGIN "
+            f"DELETE FROM {quote(shadow)} WHERE rowid = OLD.rowid; "
+            f"INSERT OR REPLACE INTO {quote(shadow)} ({target}) VALUES ({new_values}); {keep['update']}END",
+            f"CREATE TRIGGER {quote(capture + '_delete')} AFTER DELETE ON {quote(table)} BEGIN "
+            f"DELETE FROM {quote(shadow)} WHERE rowid = OLD.rowid; {keep['delete']}END",
+        ],
+        "drop_capture": [f"DROP TRIGGER IF EXISTS {quote(capture + suffix)}" for suffix in ("_insert", "_update", "_delete")],
+        "copy": (
+            f"INSERT OR REPLACE INTO {quote(shadow)} ({target}) "
+            f"SELECT {source} FROM {quote(table)} WHERE rowid > ? AND rowid <= ?"
+        ),
+        "recreate": recreate,
+        "staged": staged,
+        "stage": staged and (
+            f"INSERT OR REPLACE INTO {quote(staged)} (row, value) SELECT rowid, {quote(column)} FROM {quote(table)} "
+            f"WHERE rowid > ? AND rowid <= ? AND {quote(column)} IS NOT NULL"
+        ),
+    }
+
+
+class Migrations:
+    def __init__(
+        self,
+        writer=writer,
+        background_rows=MIGRATION_BACKGROUND_ROWS,
+        chunk_rows=MIGRATION_CHUNK_ROWS,
+        pause=MIGRATION_CHUNK_PAUSE,
+    ):
+        self.writer = writer
+        self.background_rows = background_rows
+        self.chunk_rows = chunk_rows
+        self.pause = pause
+        self._lock = threading.Lock()
+        self._jobs = {}  # (db_path, table) -> job
+
+    def job(self, db_path, table):
+        with self._lock:
+            job = self._jobs.get((db_path, table))
+            return dict(job) if job is not None else None
+
+    def running(self, db_path, table):
+        job = self.job(db_path, table)
+        return job is not None and job["state"] == "running"
+
+    def alter(self, db, db_path, table, action, column, new_name=None, log=None):
+        """
+        Rename or drop a column. Returns None when the ALTER ran in place, or
+        the job of the background rebuild it started. `log(conn, staged)`
+        runs in the transaction that makes the change, with the name of the
+        table holding a dropped column's values for background rebuilds.
+        """
+        statement = alter_statement(table, action, column, new_name)
+        if self.running(db_path, table):
+            raise MigrationError(f"A migration of table '{table}' is still running.")
+        low, high = db.execute(f"SELECT min(rowid), max(rowid) FROM {quote(table)}").fetchone()
+        plan = None
+        if high is not None and high - low + 1 >= self.background_rows:
+            plan = plan_rebuild(db, table, action, column, new_name)
+        if plan is None:
+            def in_place(conn):
+                if log is not None:
+                    log(conn, None)
+                conn.execute(statement)
+            self.writer.execute(db_path, in_place)
+            return None
+        job = {
+            "table": table,
+            "description": f"{'Renaming' if action == 'rename' else 'Dropping'} column {column}",
+            "state": "running",
+            "progress": 0.0,
+            "rows": 0,
+            "message": "",
+            "started": time.time(),
+            "finished": None,
+        }
+        with self._lock:
+            if (db_path, table) in self._jobs and self._jobs[(db_path, table)]["state"] == "running":
+                raise MigrationError(f"A migration of table '{table}' is still running.")
+            self._jobs[(db_path, table)] = job
+        threading.Thread(target=self._run, args=(db_path, plan, job, log), name=f"migrate-{table}", daemon=True).start()
+        return dict(job)
+
+    def _update(self, job, **changes):
+        with self._lock:
+            job.update(changes)
+
+    def _run(self, db_path, plan, job, log=None):
+        table, shadow = quote(plan["table"]), quote(plan["shadow"])
+        staged = plan["staged"] and quote(plan["staged"])
+
+        def setup(conn):
+            # Clear out what an interrupted migration may have left behind
+            for sql in plan["drop_capture"]:
+                conn.execute(sql)
+            conn.execute(f"DROP TABLE IF EXISTS {shadow}")
+            conn.execute(plan["create"])
+            if staged:
+                conn.execute(f"DROP TABLE IF EXISTS {staged}")
+                conn.execute(f"CREATE TABLE {staged} (row INTEGER PRIMARY KEY, value)")
+            for sql in plan["capture"]:
+                conn.execute(sql)
+            return conn.execute(f"SELECT min(rowid), max(rowid) FROM {table}").fetchone()
+
+        def copy(conn, after, high):
+            row = conn.execute(
+                f"SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT 1 OFFSET ?",
+                (after, self.chunk_rows - 1),
+            ).fetchone()
+            upto = min(row[0], high) if row is not None else high
+            if staged:
+                conn.execute(plan["stage"], (after, upto))
+            return upto, conn.execute(plan["copy"], (after, upto)).rowcount
+
+        def swap(conn):
+            for sql in plan["drop_capture"]:
+                conn.execute(sql)
+            if log is not None:
+                log(conn, plan["staged"])
+            if staged:
+                conn.execute(f"DROP TABLE {staged}")
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {shadow} RENAME TO {table}")
+            for sql in plan["recreate"]:
+                conn.execute(sql)
+
+        def abandon(conn):
+            for sql in plan["drop_capture"]:
+                conn.execute(sql)
+            conn.execute(f"DROP TABLE IF EXISTS {shadow}")
+            if staged:
+                conn.execute(f"DROP TABLE IF EXISTS {staged}")
+
+        try:
+            low, high = self.writer.execute(db_path, setup)
+            position, rows = (low or 1) - 1, 0
+            while high is not None and position < high:
+                position, copied = self.writer.execute(db_path, lambda conn: copy(conn, position, high))
+                rows += copied
+                self._update(job, rows=rows, progress=(position - low + 1) / (high - low + 1))
+                time.sleep(self.pause)
+            self._update(job, message="swapping tables and rebuilding indexes")
+            # Index builds on a large table can outlast the writer's usual timeout
+            self.writer.submit(db_path, swap).result()
+        except Exception as e:
+            try:
+                self.writer.execute(db_path, abandon)
+            except Exception:
+                pass
+            self._update(job, state="failed", message=str(e), finished=time.time())
+        else:
+            self._update(job, state="done", progress=1.0, message="", finished=time.time())
+
+
+migrations = Migrations()
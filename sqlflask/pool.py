@@ -0,0 +1,244 @@
+"""
+pool.py
+
+Per-process SQLite connection pool for the SQLFlask application.
+
+Connections are kept open between requests and keyed by database file, so
+get_db() only pays for sqlite3.connect() on a cache miss. The pool bounds the
+number of connections per file and across all files in DATA_DIR, health-checks
+connections that sat idle, evicts connections idle for too long and keeps
+hit/miss/wait counters for the metrics endpoint.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from .pragmas import connect
+from .config import POOL_MAX_PER_DB, POOL_MAX_OPEN, POOL_IDLE_TIMEOUT, POOL_WAIT_TIMEOUT, POOL_HEALTH_CHECK_AFTER
+
+
+def _file_id(db_path):
+    st = os.stat(db_path)
+    return st.st_dev, st.st_ino
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect=connect,
+        max_per_db=POOL_MAX_PER_DB,
+        max_open=POOL_MAX_OPEN,
+        idle_timeout=POOL_IDLE_TIMEOUT,
+        wait_timeout=POOL_WAIT_TIMEOUT,
+        health_check_after=POOL_HEALTH_CHECK_AFTER,
+    ):
+        self.connect = connect
+        self.max_per_db = max_per_db
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.health_check_after = health_check_after
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = {}  # db_path -> [(conn, released_at), ...], most recent last
+        self._in_use = {}  # db_path -> number of checked-out connections
+        self._epochs = {}  # db_path -> bumped by dispose()
+        self._checked_out = {}  # id(conn) -> epoch of db_path when checked out
+        self._file_ids = {}  # id(conn) -> (st_dev, st_ino) of the file it opened
+        self._open = 0
+        self._counters = {"hits": 0, "misses": 0, "waits": 0, "timeouts": 0, "evictions": 0, "unhealthy": 0}
+        self._wait_seconds = 0.0
+        self._last_sweep = time.monotonic()
+
+    def _check_fork(self):
+        # A forked child must not share the parent's SQLite handles. Drop them
+        # without closing; the parent still owns them.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def acquire(self, db_path):
+        """Check out a connection to db_path, opening one if none is idle."""
+        deadline = None
+        with self._cond:
+            self._check_fork()
+            while True:
+                conn = self._take_idle(db_path)
+                if conn is not None:
+                    self._counters["hits"] += 1
+                    break
+                if self._in_use.get(db_path, 0) < self.max_per_db and self._make_room():
+                    self._counters["misses"] += 1
+                    self._open += 1
+                    conn = None
+                    break
+                if deadline is None:
+                    self._counters["waits"] += 1
+                    started = time.monotonic()
+                    deadline = started + self.wait_timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeout(f"Timed out waiting for a connection to '{db_path}'")
+                self._cond.wait(remaining)
+            self._in_use[db_path] = self._in_use.get(db_path, 0) + 1
+            epoch = self._epochs.get(db_path, 0)
+            if deadline is not None:
+                self._wait_seconds += time.monotonic() - started
+
+        if conn is None:
+            try:
+                conn = self.connect(db_path)
+                file_id = _file_id(db_path)
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._in_use[db_path] -= 1
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._file_ids[id(conn)] = file_id
+        with self._cond:
+            self._checked_out[id(conn)] = epoch
+        return conn
+
+    def release(self, db_path, conn):
+        """Return a connection to the pool, rolling back any open transaction."""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+        healthy = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            healthy = False
+        with self._cond:
+            self._in_use[db_path] -= 1
+            epoch = self._checked_out.pop(id(conn), None)
+            if healthy and epoch == self._epochs.get(db_path, 0):
+                self._idle.setdefault(db_path, []).append((conn, time.monotonic()))
+            else:
+                self._close(conn)
+            now = time.monotonic()
+            if now - self._last_sweep > self.idle_timeout / 2:
+                self._sweep(now)
+            self._cond.notify_all()
+
+    def dispose(self, db_path=None):
+        """Close idle connections for one database file (or all of them).
+
+        Call this before a database file is renamed or removed so no pooled
+        handle keeps pointing at the old inode. Connections that are checked
+        out are closed when they are released.
+        """
+        with self._cond:
+            self._check_fork()
+            paths = [db_path] if db_path is not None else list(set(self._idle) | set(self._in_use))
+            for path in paths:
+                for conn, _ in self._idle.pop(path, []):
+                    self._close(conn)
+                self._epochs[path] = self._epochs.get(path, 0) + 1
+            self._cond.notify_all()
+
+    def evict_idle(self, now=None):
+        """Close connections that have been idle longer than idle_timeout."""
+        with self._cond:
+            self._sweep(time.monotonic() if now is None else now)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._counters,
+                "wait_seconds": self._wait_seconds,
+                "open": self._open,
+                "in_use": sum(self._in_use.values()),
+                "idle": sum(len(entries) for entries in self._idle.values()),
+                "databases": len(set(self._idle) | {p for p, n in self._in_use.items() if n}),
+            }
+
+    # -- internals, called with self._cond held ---------------------------------
+
+    def _take_idle(self, db_path):
+        entries = self._idle.get(db_path)
+        now = time.monotonic()
+        while entries:
+            conn, released_at = entries.pop()
+            if not entries:
+                del self._idle[db_path]
+            if now - released_at > self.idle_timeout:
+                self._close(conn)
+                self._counters["evictions"] += 1
+            elif not self._healthy(db_path, conn, ping=now - released_at > self.health_check_after):
+                self._close(conn)
+                self._counters["unhealthy"] += 1
+            else:
+                return conn
+            entries = self._idle.get(db_path)
+        return None
+
+    def _sweep(self, now):
+        self._last_sweep = now
+        for path, entries in list(self._idle.items()):
+            keep = []
+            for conn, released_at in entries:
+                if now - released_at > self.idle_timeout:
+                    self._close(conn)
+                    self._counters["evictions"] += 1
+                else:
+                    keep.append((conn, released_at))
+            if keep:
+                self._idle[path] = keep
+            else:
+                del self._idle[path]
+
+    def _healthy(self, db_path, conn, ping=True):
+        # A file that was deleted, renamed or atomically replaced (possibly by
+        # another worker) leaves the handle pointing at a stale inode. The
+        # stat is cheap enough for every checkout; only ping long-idle ones.
+        try:
+            if _file_id(db_path) != self._file_ids.get(id(conn)):
+                raise sqlite3.OperationalError("database file was replaced")
+            if ping:
+                conn.execute("SELECT 1").fetchone()
+            return True
+        except (sqlite3.Error, OSError):
+            return False
+
+    def _close(self, conn):
+        self._file_ids.pop(id(conn), None)
+        self._open -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _make_room(self):
+        # Stay under max_open across all database files by closing the
+        # least recently used idle connection of any other database.
+        if self._open < self.max_open:
+            return True
+        oldest = None
+        for path, entries in self._idle.items():
+            if entries and (oldest is None or entries[0][1] < self._idle[oldest][0][1]):
+                oldest = path
+        if oldest is None:
+            return False
+        conn, _ = self._idle[oldest].pop(0)
+        if not self._idle[oldest]:
+            del self._idle[oldest]
+        self._close(conn)
+        self._counters["evictions"] += 1
+        return True
+
+
+pool = ConnectionPool()
@@ -0,0 +1,89 @@
+"""
+pragmas.py
+
+Connection setup for the SQLFlask application.
+
+Every connection the app opens goes through connect(), which applies the
+PRAGMA profile configured for that database file in config.py. Profiles
+let production databases run in WAL mode with a larger page cache, memory
+mapped I/O and a busy timeout, while individual files can stay on the
+SQLite defaults. Copies in a read replica's directory always get the
+read-only "replica" profile. Connections are created as InstrumentedConnection so
+every statement is timed (see instrumentation.py).
+"""
+
+import os
+import sqlite3
+
+from .config import PRAGMA_PROFILES, DEFAULT_PRAGMA_PROFILE, DATABASE_PRAGMA_PROFILES, INSTRUMENTATION_ENABLED
+from .instrumentation import InstrumentedConnection
+
+# busy_timeout goes first so a journal_mode switch waits for other connections;
+# auto_vacuum only takes effect before the file is initialized
+PRAGMA_ORDER = ["busy_timeout", "auto_vacuum", "journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store"]
+
+
+# Written by replication.py into the directory of replica copies
+REPLICA_MARKER = "_replication.json"
+
+
+def profile_for(db_path):
+    if os.path.exists(os.path.join(os.path.dirname(str(db_path)), REPLICA_MARKER)):
+        return PRAGMA_PROFILES["replica"]
+    name = DATABASE_PRAGMA_PROFILES.get(os.path.basename(str(db_path)), DEFAULT_PRAGMA_PROFILE)
+    if name not in PRAGMA_PROFILES:
+        raise KeyError(f"Unknown PRAGMA profile '{name}' for database '{db_path}'")
+    return PRAGMA_PROFILES[name]
+
+
+def apply_profile(conn, profile):
+    def order(item):
+        return PRAGMA_ORDER.index(item[0]) if item[0] in PRAGMA_ORDER else len(PRAGMA_ORDER)
+
+    for pragma, value in sorted(profile.items(), key=order):
+        conn.execute(f"PRAGMA {pragma} = {value}").fetchall()
+    return conn
+
+
+def connect(db_path, profile=None, row_factory=sqlite3.Row):
+    """
+    Open a connection to db_path with its PRAGMA profile applied.
+
+    Connections may be handed between threads by the pool, so the
+    same-thread check is disabled; callers must not share one connection
+    between threads at the same time.
+    """
+    factory = InstrumentedConnection if INSTRUMENTATION_ENABLED else sqlite3.Connection
+    conn = sqlite3.connect(db_path, check_same_thread=False, factory=factory)
+    conn.db_path = str(db_path)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    return apply_profile(conn, profile_for(db_path) if profile is None else profile)
+
+
+def init_database(db_path):
+    """Create db_path if needed and persist file-level settings such as WAL."""
+    connect(db_path).close()
+
+
+# Files SQLite keeps next to a database; they belong to it when it is moved
+SIDECAR_SUFFIXES = ("-wal", "-shm", "-journal")
+
+
+def detach_database(db_path):
+    """
+    Prepare db_path to be renamed or deleted.
+
+    Checkpoints the WAL into the main file and switches the file out of WAL
+    mode so no committed data is left in -wal. Leaving WAL mode needs
+    exclusive access, so this raises sqlite3.OperationalError while any
+    other connection, in this or another process, has the file open.
+    """
+    conn = sqlite3.connect(db_path, timeout=0)
+    try:
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        if busy:
+            raise sqlite3.OperationalError("database is in use by another connection")
+        conn.execute("PRAGMA journal_mode = DELETE").fetchone()
+    finally:
+        conn.close()
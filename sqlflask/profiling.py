@@ -0,0 +1,326 @@
+"""
+profiling.py
+
+Precomputed table and column statistics for the SQLFlask application.
+
+profile_database() runs as a maintenance job (see maintenance.py) and stores
+per-table row counts and per-column statistics - null fraction, min/max,
+an approximate distinct count (HyperLogLog) and the most frequent values
+(a Misra-Gries summary) - in two sidecar tables inside the database itself,
+so the Tables and Columns views serve them with one small read.
+
+The scans are incremental: each table remembers the highest rowid it has
+seen, and the next run only reads rows above that mark and merges them into
+the stored summaries, all of which are mergeable. The mark also records the
+table's root page and a hash of the row at the mark, so the check costs two
+index lookups rather than a count. A table is scanned in full again when
+its schema or root page changed (it was dropped and recreated), when the
+row at the mark is gone or different (rows were deleted from the end, or
+rowids reused), or after PROFILING_FULL_SCAN_AGE, which is how updates and
+deletes below the mark are eventually reflected.
+"""
+
+import hashlib
+import json
+import math
+import sqlite3
+import time
+from collections import Counter
+
+from .config import (
+    PROFILING_CHUNK_ROWS,
+    PROFILING_HLL_PRECISION,
+    PROFILING_TOPK,
+    PROFILING_TOPK_CAPACITY,
+    PROFILING_FULL_SCAN_AGE,
+)
+from .pragmas import connect
+from .query import quote
+from .schema_cache import INTERNAL_PREFIX
+from .writer import writer
+
+TABLE_STATS = f"{INTERNAL_PREFIX}table_stats"
+COLUMN_STATS = f"{INTERNAL_PREFIX}column_stats"
+
+SCHEMA = (
+    f"""
+CREATE TABLE IF NOT EXISTS {TABLE_STATS} (
+    tbl TEXT PRIMARY KEY,
+    schema TEXT,
+    row_count INTEGER,
+    high_water INTEGER,
+    mark TEXT,
+    full_scan REAL,
+    updated REAL
+)""",
+    f"""
+CREATE TABLE IF NOT EXISTS {COLUMN_STATS} (
+    tbl TEXT,
+    col TEXT,
+    non_null INTEGER,
+    nulls INTEGER,
+    min,
+    max,
+    distinct_estimate INTEGER,
+    hll BLOB,
+    topk TEXT,
+    PRIMARY KEY (tbl, col)
+)""",
+)
+
+
+class HyperLogLog:
+    """Approximate distinct counter over 2**precision one-byte registers."""
+
+    def __init__(self, precision=PROFILING_HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers else bytearray(1 << precision)
+
+    @staticmethod
+    def _encode(value):
+        # Match SQLite's notion of equality: 1 and 1.0 are the same value
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if isinstance(value, bytes):
+            return b"b" + value
+        if isinstance(value, str):
+            return b"s" + value.encode("utf-8", "surrogatepass")
+        return b"n" + repr(value).encode()
+
+    def add(self, value):
+        x = int.from_bytes(hashlib.blake2b(self._encode(value), digest_size=8).digest(), "big")
+        bits = 64 - self.precision
+        index, rest = x >> bits, x & ((1 << bits) - 1)
+        rank = bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+def merge_topk(summary, counts, capacity=PROFILING_TOPK_CAPACITY):
+    """Merge value counts into a Misra-Gries summary of at most `capacity` counters."""
+    merged = Counter(dict(summary))
+    merged.update(counts)
+    if len(merged) > capacity:
+        cut = sorted(merged.values(), reverse=True)[capacity]
+        merged = Counter({value: n - cut for value, n in merged.items() if n > cut})
+    return merged
+
+
+def _order(value):
+    # SQLite's cross-type ordering: numbers < text < blobs
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, bytes):
+        return (3, value)
+    return (1, value)
+
+
+class ColumnProfile:
+    def __init__(self, stored=None):
+        stored = stored or {}
+        self.non_null = stored.get("non_null") or 0
+        self.nulls = stored.get("nulls") or 0
+        self.min = stored.get("min")
+        self.max = stored.get("max")
+        self.hll = HyperLogLog(registers=stored.get("hll"))
+        self.topk = Counter({value: n for value, n in json.loads(stored.get("topk") or "[]")})
+
+    def update(self, values):
+        present = [v for v in values if v is not None]
+        self.nulls += len(values) - len(present)
+        self.non_null += len(present)
+        if not present:
+            return
+        low, high = min(present, key=_order), max(present, key=_order)
+        if self.min is None or _order(low) < _order(self.min):
+            self.min = low
+        if self.max is None or _order(high) > _order(self.max):
+            self.max = high
+        for value in present:
+            self.hll.add(value)
+        # Blobs are counted as distinct values but not listed as frequent ones
+        self.topk = merge_topk(self.topk, Counter(v for v in present if not isinstance(v, bytes)))
+
+    def row(self, table, column):
+        return (
+            table,
+            column,
+            self.non_null,
+            self.nulls,
+            self.min,
+            self.max,
+            self.hll.count(),
+            bytes(self.hll.registers),
+            json.dumps(self.topk.most_common()),
+        )
+
+
+def _stored(conn):
+    try:
+        tables = {row["tbl"]: dict(row) for row in conn.execute(f"SELECT * FROM {TABLE_STATS}")}
+        columns = {}
+        for row in conn.execute(f"SELECT * FROM {COLUMN_STATS}"):
+            columns.setdefault(row["tbl"], {})[row["col"]] = dict(row)
+        return tables, columns
+    except sqlite3.OperationalError:
+        return {}, {}
+
+
+def _mark(conn, table, rootpage, rowid):
+    """Root page and hash of the row at `rowid`; changes when that row or the table is replaced."""
+    row = conn.execute(f"SELECT * FROM {quote(table)} WHERE rowid = ?", (rowid,)).fetchone()
+    if row is None:
+        return None
+    return f"{rootpage}:{hashlib.blake2b(repr(tuple(row)).encode(), digest_size=16).hexdigest()}"
+
+
+def profile_table(conn, table, previous, stored_columns, chunk_rows=PROFILING_CHUNK_ROWS, report=None):
+    """Scan `table` (incrementally if possible) and return its table and column stats rows."""
+    schema, rootpage = conn.execute(
+        "SELECT sql, rootpage FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    columns = [col["name"] for col in conn.execute(f"PRAGMA table_info({quote(table)})")]
+    try:
+        last = conn.execute(f"SELECT max(rowid) FROM {quote(table)}").fetchone()[0]
+        has_rowid = True
+    except sqlite3.OperationalError:
+        has_rowid = False
+
+    now = time.time()
+    high_water = previous.get("high_water") if previous else None
+    full = (
+        not has_rowid
+        or previous is None
+        or previous["schema"] != schema
+        or high_water is None
+        or now - (previous["full_scan"] or 0) > PROFILING_FULL_SCAN_AGE
+        or previous.get("mark") is None
+        or previous["mark"] != _mark(conn, table, rootpage, high_water)
+    )
+    if full:
+        high_water, row_count, profiles = None, 0, {col: ColumnProfile() for col in columns}
+    else:
+        row_count, profiles = previous["row_count"], {col: ColumnProfile(stored_columns.get(col)) for col in columns}
+
+    select = ", ".join(quote(col) for col in columns)
+    if has_rowid:
+        start = after = high_water if high_water is not None else float("-inf")
+        while True:
+            rows = conn.execute(
+                f"SELECT rowid, {select} FROM {quote(table)} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (after, chunk_rows),
+            ).fetchall()
+            if not rows:
+                break
+            for i, col in enumerate(columns, start=1):
+                profiles[col].update([row[i] for row in rows])
+            if after == float("-inf"):
+                start = rows[0][0] - 1
+            after = high_water = rows[-1][0]
+            row_count += len(rows)
+            if report is not None and last is not None and last > start:
+                report(min(1.0, (after - start) / (last - start)))
+    else:
+        rows = conn.execute(f"SELECT {select} FROM {quote(table)}").fetchall()
+        row_count = len(rows)
+        for i, col in enumerate(columns):
+            profiles[col].update([row[i] for row in rows])
+
+    table_row = (
+        table,
+        schema,
+        row_count,
+        high_water,
+        _mark(conn, table, rootpage, high_water) if high_water is not None else None,
+        now if full else previous["full_scan"],
+        now,
+    )
+    return table_row, [profiles[col].row(table, col) for col in columns], full
+
+
+def profile_database(db_path, report):
+    """Maintenance job: refresh the statistics of every table in db_path."""
+    conn = connect(db_path)
+    try:
+        tables = [
+            row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+                "AND substr(name, 1, ?) != ?",
+                (len(INTERNAL_PREFIX), INTERNAL_PREFIX),
+            )
+        ]
+        stored_tables, stored_columns = _stored(conn)
+        results, full_scans = [], 0
+        for n, table in enumerate(tables):
+            def progress(fraction, n=n):
+                report((n + fraction) / len(tables))
+
+            table_row, column_rows, full = profile_table(
+                conn, table, stored_tables.get(table), stored_columns.get(table, {}), report=progress
+            )
+            results.append((table_row, column_rows))
+            full_scans += full
+    finally:
+        conn.close()
+
+    def save(conn):
+        # Stats tables from before the mark column are rebuilt; every row is rewritten below anyway
+        if "mark" not in {row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_STATS})")}:
+            conn.execute(f"DROP TABLE IF EXISTS {TABLE_STATS}")
+        for sql in SCHEMA:
+            conn.execute(sql)
+        conn.execute(f"DELETE FROM {TABLE_STATS}")
+        conn.execute(f"DELETE FROM {COLUMN_STATS}")
+        for table_row, column_rows in results:
+            conn.execute(f"INSERT INTO {TABLE_STATS} VALUES (?, ?, ?, ?, ?, ?, ?)", table_row)
+            conn.executemany(f"INSERT INTO {COLUMN_STATS} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", column_rows)
+
+    writer.execute(db_path, save)
+    return {"message": f"{len(tables)} tables profiled, {full_scans} in full"}
+
+
+def table_stats(db):
+    """{table: {"row_count", "updated"}} from the last profiling run."""
+    try:
+        rows = db.execute(f"SELECT tbl, row_count, updated FROM {TABLE_STATS}").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {row[0]: {"row_count": row[1], "updated": row[2]} for row in rows}
+
+
+def column_stats(db, table, top=PROFILING_TOPK):
+    """{column: stats} for one table from the last profiling run."""
+    try:
+        rows = db.execute(
+            f"SELECT col, non_null, nulls, min, max, distinct_estimate, topk FROM {COLUMN_STATS} WHERE tbl = ?",
+            (table,),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    stats = {}
+    for col, non_null, nulls, low, high, distinct, topk in rows:
+        total = non_null + nulls
+        stats[col] = {
+            "null_fraction": nulls / total if total else 0.0,
+            "distinct": distinct,
+            "min": low,
+            "max": high,
+            "topk": json.loads(topk)[:top],
+        }
+    return stats
+
+
+def stats_version(db):
+    """Changes whenever a profiling run stores new statistics."""
+    try:
+        return db.execute(f"SELECT max(updated) FROM {TABLE_STATS}").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
@@ -0,0 +1,115 @@
+"""
+query.py
+
+Server-side filtering, sorting and column projection for table views.
+
+parse_query() turns query-string arguments into a validated query against
+a table's columns, and compile_query() renders it as parameterized SQL.
+Identifiers are only ever taken from the table's schema and values are
+always bound as parameters.
+
+Query-string syntax:
+
+    select=id,name          columns to return (default: all)
+    sort=-created,name      sort keys, "-" for descending
+    limit=50                row limit (capped)
+    name=bob                equality filter, same as name__eq=bob
+    age__ge=18              operators: eq ne lt le gt ge like in isnull
+    id__in=1,2,3            comma-separated values
+    email__isnull=0         IS NULL when true, IS NOT NULL when false
+
+Executed queries are reported to the index advisor (index_advisor.py).
+"""
+
+from .config import QUERY_DEFAULT_LIMIT, QUERY_MAX_LIMIT
+
+OPERATORS = {"eq": "=", "ne": "!=", "lt": "<", "le": "<=", "gt": ">", "ge": ">=", "like": "LIKE"}
+RESERVED = {"select", "sort", "limit", "format", "after", "stream"}
+
+
+class QueryError(ValueError):
+    pass
+
+
+def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def parse_query(args, columns, default_select=None, default_sort=None, default_limit=QUERY_DEFAULT_LIMIT):
+    """
+    Validate query-string args against a table's column names.
+
+    Returns a dict with "select", "filters" as (column, op, value) tuples,
+    "sort" as (column, descending) tuples and "limit". Raises QueryError
+    for unknown columns, operators or malformed values.
+    """
+    known = set(columns)
+
+    def check(column):
+        if column not in known:
+            raise QueryError(f"Unknown column '{column}'")
+        return column
+
+    select = args.get("select")
+    select = [check(c) for c in select.split(",") if c] if select else list(default_select or columns)
+
+    sort = []
+    for key in (args.get("sort") or ",".join(default_sort or [])).split(","):
+        if key:
+            sort.append((check(key.lstrip("-")), key.startswith("-")))
+
+    filters = []
+    for name in args:
+        if name in RESERVED:
+            continue
+        column, _, op = name.partition("__")
+        op = op or "eq"
+        check(column)
+        if op not in OPERATORS and op not in ("in", "isnull"):
+            raise QueryError(f"Unknown operator '{op}'")
+        for value in args.getlist(name) if hasattr(args, "getlist") else [args[name]]:
+            if op == "in":
+                value = value.split(",")
+            elif op == "isnull":
+                value = value.lower() not in ("0", "false", "no", "")
+            filters.append((column, op, value))
+
+    limit = args.get("limit")
+    if limit is None:
+        limit = default_limit
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise QueryError(f"Invalid limit '{limit}'")
+    if limit is not None:
+        limit = max(1, min(limit, QUERY_MAX_LIMIT))
+
+    return {"select": select, "filters": filters, "sort": sort, "limit": limit}
+
+
+def compile_filters(filters):
+    """Render parsed filters as a WHERE clause (empty without filters) and its params."""
+    clauses, params = [], []
+    for column, op, value in filters:
+        if op == "in":
+            clauses.append(f"{quote(column)} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        elif op == "isnull":
+            clauses.append(f"{quote(column)} IS {'' if value else 'NOT '}NULL")
+        else:
+            clauses.append(f"{quote(column)} {OPERATORS[op]} ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def compile_query(table, query):
+    """Render a parsed query as (sql, params)."""
+    where, params = compile_filters(query["filters"])
+    sql = f"SELECT {', '.join(quote(c) for c in query['select'])} FROM {quote(table)}{where}"
+    if query["sort"]:
+        sql += " ORDER BY " + ", ".join(f"{quote(c)}{' DESC' if desc else ''}" for c, desc in query["sort"])
+    if query["limit"] is not None:
+        sql += " LIMIT ?"
+        params.append(query["limit"])
+    return sql, params
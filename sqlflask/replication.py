@@ -0,0 +1,714 @@
+"""
+replication.py
+
+Read replicas of the SQLite databases in DATA_DIR for multi-node deployments.
+
+The primary runs a ReplicationServer next to the web app. A replica pulls
+from it over a TCP socket - the two share nothing else - and keeps a copy
+of every database in its own directory:
+
+  1. For each database the replica sends the token of the copy it holds.
+  2. The primary pins a read snapshot (Snapshot): while it briefly holds
+     the write lock it indexes the committed WAL frames and opens a read
+     transaction, so pages are read straight from the WAL or the database
+     file without copying the database. It keeps one 8-byte digest per
+     page; as long as the WAL was not restarted, only the pages written to
+     it since the previous pull are read and re-hashed. It answers with
+     the pages that differ from the copy the replica has, or "unchanged".
+  3. The replica spools the pages to disk, checks the result against the
+     token and writes them into its file in place while it holds an
+     exclusive lock. A first sync builds a new file and renames it into
+     place.
+
+Pages are streamed one at a time on both sides, so memory use does not
+grow with the database, and only changed pages are read, sent and written
+as long as the primary's WAL is not reset between pulls. Replica files are
+kept in rollback-journal mode and opened read-only (the "replica" PRAGMA
+profile, see pragmas.py), so readers wait for an apply instead of reading
+half-written pages.
+
+Replicas authenticate with the shared REPLICATION_SECRET (HMAC over a
+challenge). Without a secret the primary only binds loopback addresses.
+
+On a replica node (REPLICATION_ROLE = "replica") get_db() serves GET
+requests from the replica copy, and forward() sends every other request to
+the primary (REPLICATION_PRIMARY_URL). Both nodes need the same
+SQLFLASK_SECRET_KEY so the session cookie travels with the request. Lag and
+transfer counters are exported on /metrics.
+
+    SQLFLASK_REPLICATION_SECRET=... python -m sqlflask.replication primary --data-dir data --address 0.0.0.0:8790
+    SQLFLASK_REPLICATION_SECRET=... python -m sqlflask.replication replica --address primary:8790 --replica-dir data/replica
+"""
+
+import argparse
+import fcntl
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+from .config import (
+    REPLICATION_ADDRESS,
+    REPLICATION_INTERVAL,
+    REPLICATION_MAX_MESSAGE,
+    REPLICATION_REPLICA_DIR,
+    REPLICATION_SECRET,
+    REPLICATION_SNAPSHOTS,
+)
+from .fragment_cache import database_token
+from .pragmas import REPLICA_MARKER
+
+STATUS_NAME = REPLICA_MARKER
+DIGEST_SIZE = 8
+WAL_HEADER, FRAME_HEADER = 32, 24
+# Not forwarded when proxying writes to the primary
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "content-length", "host", "te", "upgrade"}
+
+
+class ReplicationError(Exception):
+    pass
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+def send(sock, message):
+    body = json.dumps(message).encode()
+    sock.sendall(struct.pack(">I", len(body)) + body)
+
+
+def read_exactly(sock, n):
+    chunks = []
+    while n:
+        chunk = sock.recv(min(n, 1 << 20))
+        if not chunk:
+            raise ConnectionError("replication peer closed the connection")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def receive(sock, limit=REPLICATION_MAX_MESSAGE):
+    length = struct.unpack(">I", read_exactly(sock, 4))[0]
+    if length > limit:
+        raise ReplicationError(f"replication message of {length} bytes exceeds the limit of {limit}")
+    return json.loads(read_exactly(sock, length))
+
+
+def sign(secret, challenge):
+    return hmac.new((secret or "").encode(), challenge.encode(), hashlib.sha256).hexdigest()
+
+
+def page_size(header):
+    size = int.from_bytes(header[16:18], "big")
+    return 65536 if size == 1 else size or 4096
+
+
+def digest(page):
+    return hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest()
+
+
+def image_token(digests):
+    return hashlib.blake2b(bytes(digests), digest_size=16).hexdigest()
+
+
+def wal_index(wal_path):
+    """Committed frames of a WAL file: {"salts", "pages": {pgno: offset}, "order": [pgno, ...], "db_size"}."""
+    try:
+        f = open(wal_path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        header = f.read(WAL_HEADER)
+        if len(header) < WAL_HEADER:
+            return None
+        size, salts = int.from_bytes(header[8:12], "big"), header[16:24]
+        end = os.fstat(f.fileno()).st_size
+        index = {"salts": salts.hex(), "pages": {}, "order": [], "db_size": None}
+        pending, offset = [], WAL_HEADER
+        while offset + FRAME_HEADER + size <= end:
+            f.seek(offset)
+            frame = f.read(FRAME_HEADER)
+            # Frames of an earlier WAL generation carry other salts
+            if frame[8:16] != salts:
+                break
+            pgno, commit = struct.unpack(">II", frame[:8])
+            pending.append((pgno, offset + FRAME_HEADER))
+            if commit:
+                for pgno, data in pending:
+                    index["pages"][pgno] = data
+                    index["order"].append(pgno)
+                index["db_size"], pending = commit, []
+            offset += FRAME_HEADER + size
+    return index
+
+
+class Snapshot:
+    """
+    Read-only view of one committed state of a database, read page by page.
+
+    While holding the write lock for a moment, the WAL's committed frames
+    are indexed and a read transaction is opened, so the index matches the
+    snapshot SQLite keeps for that transaction: pages found in the index
+    are read from the WAL, all others from the database file, which no
+    checkpoint changes while the transaction is open. valid() is false if
+    the WAL was restarted while the pages were read.
+    """
+
+    def __init__(self, db_path, fd):
+        self.fd = fd
+        self.reader = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        lock = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        try:
+            lock.execute("BEGIN IMMEDIATE")
+            try:
+                self.reader.execute("BEGIN")
+                self.reader.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+                header = os.pread(fd, 100, 0)
+                self.wal_path = f"{db_path}-wal"
+                self.wal = wal_index(self.wal_path) if len(header) == 100 and header[18] == 2 else None
+            finally:
+                lock.execute("ROLLBACK")
+        finally:
+            lock.close()
+        self.page_size = page_size(header) if len(header) == 100 else 4096
+        if self.wal and self.wal["db_size"]:
+            self.page_count = self.wal["db_size"]
+        else:
+            self.page_count = os.fstat(fd).st_size // self.page_size
+        self.wal_file = open(self.wal_path, "rb") if self.wal else None
+
+    def read(self, pgno):
+        offset = self.wal["pages"].get(pgno) if self.wal else None
+        if offset is not None:
+            page = os.pread(self.wal_file.fileno(), self.page_size, offset)
+        else:
+            page = os.pread(self.fd, self.page_size, (pgno - 1) * self.page_size)
+        return page.ljust(self.page_size, b"\0")
+
+    def valid(self):
+        if self.wal is None:
+            return True
+        # A restart rewrites the WAL header with new salts before any frame
+        self.wal_file.seek(16)
+        return self.wal_file.read(8).hex() == self.wal["salts"]
+
+    def close(self):
+        if self.wal_file is not None:
+            self.wal_file.close()
+        self.reader.close()
+
+
+class ReplicationServer:
+    """Serves page deltas of the databases in data_dir to replicas."""
+
+    def __init__(self, data_dir, address=REPLICATION_ADDRESS, keep=REPLICATION_SNAPSHOTS, secret=REPLICATION_SECRET):
+        self.data_dir = str(data_dir)
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.keep = keep
+        self.secret = secret
+        self._lock = threading.Lock()
+        self._files = {}  # name -> (inode, fd), kept open: closing one would drop SQLite's locks
+        self._state = {}  # name -> {"stat", "token", "digests", "wal"}
+        self._history = {}  # name -> OrderedDict(token -> page digests)
+        self._counters = {}  # name -> {"pulls", "pages_sent", "bytes_sent"}
+        self._server = None
+
+    def names(self):
+        return sorted(name for name in os.listdir(self.data_dir) if name.endswith(".sqlite"))
+
+    def _fd(self, name):
+        path = os.path.join(self.data_dir, name)
+        inode = os.stat(path).st_ino
+        with self._lock:
+            cached = self._files.get(name)
+            if cached is not None and cached[0] == inode:
+                return cached[1]
+            if cached is not None:
+                os.close(cached[1])
+            fd = os.open(path, os.O_RDONLY)
+            self._files[name] = (inode, fd)
+            return fd
+
+    def _digests(self, name, snap):
+        """Page digests of the snapshot, re-hashing only what the WAL shows as written since the last pull."""
+        previous = self._state.get(name)
+        wal = snap.wal
+        if (
+            previous is not None and wal is not None and previous["wal"] is not None
+            and previous["wal"]["salts"] == wal["salts"] and previous["wal"]["frames"] <= len(wal["order"])
+            and previous["page_size"] == snap.page_size
+        ):
+            digests = bytearray(previous["digests"][:snap.page_count * DIGEST_SIZE])
+            old_count = len(digests) // DIGEST_SIZE
+            digests.extend(bytes((snap.page_count - old_count) * DIGEST_SIZE))
+            changed = set(wal["order"][previous["wal"]["frames"]:]) | set(range(old_count + 1, snap.page_count + 1))
+        else:
+            digests = bytearray(snap.page_count * DIGEST_SIZE)
+            changed = range(1, snap.page_count + 1)
+        for pgno in changed:
+            if pgno <= snap.page_count:
+                digests[(pgno - 1) * DIGEST_SIZE:pgno * DIGEST_SIZE] = digest(snap.read(pgno))
+        return bytes(digests), len(changed)
+
+    def pull(self, name, have=None):
+        """(header, snapshot, pages) bringing a replica holding image `have` up to date."""
+        if name not in self.names():
+            return {"missing": True}, None, []
+        db_path = os.path.join(self.data_dir, name)
+        stat = database_token(db_path)
+        with self._lock:
+            counters = self._counters.setdefault(name, {"pulls": 0, "pages_read": 0, "pages_sent": 0, "bytes_sent": 0})
+            counters["pulls"] += 1
+            state = self._state.get(name)
+            if have is not None and state is not None and (state["stat"], state["token"]) == (stat, have):
+                return {"token": have, "unchanged": True}, None, []
+        snap = Snapshot(db_path, self._fd(name))
+        try:
+            digests, read = self._digests(name, snap)
+            if not snap.valid():
+                raise ReplicationError(f"the WAL of {name} was reset while it was read")
+        except BaseException:
+            snap.close()
+            raise
+        token = image_token(digests)
+        with self._lock:
+            wal = snap.wal and {"salts": snap.wal["salts"], "frames": len(snap.wal["order"])}
+            self._state[name] = {"stat": stat, "token": token, "digests": digests, "wal": wal, "page_size": snap.page_size}
+            history = self._history.setdefault(name, OrderedDict())
+            history[token] = digests
+            history.move_to_end(token)
+            while len(history) > self.keep:
+                history.popitem(last=False)
+            base = history.get(have)
+            counters["pages_read"] += read
+        if have == token:
+            snap.close()
+            return {"token": token, "unchanged": True}, None, []
+        count = snap.page_count
+        if base is None:
+            pages = list(range(1, count + 1))
+        else:
+            pages = [
+                pgno for pgno in range(1, count + 1)
+                if (pgno - 1) * DIGEST_SIZE >= len(base)
+                or base[(pgno - 1) * DIGEST_SIZE:pgno * DIGEST_SIZE] != digests[(pgno - 1) * DIGEST_SIZE:pgno * DIGEST_SIZE]
+            ]
+        with self._lock:
+            counters["pages_sent"] += len(pages)
+            counters["bytes_sent"] += len(pages) * snap.page_size
+        header = {"token": token, "page_size": snap.page_size, "page_count": count, "full": base is None}
+        if base is not None:
+            header["pages"] = pages
+        return header, snap, pages
+
+    def handle(self, sock):
+        challenge = os.urandom(16).hex()
+        send(sock, {"challenge": challenge})
+        try:
+            hello = receive(sock, limit=4096)
+        except (ConnectionError, ReplicationError, ValueError):
+            return
+        if not hmac.compare_digest(str(hello.get("mac", "")), sign(self.secret, challenge)):
+            send(sock, {"error": "authentication failed"})
+            return
+        send(sock, {"ok": True})
+        while True:
+            try:
+                request = receive(sock, limit=4096)
+            except (ConnectionError, ReplicationError, ValueError):
+                return
+            if request.get("op") == "list":
+                send(sock, {"databases": self.names()})
+            elif request.get("op") == "pull":
+                header, snap, pages = self.pull(request["name"], request.get("have"))
+                send(sock, header)
+                if snap is None:
+                    continue
+                try:
+                    for pgno in pages:
+                        sock.sendall(snap.read(pgno))
+                    send(sock, {"ok": snap.valid()})
+                finally:
+                    snap.close()
+            else:
+                send(sock, {"error": f"unknown operation '{request.get('op')}'"})
+
+    def start(self):
+        """Serve in a background thread; False if another process already listens on the address."""
+        if not self.secret and not is_loopback(self.address[0]):
+            raise ReplicationError("set REPLICATION_SECRET before serving replicas on a non-loopback address")
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server.handle(self.request)
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        try:
+            self._server = Server(self.address, Handler)
+        except OSError:
+            # e.g. another gunicorn worker of this node is already serving
+            return False
+        self.address = self._server.server_address
+        threading.Thread(target=self._server.serve_forever, name="sqlflask-replication", daemon=True).start()
+        return True
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(counters) for name, counters in self._counters.items()}
+
+
+class Replica:
+    """Keeps copies of the primary's databases in replica_dir up to date."""
+
+    def __init__(
+        self,
+        address=REPLICATION_ADDRESS,
+        replica_dir=REPLICATION_REPLICA_DIR,
+        interval=REPLICATION_INTERVAL,
+        secret=REPLICATION_SECRET,
+    ):
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.replica_dir = str(replica_dir)
+        self.interval = interval
+        self.secret = secret
+        self.status = read_status(self.replica_dir)
+        self._files = {}  # name -> (inode, fd), kept open: closing one would drop SQLite's locks
+        self._stop = threading.Event()
+        self._lock_file = None
+
+    def _path(self, name, suffix=""):
+        return os.path.join(self.replica_dir, name + suffix)
+
+    def _fd(self, name):
+        inode = os.stat(self._path(name)).st_ino
+        cached = self._files.get(name)
+        if cached is not None and cached[0] == inode:
+            return cached[1]
+        if cached is not None:
+            os.close(cached[1])
+        fd = os.open(self._path(name), os.O_RDWR)
+        self._files[name] = (inode, fd)
+        return fd
+
+    def digests(self, name):
+        """Page digests of the copy of `name`, or None if there is no usable copy."""
+        try:
+            with open(self._path(name, ".digests"), "rb") as f:
+                digests = f.read()
+            with open(self._path(name), "rb") as f:
+                header = f.read(100)
+        except FileNotFoundError:
+            return None
+        # Copies made before replicas were kept in rollback-journal mode are synced in full
+        return digests if len(header) == 100 and header[18] == 1 else None
+
+    @staticmethod
+    def _stamp(fd, page_count, counter):
+        """Make page 1 describe the copy: rollback journal, new change counter, size."""
+        counter = struct.pack(">I", counter & 0xFFFFFFFF)
+        os.pwrite(fd, b"\x01\x01", 18)
+        os.pwrite(fd, counter + struct.pack(">I", page_count), 24)
+        # The size in the header is only trusted when version-valid-for matches the counter
+        os.pwrite(fd, counter, 92)
+
+    def apply(self, name, header, sock):
+        """Receive the pages announced by `header` and write them into the copy of `name`."""
+        size, count = header["page_size"], header["page_count"]
+        if size not in {1 << n for n in range(9, 17)} or not 0 <= count < 1 << 31:
+            raise ReplicationError(f"invalid page layout for {name}: {count} pages of {size} bytes")
+        full = header["full"]
+        pages = range(1, count + 1) if full else header["pages"]
+        digests = bytearray(count * DIGEST_SIZE) if full else bytearray((self.digests(name) or b"")[:count * DIGEST_SIZE])
+        digests.extend(bytes(count * DIGEST_SIZE - len(digests)))
+        if full:
+            # A first sync builds the file beside the copy and renames it into place
+            spool = open(self._path(name, ".sync"), "w+b")
+        else:
+            spool = tempfile.TemporaryFile(dir=self.replica_dir)
+        with spool:
+            for pgno in pages:
+                if not 1 <= pgno <= count:
+                    raise ReplicationError(f"page {pgno} out of range for {name}")
+                page = read_exactly(sock, size)
+                spool.write(page)
+                digests[(pgno - 1) * DIGEST_SIZE:pgno * DIGEST_SIZE] = digest(page)
+            if not receive(sock).get("ok"):
+                raise ReplicationError(f"{name} changed on the primary while it was sent; retrying")
+            if image_token(digests) != header["token"]:
+                raise ReplicationError(f"replica of {name} diverged from the primary")
+            spool.flush()
+            if full:
+                if count:
+                    counter = int.from_bytes(os.pread(spool.fileno(), 4, 24), "big")
+                    self._stamp(spool.fileno(), count, counter)
+                os.fsync(spool.fileno())
+                os.replace(self._path(name, ".sync"), self._path(name))
+                for suffix in ("-wal", "-shm", "-journal"):
+                    if os.path.exists(self._path(name, suffix)):
+                        os.remove(self._path(name, suffix))
+            else:
+                self._write_in_place(name, spool, pages, size, count)
+        with open(self._path(name, ".digests.tmp"), "wb") as f:
+            f.write(digests)
+        os.replace(self._path(name, ".digests.tmp"), self._path(name, ".digests"))
+        return len(pages)
+
+    def _write_in_place(self, name, spool, pages, size, count):
+        lock = sqlite3.connect(self._path(name), timeout=30, isolation_level=None)
+        try:
+            # Waits for readers to finish and keeps new ones out until the pages are written
+            lock.execute("BEGIN EXCLUSIVE")
+            try:
+                fd = self._fd(name)
+                counter = int.from_bytes(os.pread(fd, 4, 24), "big") + 1
+                spool.seek(0)
+                for pgno in pages:
+                    os.pwrite(fd, spool.read(size), (pgno - 1) * size)
+                os.ftruncate(fd, count * size)
+                self._stamp(fd, count, counter)
+                os.fsync(fd)
+            finally:
+                lock.execute("ROLLBACK")
+        finally:
+            lock.close()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=30)
+        try:
+            challenge = receive(sock, limit=4096)["challenge"]
+            send(sock, {"mac": sign(self.secret, challenge)})
+            answer = receive(sock, limit=4096)
+            if not answer.get("ok"):
+                raise ReplicationError(answer.get("error", "authentication failed"))
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def sync_once(self):
+        """Pull every database once; returns the status written to replica_dir."""
+        os.makedirs(self.replica_dir, exist_ok=True)
+        with self._connect() as sock:
+            send(sock, {"op": "list"})
+            names = receive(sock)["databases"]
+            for name in names:
+                entry = self.status.setdefault(
+                    name, {"token": None, "synced_at": None, "pages": 0, "bytes": 0, "syncs": 0, "full_syncs": 0, "errors": 0}
+                )
+                have = entry["token"] if self.digests(name) is not None else None
+                started = time.time()
+                send(sock, {"op": "pull", "name": name, "have": have})
+                header = receive(sock)
+                if header.get("missing"):
+                    continue
+                if not header.get("unchanged"):
+                    try:
+                        applied = self.apply(name, header, sock)
+                    except (ReplicationError, sqlite3.Error) as e:
+                        entry.update(token=None, errors=entry["errors"] + 1, error=str(e))
+                        if not isinstance(e, ReplicationError) or "while it was sent" not in str(e):
+                            # The stream is out of step after a failed apply
+                            break
+                        continue
+                    entry.update(
+                        token=header["token"],
+                        pages=entry["pages"] + applied,
+                        bytes=entry["bytes"] + applied * header["page_size"],
+                        syncs=entry["syncs"] + 1,
+                        full_syncs=entry["full_syncs"] + header["full"],
+                        error=None,
+                    )
+                # The copy matched the primary as of the moment the pull was sent
+                entry["synced_at"] = started
+        for name in set(self.status) - set(names):
+            del self.status[name]
+            cached = self._files.pop(name, None)
+            if cached is not None:
+                os.close(cached[1])
+            for suffix in ("", ".digests", "-wal", "-shm", "-journal"):
+                if os.path.exists(self._path(name, suffix)):
+                    os.remove(self._path(name, suffix))
+        write_status(self.replica_dir, self.status)
+        return self.status
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except (OSError, ValueError, ReplicationError):
+                # Primary unreachable; lag keeps growing until it is back
+                pass
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Pull in a background thread; False if another process of this node already does."""
+        os.makedirs(self.replica_dir, exist_ok=True)
+        self._lock_file = open(os.path.join(self.replica_dir, "_replication.lock"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        threading.Thread(target=self.run, name="sqlflask-replica", daemon=True).start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+
+def write_status(replica_dir, status):
+    path = os.path.join(replica_dir, STATUS_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(status, f)
+    os.replace(path + ".tmp", path)
+
+
+_status_cache = {}  # replica_dir -> (mtime_ns, status)
+
+
+def read_status(replica_dir):
+    """Status the pulling process last wrote, re-read only when the file changed."""
+    path = os.path.join(str(replica_dir), STATUS_NAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached = _status_cache.get(str(replica_dir))
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = _status_cache[str(replica_dir)] = (mtime, json.load(f))
+    return cached[1]
+
+
+def read_path(db_path, replica_dir, max_lag):
+    """The replica copy of db_path to read from, or db_path itself if there is none usable."""
+    name = os.path.basename(db_path)
+    entry = read_status(replica_dir).get(name)
+    replica_path = os.path.join(str(replica_dir), name)
+    if entry is None or entry["synced_at"] is None or not os.path.exists(replica_path):
+        return db_path
+    if time.time() - entry["synced_at"] > max_lag and os.path.exists(db_path):
+        return db_path
+    return replica_path
+
+
+def replica_stats(replica_dir):
+    """{database: counters} including the current lag, for /metrics."""
+    now = time.time()
+    return {
+        name: {
+            "lag_seconds": now - entry["synced_at"] if entry["synced_at"] else float("inf"),
+            "pages": entry["pages"],
+            "bytes": entry["bytes"],
+            "syncs": entry["syncs"],
+            "full_syncs": entry["full_syncs"],
+            "errors": entry["errors"],
+        }
+        for name, entry in read_status(replica_dir).items()
+    }
+
+
+def forward(primary_url, request):
+    """Send a write request to the primary and return (body, status, headers) for Flask."""
+    url = urllib.parse.urlsplit(primary_url)
+    conn_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    conn = conn_class(url.netloc, timeout=60)
+    try:
+        path = url.path.rstrip("/") + request.full_path.rstrip("?")
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP}
+        conn.request(request.method, path, body=request.get_data(), headers=headers)
+        response = conn.getresponse()
+        body = response.read()
+        headers = [(k, v) for k, v in response.getheaders() if k.lower() not in HOP_BY_HOP]
+        return body, response.status, headers
+    finally:
+        conn.close()
+
+
+server = None  # ReplicationServer of this process when it is a primary
+replica = None  # Replica pulling in this process when it is a replica
+
+
+def start(config):
+    """Start the role configured for this node; called once per app by create_app()."""
+    global server, replica
+    role = config.get("REPLICATION_ROLE")
+    if role == "primary" and server is None:
+        candidate = ReplicationServer(
+            config["DATA_DIR"], config["REPLICATION_ADDRESS"], secret=config.get("REPLICATION_SECRET")
+        )
+        if candidate.start():
+            server = candidate
+    elif role == "replica" and replica is None:
+        candidate = Replica(
+            config["REPLICATION_ADDRESS"], config["REPLICATION_REPLICA_DIR"], secret=config.get("REPLICATION_SECRET")
+        )
+        if candidate.start():
+            replica = candidate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a replication primary or replica outside the web app.")
+    parser.add_argument("role", choices=["primary", "replica"])
+    parser.add_argument("--address", default=REPLICATION_ADDRESS, help="host:port the primary listens on")
+    parser.add_argument("--data-dir", help="databases to serve (primary)")
+    parser.add_argument("--replica-dir", default=str(REPLICATION_REPLICA_DIR), help="where to keep the copies (replica)")
+    parser.add_argument("--secret", default=REPLICATION_SECRET, help="shared secret (default: $SQLFLASK_REPLICATION_SECRET)")
+    parser.add_argument("--once", action="store_true", help="pull once and exit (replica)")
+    args = parser.parse_args()
+
+    if args.role == "primary":
+        from .config import DB_PATH
+
+        primary = ReplicationServer(args.data_dir or DB_PATH.parent, args.address, secret=args.secret)
+        try:
+            started = primary.start()
+        except ReplicationError as e:
+            parser.error(str(e))
+        if not started:
+            parser.error(f"cannot listen on {args.address}")
+        print(f"serving {primary.data_dir} on {primary.address[0]}:{primary.address[1]}", flush=True)
+        threading.Event().wait()
+    else:
+        puller = Replica(args.address, args.replica_dir, secret=args.secret)
+        if args.once:
+            for name, entry in puller.sync_once().items():
+                print(f"{name}: {entry['syncs']} syncs, {entry['pages']} pages, {entry['errors']} errors")
+        else:
+            puller.run()
+
+
+if __name__ == "__main__":
+    main()
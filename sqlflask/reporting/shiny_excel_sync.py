@@ -1,43 +1,43 @@
 from shiny import App, Inputs, Outputs, Session, reactive, render, ui
-import pandas as pd
-import sqlite3
-from pathlib import Path
-from datetime import datetime
+import polars as pl
 
 from sqlflask.config import DB_PATH, EXCEL_DIR
+from sqlflask.pragmas import connect
+from sqlflask.reporting.sync import read_table, sync_frame
+from sqlflask.reporting.snapshots import SnapshotStore
 
 EXCEL_DIR.mkdir(exist_ok=True)
 EXCEL_LATEST = EXCEL_DIR / "latest.xlsx"
 TABLE_NAME = "your_table"  # Replace with actual table name from sqlflask
+KEY_COLUMN = "id"  # Primary key used to diff imported sheets against the table
+store = SnapshotStore()
 
 # Function to read from the sqlflask DB
-def read_from_db():
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(f"SELECT * FROM {TABLE_NAME}", conn)
-    conn.close()
-    return df
+def read_from_db() -> pl.DataFrame:
+    conn = connect(DB_PATH, row_factory=None)
+    try:
+        return read_table(conn, TABLE_NAME, db_path=DB_PATH)
+    finally:
+        conn.close()
 
-# Function to write to the DB (overwrite existing data)
-def write_to_db(df: pd.DataFrame):
-    conn = sqlite3.connect(DB_PATH)
-    df.to_sql(TABLE_NAME, conn, if_exists='replace', index=False)
-    conn.commit()
-    conn.close()
+# Function to write to the DB: apply only the rows that changed
+def write_to_db(df: pl.DataFrame) -> dict:
+    conn = connect(DB_PATH, row_factory=None)
+    try:
+        return sync_frame(conn, TABLE_NAME, df, key=KEY_COLUMN)
+    finally:
+        conn.close()
 
-# Export current DB table to Excel and archive with timestamp
-def export_to_excel(df: pd.DataFrame):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    versioned_path = EXCEL_DIR / f"export_{timestamp}.xlsx"
-    df.to_excel(EXCEL_LATEST, index=False)
-    df.to_excel(versioned_path, index=False)
+# Snapshot the current DB table (deduplicated) and refresh latest.xlsx
+def export_to_excel(df: pl.DataFrame):
+    entry, _ = store.save(df)
+    store.materialize_xlsx(entry["id"], EXCEL_LATEST)
+    store.prune()
+    return entry
 
-# Import Excel file into a DataFrame
-def import_from_excel(file_path: Path = EXCEL_LATEST) -> pd.DataFrame:
-    return pd.read_excel(file_path)
-
-# List available versioned Excel files
+# List available snapshot versions (from the manifest, newest first)
 def list_excel_versions():
-    return sorted(EXCEL_DIR.glob("export_*.xlsx"), reverse=True)
+    return [entry["id"] for entry in store.list_versions()]
 
 app_ui = ui.page_fluid(
     ui.h2("SQLFlask: Database + Excel Reporting with Versioning"),
@@ -47,11 +47,13 @@ app_ui = ui.page_fluid(
         ui.action_button("export", "📤 Export to Excel (Versioned)")
     ),
     ui.input_select("version_select", "📂 Load Excel Version", choices=[]),
-    ui.action_button("import_version", "📥 Import Selected Version")
+    ui.action_button("import_version", "📥 Import Selected Version"),
+    ui.output_text("sync_status")
 )
 
 def server(input: Inputs, output: Outputs, session: Session):
     data = reactive.Value(read_from_db())
+    last_sync = reactive.Value(None)
 
     @reactive.Effect
     @reactive.event(input.refresh)
@@ -62,30 +64,41 @@ def server(input: Inputs, output: Outputs, session: Session):
     @reactive.event(input.export)
     def _():
         export_to_excel(data.get())
-        session.send_input("version_select", [f.name for f in list_excel_versions()])
+        ui.update_select("version_select", choices=list_excel_versions())
 
     @reactive.Effect
     def update_dropdown():
-        session.send_input("version_select", [f.name for f in list_excel_versions()])
+        ui.update_select("version_select", choices=list_excel_versions())
 
     @reactive.Effect
     @reactive.event(input.import_version)
     def _():
-        selected_file = input.version_select()
-        if selected_file:
-            file_path = EXCEL_DIR / selected_file
-            df = import_from_excel(file_path)
-            write_to_db(df)
-            data.set(df)
+        selected_version = input.version_select()
+        if selected_version:
+            df = store.load(selected_version)
+            last_sync.set(write_to_db(df))
+            data.set(read_from_db())
 
     @output
     @render.table
     def data_view():
-        return data.get()
+        return data.get().to_pandas()
+
+    @output
+    @render.text
+    def sync_status():
+        stats = last_sync.get()
+        if stats is None:
+            return ""
+        return (
+            f"{stats['mode'].capitalize()} sync of {stats['table']}: "
+            f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['deleted']} deleted "
+            f"in {stats['seconds'] * 1000:.0f} ms"
+        )
 
 app = App(app_ui, server)
 if __name__ == "__main__":
     app.run()
 # To run the app, use the command: `python shiny_excel_sync.py`
 # Ensure you have the required packages installed:
-# pip install shiny pandas openpyxl sqlite3
+# pip install shiny pandas polars pyarrow openpyxl
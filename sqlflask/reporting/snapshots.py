@@ -0,0 +1,228 @@
+"""
+snapshots.py
+
+Content-addressed snapshot store for the Excel reporting app.
+
+Each export is hashed; identical data is stored once as a zstd-compressed
+Parquet object named after its hash, and a small JSON manifest records
+which snapshot points at which object. Versions are listed from the
+manifest instead of globbing the directory, loaded lazily with
+pl.scan_parquet(), and only turned into .xlsx files when someone asks
+for one. prune() applies the retention policy and garbage-collects
+objects no snapshot references.
+
+Existing export_*.xlsx files can be folded into the store with
+
+    python -m sqlflask.reporting.snapshots migrate [--delete]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import polars as pl
+
+from sqlflask.config import (
+    EXCEL_DIR,
+    SNAPSHOT_DIR,
+    SNAPSHOT_KEEP_LAST,
+    SNAPSHOT_MAX_AGE_DAYS,
+    SNAPSHOT_MAX_BYTES,
+    SNAPSHOT_XLSX_CACHE,
+)
+
+
+def content_hash(df: pl.DataFrame) -> str:
+    # Arrow IPC of a rechunked frame is a stable serialization of schema + values
+    return hashlib.sha256(df.rechunk().write_ipc(None, compression="uncompressed").getvalue()).hexdigest()
+
+
+class SnapshotStore:
+    def __init__(
+        self,
+        root=SNAPSHOT_DIR,
+        keep_last=SNAPSHOT_KEEP_LAST,
+        max_age_days=SNAPSHOT_MAX_AGE_DAYS,
+        max_bytes=SNAPSHOT_MAX_BYTES,
+        xlsx_cache=SNAPSHOT_XLSX_CACHE,
+    ):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.xlsx = self.root / "xlsx"
+        self.manifest_path = self.root / "manifest.json"
+        self.keep_last = keep_last
+        self.max_age = timedelta(days=max_age_days)
+        self.max_bytes = max_bytes
+        self.xlsx_cache = xlsx_cache
+        self._lock = threading.Lock()
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.xlsx.mkdir(parents=True, exist_ok=True)
+
+    # -- manifest ---------------------------------------------------------------
+
+    def _read_manifest(self):
+        if not self.manifest_path.exists():
+            return []
+        with open(self.manifest_path) as f:
+            return json.load(f)["snapshots"]
+
+    def _write_manifest(self, entries):
+        tmp = self.manifest_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"snapshots": entries}, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def list_versions(self):
+        """Snapshot entries, newest first."""
+        with self._lock:
+            return list(reversed(self._read_manifest()))
+
+    def get(self, snapshot_id):
+        entry = next((e for e in self._read_manifest() if e["id"] == snapshot_id), None)
+        if entry is None:
+            raise KeyError(f"Unknown snapshot '{snapshot_id}'")
+        return entry
+
+    # -- save / load --------------------------------------------------------------
+
+    def save(self, df: pl.DataFrame, created=None):
+        """
+        Record a snapshot of df and return (entry, stored).
+
+        Nothing new is written when df equals the latest snapshot
+        (stored is False and the latest entry is returned). Data seen
+        before under an older snapshot reuses that object.
+        """
+        digest = content_hash(df)
+        created = created or datetime.now()
+        with self._lock:
+            entries = self._read_manifest()
+            if entries and entries[-1]["sha256"] == digest:
+                return entries[-1], False
+            obj = self.objects / f"{digest}.parquet"
+            if not obj.exists():
+                tmp = obj.with_suffix(".tmp")
+                df.write_parquet(tmp, compression="zstd")
+                os.replace(tmp, obj)
+            snapshot_id = created.strftime("%Y%m%d_%H%M%S")
+            if any(e["id"] == snapshot_id for e in entries):
+                snapshot_id += f"_{len(entries)}"
+            entry = {
+                "id": snapshot_id,
+                "sha256": digest,
+                "created": created.isoformat(timespec="seconds"),
+                "rows": df.height,
+                "columns": df.columns,
+                "bytes": obj.stat().st_size,
+            }
+            entries.append(entry)
+            self._write_manifest(entries)
+        return entry, True
+
+    def scan(self, snapshot_id) -> pl.LazyFrame:
+        return pl.scan_parquet(self.objects / f"{self.get(snapshot_id)['sha256']}.parquet")
+
+    def load(self, snapshot_id) -> pl.DataFrame:
+        return self.scan(snapshot_id).collect()
+
+    def materialize_xlsx(self, snapshot_id, target=None) -> Path:
+        """Write the snapshot as .xlsx (cached by content) and return its path."""
+        entry = self.get(snapshot_id)
+        cached = self.xlsx / f"{entry['sha256']}.xlsx"
+        if not cached.exists():
+            tmp = cached.with_suffix(".tmp.xlsx")
+            self.load(snapshot_id).to_pandas().to_excel(tmp, index=False)
+            os.replace(tmp, cached)
+        os.utime(cached)  # mark as recently used for cache eviction
+        self._evict_xlsx()
+        if target is None:
+            return cached
+        target = Path(target)
+        tmp = target.with_suffix(".tmp.xlsx")
+        shutil.copyfile(cached, tmp)
+        os.replace(tmp, target)
+        return target
+
+    # -- retention ------------------------------------------------------------------
+
+    def _evict_xlsx(self):
+        files = sorted(self.xlsx.glob("*.xlsx"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in files[self.xlsx_cache:]:
+            path.unlink(missing_ok=True)
+
+    def prune(self, now=None):
+        """
+        Apply the retention policy and delete unreferenced objects.
+
+        The newest keep_last snapshots always survive. Older ones are
+        dropped once they exceed max_age_days, then oldest-first while the
+        referenced objects exceed max_bytes. Returns counts and bytes freed.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            entries = self._read_manifest()
+            protected = entries[-self.keep_last:] if self.keep_last else []
+            candidates = entries[: len(entries) - len(protected)]
+            kept = [e for e in candidates if now - datetime.fromisoformat(e["created"]) <= self.max_age]
+
+            def referenced_bytes(snapshots):
+                return sum({e["sha256"]: e["bytes"] for e in snapshots}.values())
+
+            while kept and referenced_bytes(kept + protected) > self.max_bytes:
+                kept.pop(0)
+            remaining = kept + protected
+            if len(remaining) != len(entries):
+                self._write_manifest(remaining)
+
+            live = {e["sha256"] for e in remaining}
+            freed = 0
+            for obj in self.objects.glob("*.parquet"):
+                if obj.stem not in live:
+                    freed += obj.stat().st_size
+                    obj.unlink()
+            for path in self.xlsx.glob("*.xlsx"):
+                if path.stem not in live:
+                    path.unlink()
+        return {"removed": len(entries) - len(remaining), "kept": len(remaining), "bytes_freed": freed}
+
+    def migrate_legacy(self, excel_dir=EXCEL_DIR, delete=False):
+        """Fold export_*.xlsx files into the store, oldest first."""
+        import pandas as pd
+
+        migrated = []
+        for path in sorted(Path(excel_dir).glob("export_*.xlsx")):
+            try:
+                created = datetime.strptime(path.stem[len("export_"):], "%Y%m%d_%H%M%S")
+            except ValueError:
+                continue
+            entry, _ = self.save(pl.from_pandas(pd.read_excel(path)), created=created)
+            migrated.append(entry["id"])
+            if delete:
+                path.unlink()
+        return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the Excel snapshot store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="import legacy export_*.xlsx files")
+    migrate.add_argument("--delete", action="store_true", help="remove each file once stored")
+    sub.add_parser("prune", help="apply the retention policy")
+    args = parser.parse_args()
+
+    store = SnapshotStore()
+    if args.command == "migrate":
+        ids = store.migrate_legacy(delete=args.delete)
+        objects = {store.get(i)["sha256"] for i in ids}
+        print(f"Migrated {len(ids)} files into {len(objects)} snapshot objects")
+    else:
+        print(store.prune())
+
+
+if __name__ == "__main__":
+    main()
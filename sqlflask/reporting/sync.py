@@ -0,0 +1,148 @@
+"""
+sync.py
+
+Incremental table sync for the Excel reporting app.
+
+Instead of replacing a whole table on every Excel import, sync_frame()
+diffs the imported sheet against the table by primary key and applies only
+the inserts, updates and deletes, in a single transaction. Tables are read
+with Polars; when the ADBC SQLite driver is installed the read goes through
+Arrow without per-row Python conversion.
+"""
+
+import time
+
+import polars as pl
+
+try:
+    import adbc_driver_sqlite  # noqa: F401
+except ImportError:
+    HAVE_ADBC = False
+else:
+    HAVE_ADBC = True
+
+# Polars dtype -> SQLite column type for tables created by a sync
+SQLITE_TYPES = {
+    pl.Int8: "INTEGER", pl.Int16: "INTEGER", pl.Int32: "INTEGER", pl.Int64: "INTEGER",
+    pl.UInt8: "INTEGER", pl.UInt16: "INTEGER", pl.UInt32: "INTEGER", pl.UInt64: "INTEGER",
+    pl.Boolean: "INTEGER", pl.Float32: "REAL", pl.Float64: "REAL", pl.Binary: "BLOB",
+}
+
+
+def read_table(conn, table, columns=None, db_path=None):
+    """Read a table (optionally only some columns) into a Polars DataFrame."""
+    select = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+    query = f"SELECT {select} FROM {table}"
+    if HAVE_ADBC and db_path is not None:
+        return pl.read_database_uri(query, f"sqlite:///{db_path}", engine="adbc")
+    return pl.read_database(query, connection=conn, infer_schema_length=None)
+
+
+def _is_integral(series):
+    values = series.drop_nulls()
+    return bool((values == values.round(0)).all())
+
+
+def _comparable(frame):
+    # Excel round-trips turn integer columns into floats and SQLite hands back
+    # whatever was stored, so compare normalized text rather than raw dtypes.
+    exprs = []
+    for name, dtype in frame.schema.items():
+        col = pl.col(name)
+        if dtype.is_float() and _is_integral(frame[name]):
+            col = col.cast(pl.Int64)
+        exprs.append(col.cast(pl.String))
+    return frame.select(exprs)
+
+
+def _create_table(conn, table, df, key):
+    columns = []
+    for name, dtype in df.schema.items():
+        decl = SQLITE_TYPES.get(dtype.base_type(), "TEXT")
+        if name == key:
+            decl += " PRIMARY KEY"
+        columns.append(f'"{name}" {decl}')
+    conn.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+
+
+def _insert(conn, table, frame):
+    if frame.height:
+        names = ", ".join(f'"{c}"' for c in frame.columns)
+        placeholders = ", ".join("?" * frame.width)
+        conn.executemany(f"INSERT INTO {table} ({names}) VALUES ({placeholders})", frame.iter_rows())
+
+
+def sync_frame(conn, table, df, key="id"):
+    """
+    Make `table` match `df`, touching only rows that differ.
+
+    Rows are matched on `key`. Columns in `df` that the table lacks are
+    added; table columns missing from `df` are left alone. If the table does
+    not exist it is created; if either side lacks the key column the table
+    contents are replaced. Everything runs in one transaction.
+
+    Returns a dict with inserted/updated/deleted counts, the mode used
+    ("incremental", "created" or "replaced") and the seconds taken.
+    """
+    started = time.perf_counter()
+    table_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    inserted = updated = deleted = 0
+
+    with conn:
+        # Explicit BEGIN so the ALTER TABLEs below are part of the transaction too
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        if not table_columns:
+            mode = "created"
+            _create_table(conn, table, df, key if key in df.columns else None)
+            _insert(conn, table, df)
+            inserted = df.height
+        else:
+            for name in df.columns:
+                if name not in table_columns:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN "{name}"')
+            if key not in df.columns or key not in table_columns:
+                mode = "replaced"
+                deleted = conn.execute(f"DELETE FROM {table}").rowcount
+                _insert(conn, table, df)
+                inserted = df.height
+            else:
+                mode = "incremental"
+                if df[key].is_duplicated().any():
+                    raise ValueError(f"Duplicate values in key column '{key}'")
+                values = [c for c in df.columns if c != key]
+                current_raw = read_table(conn, table, [key] + values)
+                current = _comparable(current_raw)
+                incoming = _comparable(df.select([key] + values))
+
+                # Masks line up with the original frames, so the typed values
+                # (not the normalized text) are what gets written back.
+                new_mask = ~incoming[key].is_in(current[key].implode())
+                gone_mask = ~current[key].is_in(incoming[key].implode())
+                both = incoming.join(current, on=key, how="inner", suffix="__db")
+                if values:
+                    differs = pl.any_horizontal([pl.col(c).ne_missing(pl.col(f"{c}__db")) for c in values])
+                    changed_mask = incoming[key].is_in(both.filter(differs)[key].implode())
+                else:
+                    changed_mask = pl.repeat(False, df.height, eager=True)
+
+                _insert(conn, table, df.filter(new_mask))
+                inserted = int(new_mask.sum())
+                updated = int(changed_mask.sum())
+                if updated:
+                    assignments = ", ".join(f'"{c}" = ?' for c in values)
+                    rows = df.filter(changed_mask).select(values + [key]).iter_rows()
+                    conn.executemany(f'UPDATE {table} SET {assignments} WHERE "{key}" = ?', rows)
+                deleted = int(gone_mask.sum())
+                if deleted:
+                    gone = current_raw.filter(gone_mask).select(key).iter_rows()
+                    conn.executemany(f'DELETE FROM {table} WHERE "{key}" = ?', gone)
+
+    return {
+        "table": table,
+        "mode": mode,
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": deleted,
+        "seconds": time.perf_counter() - started,
+    }
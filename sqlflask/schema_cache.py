@@ -0,0 +1,80 @@
+"""
+schema_cache.py
+
+In-process cache of table and column metadata for the SQLFlask application.
+
+Entries are keyed by database path and validated against SQLite's
+PRAGMA schema_version, which every CREATE/ALTER/DROP increments, so a
+listing is served from memory until the schema changes in this or any
+other process. The blueprints also invalidate explicitly after running DDL,
+and when a database file is renamed or deleted, since a new file under the
+same name can start at the same schema_version.
+Tables the app keeps for itself (named with INTERNAL_PREFIX) are not listed.
+"""
+
+import threading
+
+from .query import quote
+
+# Shadow copies, statistics and other bookkeeping tables the app creates
+INTERNAL_PREFIX = "_sqlflask_"
+
+
+class SchemaCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # db_path -> (schema_version, {"tables": [...], "columns": {table: [...]}})
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, db, db_path):
+        version = db.execute("PRAGMA schema_version").fetchone()[0]
+        with self._lock:
+            cached = self._entries.get(db_path)
+            if cached is None or cached[0] != version:
+                cached = (version, {"tables": None, "columns": {}})
+                self._entries[db_path] = cached
+            return cached[1]
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def tables(self, db, db_path):
+        """Names of the user tables in the database, in sqlite_master order."""
+        entry = self._entry(db, db_path)
+        tables = entry["tables"]
+        self._count(tables is not None)
+        if tables is None:
+            rows = db.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+                "AND substr(name, 1, ?) != ?;",
+                (len(INTERNAL_PREFIX), INTERNAL_PREFIX),
+            ).fetchall()
+            tables = entry["tables"] = [row[0] for row in rows]
+        return tables
+
+    def table_info(self, db, db_path, table):
+        """Rows of PRAGMA table_info(table); empty if the table does not exist."""
+        # Only real tables are cached, so arbitrary names from URLs cannot grow the cache
+        if table not in self.tables(db, db_path):
+            return []
+        entry = self._entry(db, db_path)
+        columns = entry["columns"].get(table)
+        self._count(columns is not None)
+        if columns is None:
+            columns = entry["columns"][table] = db.execute(f"PRAGMA table_info({quote(table)})").fetchall()
+        return columns
+
+    def invalidate(self, db_path=None):
+        with self._lock:
+            if db_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(db_path, None)
+
+
+schema_cache = SchemaCache()
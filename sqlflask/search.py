@@ -0,0 +1,135 @@
+"""
+search.py
+
+Opt-in full-text search over the tables of a database, using SQLite FTS5.
+
+enable() creates an external-content FTS5 index for the chosen TEXT columns
+of a table (so the text is not stored twice), builds it, and adds triggers
+that keep it in sync with every INSERT and DELETE on the table, and every
+UPDATE of an indexed column or the rowid, whichever route or process makes
+them. search() runs one ranked MATCH per
+indexed table and merges the hits by bm25 score.
+
+Index and trigger names start with INTERNAL_PREFIX, so they are hidden from
+the table listings and ignored by profiling and the catalog.
+"""
+
+import sqlite3
+
+from markupsafe import Markup, escape
+
+from .config import SEARCH_RESULTS_LIMIT, SEARCH_SNIPPET_TOKENS
+from .query import quote
+from .schema_cache import INTERNAL_PREFIX
+
+FTS_PREFIX = f"{INTERNAL_PREFIX}fts_"
+TEXT_AFFINITY = ("CHAR", "CLOB", "TEXT")
+# Snippet markers that cannot appear in ordinary text; replaced after escaping
+_OPEN, _CLOSE = "\x02", "\x03"
+
+
+def fts_name(table):
+    return f"{FTS_PREFIX}{table}"
+
+
+def text_columns(table_info):
+    """Columns with TEXT affinity (or no declared type), the ones worth indexing."""
+    return [
+        col["name"] for col in table_info
+        if not col["type"] or any(word in col["type"].upper() for word in TEXT_AFFINITY)
+    ]
+
+
+def indexed_tables(db):
+    """{table: [indexed columns]} for every table with a search index."""
+    rows = db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND substr(name, 1, ?) = ? "
+        "AND sql LIKE 'CREATE VIRTUAL TABLE%'",
+        (len(FTS_PREFIX), FTS_PREFIX),
+    ).fetchall()
+    return {
+        row[0][len(FTS_PREFIX):]: [col[1] for col in db.execute(f"PRAGMA table_info({quote(row[0])})")]
+        for row in rows
+    }
+
+
+def indexed_columns(db, table):
+    return indexed_tables(db).get(table, [])
+
+
+def rowid_alias(conn, table):
+    """[name] of the INTEGER PRIMARY KEY column that aliases the rowid, if any."""
+    keys = [col for col in conn.execute(f"PRAGMA table_info({quote(table)})") if col[5]]
+    if len(keys) == 1 and keys[0][2].upper() == "INTEGER":
+        return [keys[0][1]]
+    return []
+
+
+def disable(conn, table):
+    """Drop the search index of `table` and its triggers."""
+    for suffix in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {quote(f'{fts_name(table)}_{suffix}')}")
+    conn.execute(f"DROP TABLE IF EXISTS {quote(fts_name(table))}")
+
+
+def enable(conn, table, columns):
+    """(Re)create the search index of `table` over `columns` and fill it."""
+    disable(conn, table)
+    if not columns:
+        return
+    fts, source = quote(fts_name(table)), quote(table)
+    names = ", ".join(quote(col) for col in columns)
+    new = ", ".join(f"new.{quote(col)}" for col in columns)
+    old = ", ".join(f"old.{quote(col)}" for col in columns)
+    conn.execute(
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content={quote(table)}, content_rowid='rowid')"
+    )
+    delete = f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old});"
+    insert = f"INSERT INTO {fts} (rowid, {names}) VALUES (new.rowid, {new});"
+    trigger = lambda suffix: quote(f"{fts_name(table)}_{suffix}")  # noqa: E731
+    conn.execute(f"CREATE TRIGGER {trigger('insert')} AFTER INSERT ON {source} BEGIN {insert} END")
+    conn.execute(f"CREATE TRIGGER {trigger('delete')} AFTER DELETE ON {source} BEGIN {delete} END")
+    # Updates that leave the indexed text and the rowid alone do not touch the index
+    watched = ", ".join(quote(col) for col in columns + rowid_alias(conn, table))
+    conn.execute(
+        f"CREATE TRIGGER {trigger('update')} AFTER UPDATE OF {watched} ON {source} BEGIN {delete} {insert} END"
+    )
+    conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def match_query(text):
+    """
+    FTS5 query for free text: every word must match, the last one as a
+    prefix so results appear while typing. Words are quoted, so FTS5
+    operators and punctuation in the input are searched for literally.
+    """
+    words = text.split()
+    if not words:
+        return None
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search(db, text, limit=SEARCH_RESULTS_LIMIT):
+    """Hits across all indexed tables, best first: {"table", "rowid", "snippet", "rank"}."""
+    query = match_query(text)
+    if query is None:
+        return []
+    hits = []
+    for table in indexed_tables(db):
+        fts = quote(fts_name(table))
+        try:
+            rows = db.execute(
+                f"SELECT rowid, snippet({fts}, -1, ?, ?, '…', ?), bm25({fts}) FROM {fts} "
+                f"WHERE {fts} MATCH ? ORDER BY bm25({fts}) LIMIT ?",
+                (_OPEN, _CLOSE, SEARCH_SNIPPET_TOKENS, query, limit),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # e.g. the source table was renamed or dropped behind the index's back
+            continue
+        for rowid, snippet, rank in rows:
+            snippet = str(escape(snippet)).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+            hits.append({"table": table, "rowid": rowid, "snippet": Markup(snippet), "rank": rank})
+    hits.sort(key=lambda hit: hit["rank"])
+    return hits[:limit]
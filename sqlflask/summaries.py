@@ -0,0 +1,282 @@
+"""
+summaries.py
+
+Materialized aggregate summaries kept up to date by SQLite triggers.
+
+A summary is declared per table: an optional group-by column and a list of
+aggregates - count, sum, min and max over columns. declare() stores the
+declaration, creates the summary table (one row per group, plus the row
+count `n` of every group), fills it, and installs AFTER INSERT / UPDATE /
+DELETE triggers that adjust only the affected group. Counts and sums are
+updated arithmetically; a min or max is recomputed from the table only
+when the row holding it is deleted or changed. Reading a summary therefore
+costs one row per group however large the table is.
+
+Summaries are repaired with rebuild() if they ever drift, e.g. after rows
+were changed with the triggers dropped:
+
+    python -m sqlflask.summaries data/db.sqlite --check
+    python -m sqlflask.summaries data/db.sqlite --rebuild [NAME ...]
+
+All tables and triggers start with INTERNAL_PREFIX, so they are hidden from
+the table listings.
+"""
+
+import argparse
+import json
+import sqlite3
+
+from .query import quote
+from .schema_cache import INTERNAL_PREFIX
+
+DECLARATIONS = f"{INTERNAL_PREFIX}summaries"
+SUMMARY_PREFIX = f"{INTERNAL_PREFIX}summary_"
+FUNCTIONS = ("count", "sum", "min", "max")
+
+
+class SummaryError(ValueError):
+    pass
+
+
+def summary_table(name):
+    return f"{SUMMARY_PREFIX}{name}"
+
+
+def parse_aggregates(text):
+    """'count, sum:amount, max:amount' -> [("count", None), ("sum", "amount"), ("max", "amount")]"""
+    aggregates = []
+    for item in (part.strip() for part in text.split(",")):
+        if not item:
+            continue
+        func, _, column = item.partition(":")
+        func, column = func.strip().lower(), column.strip() or None
+        if func not in FUNCTIONS:
+            raise SummaryError(f"Unknown aggregate '{func}', expected one of: {', '.join(FUNCTIONS)}")
+        if (func == "count") != (column is None):
+            raise SummaryError(f"'{item}': count takes no column, {', '.join(FUNCTIONS[1:])} need one")
+        if (func, column) not in aggregates:
+            aggregates.append((func, column))
+    return aggregates
+
+
+def declarations(db, table=None):
+    """Declared summaries, optionally only those of `table`."""
+    try:
+        rows = db.execute(f"SELECT name, tbl, group_by, aggregates FROM {DECLARATIONS} ORDER BY name").fetchall()
+    except sqlite3.OperationalError:
+        return []
+    return [
+        {"name": name, "table": tbl, "group_by": group_by, "aggregates": [tuple(a) for a in json.loads(aggregates)]}
+        for name, tbl, group_by, aggregates in rows
+        if table is None or tbl == table
+    ]
+
+
+def declaration(db, name):
+    return next((d for d in declarations(db) if d["name"] == name), None)
+
+
+def summarized_columns(db, table):
+    """Columns of `table` that some summary groups by or aggregates."""
+    columns = set()
+    for d in declarations(db, table):
+        columns.update(col for _, col in d["aggregates"] if col)
+        if d["group_by"]:
+            columns.add(d["group_by"])
+    return columns
+
+
+def _value_columns(aggregates):
+    """Summary table column for each (function, column) other than count."""
+    return [(func, col, f"{func}_{col}") for func, col in aggregates if func != "count"]
+
+
+def _triggers(d):
+    """CREATE TRIGGER statements keeping the summary of declaration `d` in sync."""
+    table, summary = quote(d["table"]), quote(summary_table(d["name"]))
+    group = d["group_by"]
+    values = _value_columns(d["aggregates"])
+
+    def key(row):
+        return f"{row}.{quote(group)}" if group else "NULL"
+
+    def add(row):
+        sets = ["n = n + 1"]
+        for func, col, target in values:
+            value, target = f"{row}.{quote(col)}", quote(target)
+            if func == "sum":
+                sets.append(f"{target} = {target} + coalesce({value}, 0)")
+            else:
+                better = "<" if func == "min" else ">"
+                sets.append(
+                    f"{target} = CASE WHEN {value} IS NULL THEN {target} "
+                    f"WHEN {target} IS NULL OR {value} {better} {target} THEN {value} ELSE {target} END"
+                )
+        return (
+            f"INSERT INTO {summary} (grp) SELECT {key(row)} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {summary} WHERE grp IS {key(row)}); "
+            f"UPDATE {summary} SET {', '.join(sets)} WHERE grp IS {key(row)};"
+        )
+
+    def subtract():
+        sets = ["n = n - 1"] + [
+            f"{quote(target)} = {quote(target)} - coalesce(old.{quote(col)}, 0)"
+            for func, col, target in values if func == "sum"
+        ]
+        return f"UPDATE {summary} SET {', '.join(sets)} WHERE grp IS {key('old')};"
+
+    def recompute():
+        # The old row may have held the extreme; only then is the group rescanned
+        where = f" WHERE {quote(group)} IS old.{quote(group)}" if group else ""
+        return "".join(
+            f" UPDATE {summary} SET {quote(target)} = (SELECT {func}({quote(col)}) FROM {table}{where}) "
+            f"WHERE grp IS {key('old')} AND {quote(target)} IS old.{quote(col)};"
+            for func, col, target in values if func != "sum"
+        )
+
+    prune = f" DELETE FROM {summary} WHERE grp IS old.{quote(group)} AND n = 0;" if group else ""
+    trigger = lambda suffix: quote(f"{summary_table(d['name'])}_{suffix}")  # noqa: E731
+    statements = [
+        f"CREATE TRIGGER {trigger('insert')} AFTER INSERT ON {table} BEGIN {add('new')} END",
+        f"CREATE TRIGGER {trigger('delete')} AFTER DELETE ON {table} BEGIN {subtract()}{recompute()}{prune} END",
+    ]
+    watched = sorted({col for _, col, _ in values} | ({group} if group else set()))
+    if watched:
+        # Updates of other columns cannot change the summary
+        statements.append(
+            f"CREATE TRIGGER {trigger('update')} AFTER UPDATE OF {', '.join(quote(c) for c in watched)} ON {table} "
+            f"BEGIN {subtract()} {add('new')}{recompute()}{prune} END"
+        )
+    return statements
+
+
+def _aggregate_query(d):
+    """SELECT computing the summary of declaration `d` from scratch."""
+    group = quote(d["group_by"]) if d["group_by"] else None
+    exprs = [group or "NULL", "count(*)"] + [
+        f"coalesce(sum({quote(col)}), 0)" if func == "sum" else f"{func}({quote(col)})"
+        for func, col, _ in _value_columns(d["aggregates"])
+    ]
+    sql = f"SELECT {', '.join(exprs)} FROM {quote(d['table'])}"
+    return sql + f" GROUP BY {group}" if group else sql
+
+
+def declare(conn, name, table, group_by, aggregates):
+    """Create (or replace) summary `name` of `table` and fill it. Run inside a write transaction."""
+    if not name.isidentifier():
+        raise SummaryError(f"Invalid summary name '{name}', use letters, digits and underscores.")
+    columns = [col[1] for col in conn.execute(f"PRAGMA table_info({quote(table)})")]
+    if not columns or table.startswith(INTERNAL_PREFIX):
+        raise SummaryError(f"Table '{table}' does not exist.")
+    unknown = [col for col in [group_by] + [col for _, col in aggregates] if col and col not in columns]
+    if unknown:
+        raise SummaryError(f"Unknown column(s): {', '.join(unknown)}")
+    drop(conn, name)
+    d = {"name": name, "table": table, "group_by": group_by or None, "aggregates": list(aggregates)}
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {DECLARATIONS} (name TEXT PRIMARY KEY, tbl TEXT, group_by TEXT, aggregates TEXT)")
+    conn.execute(
+        f"INSERT INTO {DECLARATIONS} (name, tbl, group_by, aggregates) VALUES (?, ?, ?, ?)",
+        (name, table, d["group_by"], json.dumps(d["aggregates"])),
+    )
+    # Untyped columns store values exactly as the table holds them
+    targets = ", ".join(f"{quote(target)} DEFAULT {0 if func == 'sum' else 'NULL'}" for func, _, target in _value_columns(aggregates))
+    conn.execute(f"CREATE TABLE {quote(summary_table(name))} (grp, n DEFAULT 0{', ' + targets if targets else ''})")
+    conn.execute(f"CREATE INDEX {quote(summary_table(name) + '_grp')} ON {quote(summary_table(name))} (grp)")
+    for sql in _triggers(d):
+        conn.execute(sql)
+    rebuild(conn, name)
+
+
+def drop(conn, name):
+    for suffix in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {quote(f'{summary_table(name)}_{suffix}')}")
+    conn.execute(f"DROP TABLE IF EXISTS {quote(summary_table(name))}")
+    try:
+        conn.execute(f"DELETE FROM {DECLARATIONS} WHERE name = ?", (name,))
+    except sqlite3.OperationalError:
+        pass
+
+
+def drop_table(conn, table):
+    """Drop the summaries of a table that is being dropped."""
+    for d in declarations(conn, table):
+        drop(conn, d["name"])
+
+
+def rename_table(conn, old, new):
+    """Follow ALTER TABLE ... RENAME; SQLite already rewrote the trigger bodies."""
+    try:
+        conn.execute(f"UPDATE {DECLARATIONS} SET tbl = ? WHERE tbl = ?", (new, old))
+    except sqlite3.OperationalError:
+        pass
+
+
+def rebuild(conn, name):
+    """Recompute summary `name` from its table, repairing any drift."""
+    d = declaration(conn, name)
+    if d is None:
+        raise SummaryError(f"Summary '{name}' does not exist.")
+    summary = quote(summary_table(name))
+    targets = ", ".join(["grp", "n"] + [quote(target) for _, _, target in _value_columns(d["aggregates"])])
+    conn.execute(f"DELETE FROM {summary}")
+    conn.execute(f"INSERT INTO {summary} ({targets}) {_aggregate_query(d)}")
+
+
+def read(db, name):
+    """Rows of summary `name`: {"group", "count", "<func>_<column>", ...}."""
+    d = declaration(db, name)
+    if d is None:
+        raise SummaryError(f"Summary '{name}' does not exist.")
+    cursor = db.execute(f"SELECT * FROM {quote(summary_table(name))} ORDER BY grp")
+    names = ["group", "count"] + [desc[0] for desc in cursor.description[2:]]
+    return [dict(zip(names, row)) for row in cursor]
+
+
+def check(db, name):
+    """Groups whose stored summary differs from a fresh aggregation; empty means in sync."""
+    d = declaration(db, name)
+    if d is None:
+        raise SummaryError(f"Summary '{name}' does not exist.")
+    stored = {row[0]: tuple(row[1:]) for row in db.execute(f"SELECT * FROM {quote(summary_table(name))}")}
+    fresh = {row[0]: tuple(row[1:]) for row in db.execute(_aggregate_query(d))}
+    return sorted((key for key in stored.keys() | fresh.keys() if stored.get(key) != fresh.get(key)), key=repr)
+
+
+def row_counts(db):
+    """{table: row count} from the ungrouped summaries, read in constant time."""
+    counts = {}
+    for d in declarations(db):
+        if not d["group_by"]:
+            row = db.execute(f"SELECT n FROM {quote(summary_table(d['name']))}").fetchone()
+            counts[d["table"]] = row[0] if row else 0
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or rebuild the materialized summaries of a database.")
+    parser.add_argument("database")
+    parser.add_argument("names", nargs="*", help="summaries to process (default: all)")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--check", action="store_true", help="report summaries that drifted from their tables")
+    action.add_argument("--rebuild", action="store_true", help="recompute summaries from their tables")
+    args = parser.parse_args()
+
+    from .pragmas import connect
+
+    conn = connect(args.database)
+    try:
+        names = args.names or [d["name"] for d in declarations(conn)]
+        for name in names:
+            if args.check:
+                drifted = check(conn, name)
+                print(f"{name}: {'in sync' if not drifted else f'{len(drifted)} groups drifted'}")
+            else:
+                with conn:
+                    rebuild(conn, name)
+                print(f"{name}: rebuilt")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
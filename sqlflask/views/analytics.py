@@ -0,0 +1,47 @@
+"""
+analytics.py
+
+Blueprint for the analytics API in the SQLFlask application.
+
+This module provides /analytics/<table_name>, which runs a group-by,
+aggregate or pivot query over a table of the currently selected database
+(see sqlflask/analytics.py for the syntax) and returns an HTMX table
+fragment, JSON, or an Arrow IPC file (format=arrow) that the Shiny
+reporting app reads with polars.read_ipc().
+"""
+
+import io
+
+from flask import Blueprint, Response, jsonify, render_template, request
+from .utils import get_db, get_tables, get_table_info, current_db_file
+from .query import wants_json
+from ..analytics import parse_analytics, run
+from ..export import FORMATS
+from ..query import QueryError
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix="/analytics")
+
+@analytics_bp.route("/<table_name>", methods=["GET"])
+def analyze_table(table_name):
+    db = get_db()
+    if table_name not in get_tables(db):
+        return f"Table '{table_name}' does not exist.", 404
+    try:
+        import polars  # noqa: F401
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "Analytics requires polars and pyarrow.", 501
+    table_info = get_table_info(db, table_name)
+    try:
+        spec = parse_analytics(request.args, [col["name"] for col in table_info])
+        frame = run(db, current_db_file(), table_name, table_info, spec)
+    except QueryError as e:
+        return f"Error: {e}", 400
+
+    if request.args.get("format") == "arrow":
+        buf = io.BytesIO()
+        frame.write_ipc(buf)
+        return Response(buf.getvalue(), mimetype=FORMATS["arrow"])
+    if wants_json():
+        return jsonify({"columns": frame.columns, "rows": [list(row) for row in frame.rows()]})
+    return render_template("_query_table.html", table_name=table_name, columns=frame.columns, rows=frame.rows(named=True))
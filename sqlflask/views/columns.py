@@ -5,20 +5,36 @@ Blueprint for column-related routes and logic in the SQLFlask application.
 
 This module provides routes for listing, adding, renaming, and deleting columns
 within the currently selected table of the SQLite database. It also includes
-helper functions for retrieving column metadata.
+helper functions for retrieving column metadata and profiling statistics, and
+the form choosing which columns are full-text indexed (search.py). Renames and drops on large
+tables run as background migrations (migrations.py) whose progress the
+column list polls; both are recorded in the audit log (changelog.py).
 """
 
 from flask import Blueprint, render_template, request, g, session, redirect, url_for
-from .utils import get_db
+from .utils import get_db, get_table_info, invalidate_schema, current_db_path, current_db_file, schema_version, execute_write
+from ..fragment_cache import cached_partial, database_token
+from ..migrations import migrations, MigrationError
+from ..profiling import column_stats, stats_version
+from ..search import indexed_columns, text_columns
+from ..summaries import summarized_columns
+from ..changelog import ChangelogError, column_change
 import sqlite3
 
 columns_bp = Blueprint('columns', __name__, url_prefix="/columns")
 
 def get_all_columns(db, table):
-    columns = db.execute(f"PRAGMA table_info({table})").fetchall()
-    return [{"id": col["cid"], "name": col["name"]} for col in columns]
+    columns = get_table_info(db, table)
+    stats = column_stats(db, table) if columns else {}
+    return [{"id": col["cid"], "name": col["name"], "stats": stats.get(col["name"])} for col in columns]
+
+def describe_columns():
+    db_path = current_db_path()
+    key = (db_path, session.get("current_database", "none"), session.get("current_table", "details"))
+    return key, database_token(current_db_file()), lambda: (schema_version(), stats_version(get_db()))
 
 @columns_bp.route("/", methods=["GET", "POST"])
+@cached_partial(describe_columns)
 def index():
     g.context = "Columns"
     db = get_db()
@@ -31,9 +47,11 @@ def index():
         column_name = request.form.get("name")
         if not column_name:
             return "Column name is required.", 400
+        if migrations.running(current_db_path(), current_table):
+            return f"Error: A migration of table '{current_table}' is still running.", 409
         try:
-            db.execute(f'ALTER TABLE {current_table} ADD COLUMN "{column_name}" TEXT')
-            db.commit()
+            execute_write((f'ALTER TABLE {current_table} ADD COLUMN "{column_name}" TEXT', ()))
+            invalidate_schema()
         except sqlite3.OperationalError as e:
             return f"Error: {e}", 400
 
@@ -56,7 +74,9 @@ def index():
         context="Columns",
         current_database=g.current_database,
         current_table=current_table,
-        item_list=item_list
+        item_list=item_list,
+        text_columns=text_columns(get_table_info(db, current_table)),
+        indexed_columns=indexed_columns(db, current_table),
     )
 
 @columns_bp.route("/add", methods=["POST"])
@@ -68,9 +88,11 @@ def add():
     column_name = request.form.get("name")
     if not column_name:
         return "Column name is required.", 400
+    if migrations.running(current_db_path(), current_table):
+        return f"Error: A migration of table '{current_table}' is still running.", 409
     try:
-        db.execute(f'ALTER TABLE {current_table} ADD COLUMN "{column_name}" TEXT')
-        db.commit()
+        execute_write((f'ALTER TABLE {current_table} ADD COLUMN "{column_name}" TEXT', ()))
+        invalidate_schema()
     except sqlite3.OperationalError as e:
         return f"Error: {e}", 400
 
@@ -88,7 +110,7 @@ def add():
 def select_column(column_name):
     session["current_column"] = column_name
     g.current_column = column_name
-    return redirect(url_for('rows.index'))
+    return redirect(url_for('relationships.index'))
 
 @columns_bp.route('/edit/<int:column_id>', methods=['GET'])
 def edit_column(column_id):
@@ -96,7 +118,7 @@ def edit_column(column_id):
     g.current_database = session.get("current_database", "none")
     g.current_table = session.get("current_table", "details")
     current_table = g.current_table
-    columns = db.execute(f"PRAGMA table_info({current_table})").fetchall()
+    columns = get_table_info(db, current_table)
     column = next((col for col in columns if col["cid"] == column_id), None)
     if not column:
         return "Column not found", 404
@@ -110,19 +132,12 @@ def update_column(column_id):
     g.current_table = session.get("current_table", "details")
     current_table = g.current_table
     new_name = request.form["name"]
-    columns = db.execute(f"PRAGMA table_info({current_table})").fetchall()
+    columns = get_table_info(db, current_table)
     column = next((col for col in columns if col["cid"] == column_id), None)
     if not column:
         return "Column not found", 404
     old_name = column["name"]
-    try:
-        db.execute(f'ALTER TABLE {current_table} RENAME COLUMN "{old_name}" TO "{new_name}"')
-        db.commit()
-    except sqlite3.OperationalError as e:
-        return f"Error: {e}", 400
-    columns = get_all_columns(db, current_table)
-    item_list = columns
-    return render_template("_rows.html", item_list=item_list, context="Columns")
+    return alter_column(db, current_table, "rename", old_name, new_name)
 
 @columns_bp.route('/delete/<int:column_id>', methods=['DELETE'])
 def column_delete(column_id):
@@ -130,16 +145,34 @@ def column_delete(column_id):
     g.current_database = session.get("current_database", "none")
     g.current_table = session.get("current_table", "details")
     current_table = g.current_table
-    columns = db.execute(f"PRAGMA table_info({current_table})").fetchall()
+    columns = get_table_info(db, current_table)
     column = next((col for col in columns if col["cid"] == column_id), None)
     if not column:
         return "Column not found", 404
     column_name = column["name"]
+    return alter_column(db, current_table, "drop", column_name)
+
+def alter_column(db, table, action, column, new_name=None):
+    # Large tables are rebuilt in the background; the column list then polls for progress
+    if column in indexed_columns(db, table):
+        return f"Error: Column '{column}' is in the search index of '{table}'; remove it from the index first.", 409
+    if column in summarized_columns(db, table):
+        return f"Error: Column '{column}' is used by a summary of '{table}'; drop the summary first.", 409
     try:
-        db.execute(f'ALTER TABLE {current_table} DROP COLUMN "{column_name}"')
-        db.commit()
+        # Logged to the audit log (with a dropped column's values) in the transaction making the change
+        job = migrations.alter(db, current_db_path(), table, action, column, new_name, log=column_change(table, action, column, new_name))
+        invalidate_schema()
+    except (MigrationError, ChangelogError) as e:
+        return f"Error: {e}", 409
     except sqlite3.OperationalError as e:
         return f"Error: {e}", 400
-    columns = get_all_columns(db, current_table)
-    item_list = columns
-    return render_template("_rows.html", item_list=item_list, context="Columns")
\ No newline at end of file
+    return render_template("_rows.html", item_list=get_all_columns(db, table), context="Columns", migration=job)
+
+@columns_bp.route('/migration', methods=['GET'])
+def migration_status():
+    db = get_db()
+    current_table = session.get("current_table", "details")
+    job = migrations.job(current_db_path(), current_table)
+    if job is not None and job["state"] != "running":
+        invalidate_schema()
+    return render_template("_rows.html", item_list=get_all_columns(db, current_table), context="Columns", migration=job)
@@ -1,5 +1,7 @@
-from flask import Blueprint, render_template, request, redirect, url_for
-from .utils import get_db
+from flask import Blueprint, Response, current_app, render_template, request, redirect, stream_with_context, url_for
+from .utils import get_db, get_table_info, execute_write
+from ..config import DATA_LIST_PAGE_SIZE, DATA_LIST_MAX_PAGE_SIZE, DATA_LIST_STREAM_BATCH
+from ..changelog import tracked
 
 data_entry_bp = Blueprint('data_entry', __name__)
 
@@ -23,8 +25,7 @@ def data_entry(table_name):
     if not table_name or table_name.lower() == "none":
         return "No table selected. Please select a table first.", 400
 
-    cursor = db.execute(f"PRAGMA table_info({table_name})")
-    columns = cursor.fetchall()
+    columns = get_table_info(db, table_name)
 
     if not columns:
         return f"Table '{table_name}' does not exist.", 400
@@ -33,19 +34,90 @@ def data_entry(table_name):
         fields = [col[1] for col in columns if col[1] != 'id']  # skip 'id' if it's auto-increment
         values = [request.form.get(col) for col in fields]
         placeholders = ','.join('?' * len(fields))
-        db.execute(f"INSERT INTO {table_name} ({','.join(fields)}) VALUES ({placeholders})", values)
-        db.commit()
+        sql = f"INSERT INTO {table_name} ({','.join(fields)}) VALUES ({placeholders})"
+        execute_write(tracked(f"insert into {table_name}", table_name, sql, values))
         return redirect(url_for("data_entry.data_list", table_name=table_name))
 
     return render_template("_data_entry.html", table_name=table_name, columns=columns)
 
+def fetch_page(db, table_name, after=None, limit=DATA_LIST_PAGE_SIZE):
+    """
+    Fetch one keyset page of rows ordered by rowid.
+
+    Each row carries its rowid as ``_cursor``. Pass the returned cursor as
+    ``after`` to get the next page; it is None when there are no more rows.
+    Unlike OFFSET paging, every page costs the same regardless of depth.
+    """
+    if after is None:
+        cursor = db.execute(
+            f"SELECT rowid AS _cursor, * FROM {table_name} ORDER BY rowid LIMIT ?",
+            (limit + 1,),
+        )
+    else:
+        cursor = db.execute(
+            f"SELECT rowid AS _cursor, * FROM {table_name} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (after, limit + 1),
+        )
+    rows = cursor.fetchall()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]["_cursor"]
+    return rows, None
+
+def iter_rows(cursor, batch_size=DATA_LIST_STREAM_BATCH):
+    # Pull rows in fixed-size batches so only one batch is held in memory.
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        yield from batch
+
+def buffered(chunks, size=64 * 1024):
+    # Jinja yields many tiny strings; coalesce them into reasonably sized writes.
+    buf, length = [], 0
+    for chunk in chunks:
+        buf.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buf)
+            buf, length = [], 0
+    if buf:
+        yield "".join(buf)
+
+def page_size_arg():
+    limit = request.args.get("limit", DATA_LIST_PAGE_SIZE, type=int)
+    return max(1, min(limit, DATA_LIST_MAX_PAGE_SIZE))
+
 @data_entry_bp.route("/data-list/<table_name>")
 def data_list(table_name):
+    """
+    List the rows of a table.
+
+    Query parameters:
+        after (int): rowid cursor returned by the previous page.
+        limit (int): page size, capped at DATA_LIST_MAX_PAGE_SIZE.
+        stream (str): "1" streams the whole table instead of paginating.
+
+    HTMX requests receive only the table rows plus a "load more" row that
+    fetches the next page when it scrolls into view.
+    """
     db = get_db()
-    cursor = db.execute(f"PRAGMA table_info({table_name})")
-    columns = [col[1] for col in cursor.fetchall()]
-    rows = db.execute(f"SELECT * FROM {table_name}").fetchall()
-    return render_template("_data_list.html", table_name=table_name, columns=columns, rows=rows)
+    columns = [col[1] for col in get_table_info(db, table_name)]
+    if not columns:
+        return f"Table '{table_name}' does not exist.", 404
+
+    if request.args.get("stream") == "1":
+        rows = iter_rows(db.execute(f"SELECT rowid AS _cursor, * FROM {table_name} ORDER BY rowid"))
+        context = {"table_name": table_name, "columns": columns, "rows": rows, "next_cursor": None, "limit": None}
+        current_app.update_template_context(context)
+        template = current_app.jinja_env.get_template("_data_list.html")
+        return Response(stream_with_context(buffered(template.generate(context))), mimetype="text/html")
+
+    limit = page_size_arg()
+    rows, next_cursor = fetch_page(db, table_name, request.args.get("after", type=int), limit)
+    template = "_data_rows.html" if request.headers.get("HX-Request") == "true" else "_data_list.html"
+    return render_template(
+        template, table_name=table_name, columns=columns, rows=rows, next_cursor=next_cursor, limit=limit
+    )
 
 @data_entry_bp.route("/data-edit/<table_name>/<int:record_id>", methods=["GET", "POST"])
 def edit_record(table_name, record_id):
@@ -54,7 +126,6 @@ def edit_record(table_name, record_id):
 
 @data_entry_bp.route("/data-delete/<table_name>/<int:record_id>", methods=["POST"])
 def delete_record(table_name, record_id):
-    db = get_db()
-    db.execute(f"DELETE FROM {table_name} WHERE id = ?", (record_id,))
-    db.commit()
+    sql = f"DELETE FROM {table_name} WHERE id = ?"
+    execute_write(tracked(f"delete {table_name} #{record_id}", table_name, sql, (record_id,), "id = ?", (record_id,)))
     return redirect(url_for("data_entry.data_list", table_name=table_name))
\ No newline at end of file
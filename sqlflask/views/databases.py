@@ -4,28 +4,45 @@ databases.py
 Blueprint for database-related routes and logic in the SQLFlask application.
 
 This module provides routes for listing, creating, editing, updating, and deleting SQLite database files.
-It also includes helper functions for retrieving database metadata.
+It also includes helper functions for retrieving database metadata, which
+is served by the catalog (catalog.py) with stable IDs, and routes to run
+and poll maintenance jobs (maintenance.py).
 """
 
 from flask import Blueprint, render_template, request, g, session, redirect, url_for, current_app
 import os
 import sqlite3
+from ..pool import pool
+from ..writer import writer
+from ..pragmas import init_database, detach_database, SIDECAR_SUFFIXES
+from ..fragment_cache import cached_partial
+from ..catalog import catalog
+from ..schema_cache import schema_cache
+from ..maintenance import maintenance, JOBS
 
 database_bp = Blueprint('database', __name__, url_prefix="/databases")
 
-from flask import current_app
-
 def get_all_databases():
     data_dir = current_app.config["DATA_DIR"]
-    return [
-        {"id": idx, "name": db}
-        for idx, db in enumerate(os.listdir(data_dir))
-        if db.endswith(".sqlite")
-    ]
+    databases = catalog.databases(data_dir)
+    for db in databases:
+        db["maintenance"] = maintenance.jobs(os.path.join(data_dir, db["name"]))
+    return databases
+
+def get_database(db_id):
+    return catalog.get(current_app.config["DATA_DIR"], db_id)
+
+def describe_databases():
+    # The catalog version changes whenever a file is added, renamed, removed or resized
+    data_dir = current_app.config["DATA_DIR"]
+    version = (catalog.version(data_dir), maintenance.version)
+    return data_dir, version, lambda: version
 
 @database_bp.route("/", methods=["GET"])
+@cached_partial(describe_databases)
 def index():
     g.context = "Databases"
+    maintenance.schedule(current_app.config["DATA_DIR"])
     databases = get_all_databases()
     if request.headers.get("HX-Request") == "true":
         # HTMX request: return only the rows partial
@@ -50,9 +67,11 @@ def add():
     data_dir = current_app.config["DATA_DIR"]
     db_path = os.path.join(data_dir, f"{database_name}.sqlite")
     try:
-        sqlite3.connect(db_path).close()
+        init_database(db_path)
     except Exception as e:
         return f"Error: {e}", 400
+    # Directory mtimes are coarse; rescan rather than risk serving the old listing
+    catalog.forget(data_dir)
     databases = get_all_databases()
     return render_template(
         "_rows.html",
@@ -69,8 +88,7 @@ def select_database(db_name):
 
 @database_bp.route('/edit/<int:db_id>', methods=['GET'])
 def edit(db_id):
-    databases = get_all_databases()
-    db = next((d for d in databases if d["id"] == db_id), None)
+    db = get_database(db_id)
     if not db:
         return "Database not found", 404
     return render_template("_edit_form.html", item=db, context="Databases")
@@ -78,8 +96,7 @@ def edit(db_id):
 @database_bp.route('/update/<int:db_id>', methods=['PUT'])
 def update(db_id):
     data_dir = current_app.config["DATA_DIR"]
-    databases = get_all_databases()
-    db = next((d for d in databases if d["id"] == db_id), None)
+    db = get_database(db_id)
     if not db:
         return "Database not found", 404
     old_name = db["name"]
@@ -90,7 +107,20 @@ def update(db_id):
         return f"Database {old_name} does not exist.", 404
     if os.path.exists(new_path):
         return f"Database {new_name} already exists.", 400
+    writer.close(old_path)
+    pool.dispose(old_path)
+    try:
+        detach_database(old_path)
+    except sqlite3.OperationalError as e:
+        return f"Database {old_name} is in use, try again later: {e}", 409
     os.rename(old_path, new_path)
+    for suffix in SIDECAR_SUFFIXES:
+        if os.path.exists(old_path + suffix):
+            os.replace(old_path + suffix, new_path + suffix)
+    schema_cache.invalidate(old_path)
+    schema_cache.invalidate(new_path)
+    # Directory mtimes are coarse; rescan rather than risk serving the old listing
+    catalog.forget(data_dir)
     databases = get_all_databases()
     return render_template(
         "_rows.html",
@@ -101,18 +131,51 @@ def update(db_id):
 @database_bp.route('/delete/<int:db_id>', methods=['DELETE'])
 def delete(db_id):
     data_dir = current_app.config["DATA_DIR"]
-    databases = get_all_databases()
-    db = next((d for d in databases if d["id"] == db_id), None)
+    db = get_database(db_id)
     if not db:
         return f"Database with id {db_id} does not exist.", 404
     db_path = os.path.join(data_dir, db["name"])
     if os.path.exists(db_path):
+        writer.close(db_path)
+        pool.dispose(db_path)
+        try:
+            detach_database(db_path)
+        except sqlite3.OperationalError as e:
+            return f"Database {db['name']} is in use, try again later: {e}", 409
         os.remove(db_path)
+        # Stale -wal/-shm files would be picked up by a new database of the same name
+        for suffix in SIDECAR_SUFFIXES:
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        schema_cache.invalidate(db_path)
     else:
         return f"Database {db['name']} does not exist.", 404
+    # Directory mtimes are coarse; rescan rather than risk serving the old listing
+    catalog.forget(data_dir)
     databases = get_all_databases()
     return render_template(
         "_rows.html",
         item_list=databases,
         context="Databases"
-    )
\ No newline at end of file
+    )
+
+def render_maintenance(db_id, db_name):
+    db_path = os.path.join(current_app.config["DATA_DIR"], db_name)
+    return render_template("_maintenance.html", db_id=db_id, jobs=maintenance.jobs(db_path))
+
+@database_bp.route('/maintenance/<int:db_id>', methods=['GET'])
+def maintenance_status(db_id):
+    db = get_database(db_id)
+    if not db:
+        return "Database not found", 404
+    return render_maintenance(db_id, db["name"])
+
+@database_bp.route('/maintenance/<int:db_id>/<kind>', methods=['POST'])
+def run_maintenance(db_id, kind):
+    if kind not in JOBS:
+        return f"Unknown maintenance job '{kind}', expected one of: {', '.join(JOBS)}", 400
+    db = get_database(db_id)
+    if not db:
+        return "Database not found", 404
+    maintenance.submit(os.path.join(current_app.config["DATA_DIR"], db["name"]), kind)
+    return render_maintenance(db_id, db["name"])
@@ -0,0 +1,34 @@
+"""
+exports.py
+
+Blueprint for exporting tables from the SQLFlask application.
+
+This module provides /export/<table_name>.<fmt>, which streams a table of
+the currently selected database as CSV, NDJSON, Parquet or Arrow IPC.
+"""
+
+from flask import Blueprint, Response, request, stream_with_context
+from .utils import get_db, get_table_info
+from ..config import EXPORT_BATCH_SIZE
+from ..export import FORMATS, export_chunks
+
+export_bp = Blueprint('exports', __name__, url_prefix="/export")
+
+@export_bp.route("/<table_name>.<any(csv, ndjson, parquet, arrow):fmt>")
+def export_table(table_name, fmt):
+    db = get_db()
+    table_info = get_table_info(db, table_name)
+    if not table_info:
+        return f"Table '{table_name}' does not exist.", 404
+    if fmt in ("parquet", "arrow"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return f"Exporting to {fmt} requires pyarrow.", 501
+    batch_size = max(1, request.args.get("batch_size", EXPORT_BATCH_SIZE, type=int))
+    cursor = db.execute(f"SELECT * FROM {table_name}")
+    return Response(
+        stream_with_context(export_chunks(cursor, table_info, fmt, batch_size)),
+        mimetype=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table_name}.{fmt}"'},
+    )
@@ -0,0 +1,53 @@
+"""
+history.py
+
+Blueprint for the History view in the SQLFlask application.
+
+This module provides routes for listing the audit log of the currently
+selected database and for undoing and redoing individual operations
+(see sqlflask/changelog.py).
+"""
+
+from flask import Blueprint, render_template, g, session
+from .utils import get_db, invalidate_schema, execute_write
+from ..changelog import ChangelogError, operations, undo, redo
+import sqlite3
+import time
+
+history_bp = Blueprint('history', __name__, url_prefix="/history")
+
+def render_history(db):
+    return render_template(
+        "_history.html",
+        context="History",
+        current_database=g.current_database,
+        operations=[{**op, "when": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(op["at"]))} for op in operations(db)],
+    )
+
+def move(work):
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    try:
+        execute_write(work)
+    except ChangelogError as e:
+        return f"Error: {e}", 409
+    except sqlite3.OperationalError as e:
+        return f"Error: {e}", 400
+    # Undoing a column rename or drop changes the schema
+    invalidate_schema()
+    return render_history(db)
+
+@history_bp.route("/", methods=["GET"])
+def index():
+    g.context = "History"
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    return render_history(db)
+
+@history_bp.route("/undo/<int:op>", methods=["POST"])
+def undo_operation(op):
+    return move(undo(op))
+
+@history_bp.route("/redo/<int:op>", methods=["POST"])
+def redo_operation(op):
+    return move(redo(op))
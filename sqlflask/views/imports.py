@@ -0,0 +1,69 @@
+"""
+imports.py
+
+Blueprint for bulk-loading files into tables in the SQLFlask application.
+
+This module provides a form and an upload route that stream CSV or Parquet
+files into a table of the currently selected database via bulk_import.py.
+"""
+
+from flask import Blueprint, render_template, request
+from .utils import get_db, get_table_info, execute_write
+from ..bulk_import import FORMATS, detect_format, import_file
+from ..config import BULK_IMPORT_BATCH_SIZE
+import os
+import sqlite3
+import tempfile
+
+import_bp = Blueprint('imports', __name__, url_prefix="/import")
+
+@import_bp.route("/<table_name>", methods=["GET", "POST"])
+def bulk_import(table_name):
+    """
+    Render the import form for a table (GET) or load an uploaded file (POST).
+
+    Form fields:
+        file: the CSV or Parquet upload.
+        format: optional, overrides detection from the file extension.
+        batch_size: rows per executemany() batch.
+        rebuild_indexes: drop the table's indexes during the load.
+    """
+    db = get_db()
+    if not get_table_info(db, table_name):
+        return f"Table '{table_name}' does not exist.", 400
+
+    if request.method == "GET":
+        return render_template(
+            "_import.html", table_name=table_name, formats=FORMATS, batch_size=BULK_IMPORT_BATCH_SIZE
+        )
+
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return "A file is required.", 400
+    try:
+        fmt = request.form.get("format") or detect_format(upload.filename)
+    except ValueError as e:
+        return f"Error: {e}", 400
+    if fmt not in FORMATS:
+        return f"Error: Unsupported format '{fmt}', expected one of: {', '.join(FORMATS)}", 400
+    batch_size = max(1, request.form.get("batch_size", BULK_IMPORT_BATCH_SIZE, type=int))
+
+    # Polars needs a seekable file; spool the upload to disk instead of memory
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            upload.save(f)
+        stats = import_file(
+            db,
+            table_name,
+            path,
+            fmt,
+            batch_size=batch_size,
+            rebuild_indexes=request.form.get("rebuild_indexes") == "on",
+            write=execute_write,
+        )
+    except (ValueError, sqlite3.Error) as e:
+        return f"Error: {e}", 400
+    finally:
+        os.remove(path)
+    return render_template("_import_result.html", stats=stats)
@@ -0,0 +1,66 @@
+"""
+indexes.py
+
+Blueprint for the Indexes view in the SQLFlask application.
+
+This module provides routes for listing the indexes of the currently
+selected database together with the index advisor's workload, proposals
+and measured gains, and for creating and dropping indexes.
+"""
+
+from flask import Blueprint, render_template, request, g, session
+from .utils import get_db, get_tables, get_table_info, invalidate_schema, execute_write
+from ..index_advisor import advisor, existing_indexes
+from ..query import quote
+import sqlite3
+
+indexes_bp = Blueprint('indexes', __name__, url_prefix="/indexes")
+
+def render_indexes(db):
+    tables = get_tables(db)
+    return render_template(
+        "_indexes.html",
+        context="Indexes",
+        current_database=g.current_database,
+        indexes={table: existing_indexes(db, table) for table in tables},
+        workload=advisor.workload(g._db_path),
+        proposals=advisor.proposals(db, g._db_path),
+        gains=advisor.measured_gains(g._db_path),
+    )
+
+@indexes_bp.route("/", methods=["GET"])
+def index():
+    g.context = "Indexes"
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    return render_indexes(db)
+
+@indexes_bp.route("/create", methods=["POST"])
+def create():
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    table = request.form.get("table")
+    columns = [c.strip() for c in request.form.get("columns", "").split(",") if c.strip()]
+    if table not in get_tables(db):
+        return f"Table '{table}' does not exist.", 404
+    known = [col["name"] for col in get_table_info(db, table)]
+    if not columns or any(c not in known for c in columns):
+        return "Unknown column(s): " + ", ".join(c for c in columns if c not in known), 400
+    try:
+        advisor.create(db, g._db_path, {"table": table, "columns": columns, "name": f"ix_{table}_{'_'.join(columns)}"})
+    except sqlite3.OperationalError as e:
+        return f"Error: {e}", 400
+    invalidate_schema()
+    return render_indexes(db)
+
+@indexes_bp.route("/delete/<name>", methods=["DELETE"])
+def delete(name):
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    try:
+        execute_write((f"DROP INDEX {quote(name)}", ()))
+    except sqlite3.OperationalError as e:
+        return f"Error: {e}", 400
+    advisor.forget_index(g._db_path, name)
+    invalidate_schema()
+    return render_indexes(db)
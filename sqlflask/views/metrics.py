@@ -0,0 +1,30 @@
+"""
+metrics.py
+
+Blueprint for the /metrics endpoint in the SQLFlask application.
+
+This module exposes the per-statement SQL timing histograms collected by
+instrumentation.py, together with connection pool, schema cache and
+fragment cache and write coordinator counters, and replication lag and
+transfer counters, in the Prometheus text exposition format.
+"""
+
+from flask import Blueprint, Response, current_app
+from ..instrumentation import render_prometheus
+from ..pool import pool
+from ..schema_cache import schema_cache
+from ..fragment_cache import fragment_cache
+from ..writer import writer
+from .. import replication
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    if current_app.config.get("REPLICATION_ROLE") == "replica":
+        replication_stats = replication.replica_stats(current_app.config["REPLICATION_REPLICA_DIR"])
+    else:
+        replication_stats = replication.server.stats() if replication.server else None
+    body = render_prometheus(pool.stats(), schema_cache, fragment_stats=fragment_cache.stats(),
+                             writer_stats=writer.stats(), replication_stats=replication_stats)
+    return Response(body, mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,66 @@
+"""
+query.py
+
+Blueprint for the server-side query API in the SQLFlask application.
+
+This module provides /query/<table_name>, which filters, sorts and projects
+a table of the currently selected database according to the query string
+(see sqlflask/query.py for the syntax) and returns an HTMX table fragment
+or JSON, plus routes to list and create the index advisor's proposals.
+"""
+
+from flask import Blueprint, jsonify, render_template, request, g
+from .utils import get_db, get_tables, get_table_info, invalidate_schema
+from ..query import QueryError, parse_query, compile_query
+from ..index_advisor import advisor, timed
+import sqlite3
+
+query_bp = Blueprint('query', __name__, url_prefix="/query")
+
+def wants_json():
+    if request.args.get("format") == "json":
+        return True
+    best = request.accept_mimetypes.best_match(["text/html", "application/json"])
+    return best == "application/json" and request.accept_mimetypes[best] > request.accept_mimetypes["text/html"]
+
+@query_bp.route("/<table_name>", methods=["GET"])
+def query_table(table_name):
+    db = get_db()
+    if table_name not in get_tables(db):
+        return f"Table '{table_name}' does not exist.", 404
+    columns = [col["name"] for col in get_table_info(db, table_name)]
+    try:
+        query = parse_query(request.args, columns)
+    except QueryError as e:
+        return f"Error: {e}", 400
+    sql, params = compile_query(table_name, query)
+    rows, seconds = timed(db, sql, params)
+    advisor.record(g._db_path, table_name, query, seconds, db)
+
+    if wants_json():
+        return jsonify({"columns": query["select"], "rows": [list(row) for row in rows]})
+    return render_template("_query_table.html", table_name=table_name, columns=query["select"], rows=rows)
+
+@query_bp.route("/<table_name>/indexes", methods=["GET", "POST"])
+def indexes(table_name):
+    """
+    GET: list the advisor's index proposals for this table.
+    POST: create the index on the submitted `columns` (comma separated).
+    """
+    db = get_db()
+    if table_name not in get_tables(db):
+        return f"Table '{table_name}' does not exist.", 404
+    if request.method == "POST":
+        columns = [c.strip() for c in request.form.get("columns", "").split(",") if c.strip()]
+        known = [col["name"] for col in get_table_info(db, table_name)]
+        unknown = [c for c in columns if c not in known]
+        if not columns or unknown:
+            return f"Unknown column '{', '.join(unknown)}'", 400
+        proposal = {"table": table_name, "columns": columns, "name": f"ix_{table_name}_{'_'.join(columns)}"}
+        try:
+            name = advisor.create(db, g._db_path, proposal)
+        except sqlite3.OperationalError as e:
+            return f"Error: {e}", 400
+        invalidate_schema()
+        return jsonify({"created": name})
+    return jsonify({"suggestions": advisor.proposals(db, g._db_path, table_name)})
@@ -5,11 +5,15 @@ Blueprint for row-related routes and logic in the SQLFlask application.
 
 This module provides routes for listing, adding, editing, updating, and deleting rows
 within the currently selected table of the SQLite database. It also includes
-helper functions for retrieving row data.
+helper functions for retrieving row data. Edits are recorded in the audit
+log (changelog.py) so they can be undone.
 """
 
 from flask import Blueprint, render_template, request, g, session, redirect, url_for
-from .utils import get_db
+from .utils import get_db, get_tables, get_table_info, execute_write
+from ..query import QueryError, parse_query, compile_query
+from ..index_advisor import advisor, timed
+from ..changelog import tracked
 import sqlite3
 
 relationships_bp = Blueprint('relationships', __name__, url_prefix="/relationships")
@@ -23,13 +27,17 @@ def index():
     current_table = g.current_table
 
     # Check if the table exists
-    table_exists = db.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name=?;",
-        (current_table,)
-    ).fetchone()
-
-    if table_exists:
-        rows = db.execute(f"SELECT id, name FROM {current_table} ORDER BY id DESC").fetchall()
+    if current_table in get_tables(db):
+        # Filters, sort and limit from the query string; rows always need id and name
+        args = request.args.copy()
+        args.pop("select", None)
+        columns = [col["name"] for col in get_table_info(db, current_table)]
+        try:
+            query = parse_query(args, columns, default_select=["id", "name"], default_sort=["-id"], default_limit=None)
+        except QueryError as e:
+            return f"Error: {e}", 400
+        rows, seconds = timed(db, *compile_query(current_table, query))
+        advisor.record(g._db_path, current_table, query, seconds, db)
     else:
         rows = []
 
@@ -48,8 +56,8 @@ def add():
     g.current_table = session.get("current_table", "details")
     current_table = g.current_table
     name = request.form["name"]
-    db.execute(f"INSERT INTO {current_table} (name) VALUES (?)", (name,))
-    db.commit()
+    sql = f"INSERT INTO {current_table} (name) VALUES (?)"
+    execute_write(tracked(f"insert into {current_table}", current_table, sql, (name,)))
     item_list = db.execute(f"SELECT id, name FROM {current_table} ORDER BY id DESC").fetchall()
     return render_template("_rows.html", item_list=item_list, context="Relationships")
 
@@ -66,7 +74,9 @@ def edit_row(item_id):
     g.current_table = session.get("current_table", "details")
     current_table = g.current_table
     row = db.execute(f"SELECT id, name FROM {current_table} WHERE id = ?", (item_id,)).fetchone()
-    return render_template("_edit_form.html", item=row, context="Relationships")
+    if row is None:
+        return "Row not found", 404
+    return render_template("_edit_form.html", item=dict(row), context="Relationships")
 
 @relationships_bp.route('/update/<int:item_id>', methods=['PUT'])
 def update_row(item_id):
@@ -75,10 +85,11 @@ def update_row(item_id):
     g.current_table = session.get("current_table", "details")
     current_table = g.current_table
     name = request.form["name"]
-    db.execute(f"UPDATE {current_table} SET name = ? WHERE id = ?", (name, item_id))
-    db.commit()
-    item = db.execute(f"SELECT id, name FROM {current_table} WHERE id = ?", (item_id,)).fetchone()
-    return render_template("_row.html", item=item)
+    sql = f"UPDATE {current_table} SET name = ? WHERE id = ?"
+    execute_write(tracked(f"update {current_table} #{item_id}", current_table, sql, (name, item_id), "id = ?", (item_id,)))
+    # The edit form swaps the whole list (#details)
+    item_list = db.execute(f"SELECT id, name FROM {current_table} ORDER BY id DESC").fetchall()
+    return render_template("_rows.html", item_list=item_list, context="Relationships")
 
 @relationships_bp.route('/delete/<int:item_id>', methods=['DELETE'])
 def row_delete(item_id):
@@ -86,7 +97,7 @@ def row_delete(item_id):
     g.current_database = session.get("current_database", "none")
     g.current_table = session.get("current_table", "details")
     current_table = g.current_table
-    db.execute(f"DELETE FROM {current_table} WHERE id = ?", (item_id,))
-    db.commit()
+    sql = f"DELETE FROM {current_table} WHERE id = ?"
+    execute_write(tracked(f"delete {current_table} #{item_id}", current_table, sql, (item_id,), "id = ?", (item_id,)))
     item_list = db.execute(f"SELECT id, name FROM {current_table} ORDER BY id DESC").fetchall()
     return render_template("_rows.html", item_list=item_list, context="Relationships")
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""
+search.py
+
+Blueprint for full-text search in the SQLFlask application.
+
+This module provides /search, which returns ranked HTMX result fragments
+across all indexed tables of the currently selected database, and the
+route the Columns view uses to choose which columns of a table are
+indexed (see sqlflask/search.py).
+"""
+
+from flask import Blueprint, render_template, request, session, redirect, url_for
+from .utils import get_db, get_table_info, invalidate_schema, execute_write
+from ..search import search, enable, text_columns
+import sqlite3
+import time
+
+search_bp = Blueprint('search', __name__, url_prefix="/search")
+
+@search_bp.route("/", methods=["GET"])
+def index():
+    db = get_db()
+    text = request.args.get("q", "")
+    started = time.perf_counter()
+    hits = search(db, text)
+    return render_template(
+        "_search_results.html", q=text, hits=hits, milliseconds=(time.perf_counter() - started) * 1000
+    )
+
+@search_bp.route("/index", methods=["POST"])
+def update_index():
+    """Index the submitted `columns` of the current table; none removes its index."""
+    db = get_db()
+    table = session.get("current_table", "details")
+    table_info = get_table_info(db, table)
+    if not table_info:
+        return f"Table '{table}' does not exist.", 404
+    columns = request.form.getlist("columns")
+    unknown = [col for col in columns if col not in text_columns(table_info)]
+    if unknown:
+        return f"Error: Not a text column: {', '.join(unknown)}", 400
+    try:
+        execute_write(lambda conn: enable(conn, table, columns))
+    except sqlite3.OperationalError as e:
+        return f"Error: {e}", 400
+    invalidate_schema()
+    return redirect(url_for("columns.index"))
@@ -0,0 +1,84 @@
+"""
+summaries.py
+
+Blueprint for the Summaries view in the SQLFlask application.
+
+This module provides routes for declaring materialized aggregate summaries
+on the tables of the currently selected database, reading them, checking
+them for drift and rebuilding or dropping them (see sqlflask/summaries.py).
+"""
+
+from flask import Blueprint, render_template, request, g, session
+from .utils import get_db, get_tables, invalidate_schema, execute_write
+from ..summaries import SummaryError, declarations, parse_aggregates, declare, rebuild, drop, read, check
+import sqlite3
+
+summaries_bp = Blueprint('summaries', __name__, url_prefix="/summaries")
+
+def render_summaries(db, drift=None):
+    return render_template(
+        "_summaries.html",
+        context="Summaries",
+        current_database=g.current_database,
+        current_table=session.get("current_table", "details"),
+        tables=get_tables(db),
+        summaries=[{**d, "rows": read(db, d["name"])} for d in declarations(db)],
+        drift=drift or {},
+    )
+
+def run(work):
+    try:
+        execute_write(work)
+    except SummaryError as e:
+        return f"Error: {e}", 400
+    except sqlite3.OperationalError as e:
+        return f"Error: {e}", 400
+    invalidate_schema()
+    return None
+
+@summaries_bp.route("/", methods=["GET"])
+def index():
+    g.context = "Summaries"
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    return render_summaries(db)
+
+@summaries_bp.route("/declare", methods=["POST"])
+def create():
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    name = request.form.get("name", "").strip()
+    table = request.form.get("table", "")
+    group_by = request.form.get("group_by", "").strip() or None
+    try:
+        aggregates = parse_aggregates(request.form.get("aggregates", "count"))
+    except SummaryError as e:
+        return f"Error: {e}", 400
+    if table not in get_tables(db):
+        return f"Table '{table}' does not exist.", 404
+    error = run(lambda conn: declare(conn, name, table, group_by, aggregates))
+    return error or render_summaries(db)
+
+@summaries_bp.route("/rebuild/<name>", methods=["POST"])
+def rebuild_summary(name):
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    error = run(lambda conn: rebuild(conn, name))
+    return error or render_summaries(db)
+
+@summaries_bp.route("/check/<name>", methods=["GET"])
+def check_summary(name):
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    try:
+        drifted = check(db, name)
+    except SummaryError as e:
+        return f"Error: {e}", 404
+    return render_summaries(db, drift={name: drifted})
+
+@summaries_bp.route("/delete/<name>", methods=["DELETE"])
+def delete(name):
+    db = get_db()
+    g.current_database = session.get("current_database", "none")
+    error = run(lambda conn: drop(conn, name))
+    return error or render_summaries(db)
@@ -5,22 +5,37 @@ Blueprint for table-related routes and logic in the SQLFlask application.
 
 This module provides routes for listing, creating, renaming, and deleting tables
 within the currently selected SQLite database. It also includes helper functions
-for retrieving table metadata.
+for retrieving table metadata, including the row counts stored by the
+profiling job (profiling.py) or, exactly, from declared summaries
+(summaries.py). Renaming or deleting a table carries its full-text search
+index (search.py) and summaries along.
 """
 
 from flask import Blueprint, render_template, request, g, session, redirect, url_for
-from .utils import get_db
+from .utils import get_db, get_tables, invalidate_schema, current_db_path, current_db_file, schema_version, execute_write
+from ..fragment_cache import cached_partial, database_token
+from ..profiling import table_stats, stats_version
+from ..search import indexed_columns, enable, disable
+from ..summaries import row_counts, rename_table as rename_summaries, drop_table as drop_summaries
 import sqlite3
 
 tables_bp = Blueprint('tables', __name__, url_prefix="/tables")
 
 def get_all_tables(db):
-    tables = db.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
-    ).fetchall()
-    return [{"id": idx, "name": table["name"]} for idx, table in enumerate(tables)]
+    stats = table_stats(db)
+    # Exact counts from declared summaries win over the last profiling run
+    for table, count in row_counts(db).items():
+        stats[table] = {**stats.get(table, {}), "row_count": count}
+    return [{"id": idx, "name": name, "stats": stats.get(name)} for idx, name in enumerate(get_tables(db))]
+
+def describe_tables():
+    # The table list only changes with the schema of the current database
+    db_path = current_db_path()
+    key = (db_path, session.get("current_database", "none"), session.get("current_table", "details"))
+    return key, database_token(current_db_file()), lambda: (schema_version(), stats_version(get_db()), row_counts(get_db()))
 
 @tables_bp.route("/", methods=["GET", "POST"])
+@cached_partial(describe_tables)
 def index():
     g.context = "Tables"
     db = get_db()
@@ -37,8 +52,8 @@ def index():
 
     if request.method == "POST":
         table_name = request.form["name"]
-        db.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (id INTEGER PRIMARY KEY, name TEXT)")
-        db.commit()
+        execute_write((f"CREATE TABLE IF NOT EXISTS {table_name} (id INTEGER PRIMARY KEY, name TEXT)", ()))
+        invalidate_schema()
         g.current_table = table_name
         session["current_table"] = table_name
 
@@ -72,8 +87,8 @@ def add():
     if not table_name:
         return "Table name is required.", 400
     try:
-        db.execute(f'CREATE TABLE IF NOT EXISTS {table_name} (id INTEGER PRIMARY KEY, name TEXT)')
-        db.commit()
+        execute_write((f'CREATE TABLE IF NOT EXISTS {table_name} (id INTEGER PRIMARY KEY, name TEXT)', ()))
+        invalidate_schema()
         g.current_table = table_name
         session["current_table"] = table_name
     except sqlite3.OperationalError as e:
@@ -112,9 +127,18 @@ def update_table(table_id):
         return "Table not found", 404
     old_table_name = tables[table_id]["name"]
     new_table_name = request.form["name"]
+    columns = indexed_columns(db, old_table_name)
+
+    def work(conn):
+        # The search index's content table is fixed at creation, so it is rebuilt under the new name
+        disable(conn, old_table_name)
+        conn.execute(f"ALTER TABLE {old_table_name} RENAME TO {new_table_name}")
+        enable(conn, new_table_name, columns)
+        rename_summaries(conn, old_table_name, new_table_name)
+
     try:
-        db.execute(f"ALTER TABLE {old_table_name} RENAME TO {new_table_name}")
-        db.commit()
+        execute_write(work)
+        invalidate_schema()
     except sqlite3.OperationalError as e:
         return f"Error: {e}", 400
     tables = get_all_tables(db)
@@ -128,8 +152,14 @@ def table_delete(table_id):
     if table_id < 0 or table_id >= len(tables):
         return "Table not found", 404
     table_name = tables[table_id]["name"]
-    db.execute(f"DROP TABLE IF EXISTS {table_name}")
-    db.commit()
+
+    def work(conn):
+        disable(conn, table_name)
+        drop_summaries(conn, table_name)
+        conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+
+    execute_write(work)
+    invalidate_schema()
     tables = get_all_tables(db)
     item_list = tables
     return render_template("_rows.html", item_list=item_list, context="Tables")
\ No newline at end of file
@@ -4,37 +4,90 @@ utils.py
 Utility functions for the SQLFlask application.
 
 This module provides shared helper functions, such as get_db(),
-which manages the SQLite database connection for use throughout
-the application and its blueprints.
+which checks out a pooled SQLite connection for use throughout
+the application and its blueprints, and release_db(), which returns it.
+get_tables() and get_table_info() serve schema metadata from the
+in-process schema cache.
+current_db_path() and schema_version() let cached views validate
+fragments without rendering them. execute_write() hands a write to the
+database's group-commit writer. On a replica node, get_db() reads GET
+requests from the replica copy (replication.py); current_db_file() is the
+file a request actually reads.
 """
 
-from flask import g, session, current_app
+from flask import g, session, current_app, request
+from ..pool import pool
+from ..replication import read_path
+from ..schema_cache import schema_cache
+from ..writer import writer
 import sqlite3
 import os
 
+_ensured_dirs = set()
+
+def current_db_path():
+    """Path of the session's current database file, without opening it."""
+    return os.path.join(current_app.config["DATA_DIR"], session.get("current_database", "db.sqlite"))
+
+def current_db_file():
+    """File read by this request: the replica copy for GETs on a replica node, else current_db_path()."""
+    db_path = current_db_path()
+    config = current_app.config
+    if config.get("REPLICATION_ROLE") == "replica" and request.method in ("GET", "HEAD"):
+        return read_path(db_path, config["REPLICATION_REPLICA_DIR"], config["REPLICATION_MAX_LAG"])
+    return db_path
+
 def get_db():
     db = getattr(g, "_database", None)
-    db_name = session.get("current_database", "db.sqlite")
-    db_path = os.path.join(current_app.config["DATA_DIR"], db_name)
+    data_dir = current_app.config["DATA_DIR"]
+    db_path = current_db_path()
+    db_file = current_db_file()
     try:
-        # Ensure the data directory exists
-        data_dir = current_app.config["DATA_DIR"]
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-        # Try to connect to the database
-        if db is None or getattr(g, "_db_path", None) != db_path:
+        # Reuse this request's connection unless the current database changed
+        if db is None or getattr(g, "_db_file", None) != db_file:
             if db is not None:
-                db.close()
-            if not os.path.exists(db_path):
-                # Optionally, create the database file if it doesn't exist
-                open(db_path, "a").close()
-            db = sqlite3.connect(db_path)
-            db.row_factory = sqlite3.Row
+                release_db()
+            # Ensure the data directory exists (once per process)
+            if data_dir not in _ensured_dirs:
+                os.makedirs(data_dir, exist_ok=True)
+                _ensured_dirs.add(data_dir)
+            # Check out a pooled connection; sqlite3 creates the file if needed
+            db = pool.acquire(db_file)
             g._database = db
+            # Caches and the index advisor key on the database, not on the copy read
             g._db_path = db_path
+            g._db_file = db_file
         return db
     except sqlite3.OperationalError as e:
         # Handle database connection errors gracefully
         raise RuntimeError(f"Unable to open database file '{db_path}': {e}")
     except Exception as e:
-        raise RuntimeError(f"Unexpected error opening database file '{db_path}': {e}")
\ No newline at end of file
+        raise RuntimeError(f"Unexpected error opening database file '{db_path}': {e}")
+
+def release_db():
+    """Return the request's connection to the pool."""
+    db = g.pop("_database", None)
+    g.pop("_db_path", None)
+    db_file = g.pop("_db_file", None)
+    if db is not None:
+        pool.release(db_file, db)
+
+def get_tables(db):
+    """Cached list of table names in the current database."""
+    return schema_cache.tables(db, g._db_path)
+
+def get_table_info(db, table):
+    """Cached PRAGMA table_info rows for a table in the current database."""
+    return schema_cache.table_info(db, g._db_path, table)
+
+def schema_version():
+    """PRAGMA schema_version of the current database; bumped by every DDL statement."""
+    return get_db().execute("PRAGMA schema_version").fetchone()[0]
+
+def invalidate_schema():
+    """Drop cached metadata for the current database after running DDL."""
+    schema_cache.invalidate(g.get("_db_path"))
+
+def execute_write(work):
+    """Run a write on the current database through the group-commit writer and return its result."""
+    return writer.execute(current_db_path(), work)
@@ -0,0 +1,204 @@
+"""
+writer.py
+
+Single-writer queue with group commit for the SQLFlask application.
+
+Instead of every request opening its own write transaction (one fsync
+each, and lock contention between threads), mutating routes hand their
+statements to the WriteCoordinator. Each database file gets one writer
+thread with its own connection. The writer takes whatever writes are
+queued, waits up to WRITER_MAX_LATENCY for more (at most WRITER_MAX_BATCH),
+and runs them in a single BEGIN IMMEDIATE ... COMMIT. Every write runs in
+its own SAVEPOINT, so a failing write is rolled back and reported to its
+caller without affecting the others in the batch.
+
+A write is either an (sql, params) pair, a list of such pairs, or a
+callable taking the connection. Callers block until the batch holding
+their write is committed and get back its result.
+
+Across gunicorn workers there is still one writer per process; SQLite's
+busy_timeout serializes those, but each of them now commits many writes
+per fsync.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from .config import WRITER_MAX_BATCH, WRITER_MAX_LATENCY, WRITER_TIMEOUT, WRITER_IDLE_TIMEOUT
+from .pragmas import connect
+
+
+def run_write(conn, work):
+    """Apply one write on conn and return its result."""
+    if callable(work):
+        return work(conn)
+    statements = work if isinstance(work, list) else [work]
+    result = None
+    for sql, params in statements:
+        cursor = conn.execute(sql, params)
+        result = {"rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
+    return result
+
+
+class _Writer(threading.Thread):
+    def __init__(self, coordinator, db_path):
+        super().__init__(name=f"writer-{os.path.basename(db_path)}", daemon=True)
+        self.coordinator = coordinator
+        self.db_path = db_path
+        self.queue = queue.Queue()
+        self.stats = {"writes": 0, "batches": 0, "errors": 0, "wait_seconds": 0.0, "commit_seconds": 0.0, "max_batch": 0}
+        self.stopped = False
+
+    def run(self):
+        conn = None
+        try:
+            while True:
+                try:
+                    first = self.queue.get(timeout=self.coordinator.idle_timeout)
+                except queue.Empty:
+                    if self.coordinator._retire(self):
+                        return
+                    continue
+                if first is None:
+                    return
+                batch = [first]
+                deadline = time.monotonic() + self.coordinator.max_latency
+                while len(batch) < self.coordinator.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self.stopped = True
+                        break
+                    batch.append(item)
+                if conn is None:
+                    conn = self.coordinator.connect(self.db_path)
+                    conn.isolation_level = None  # transactions are managed explicitly below
+                self._commit(conn, batch)
+                if self.stopped:
+                    return
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _commit(self, conn, batch):
+        results = []
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for work, future, _ in batch:
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((future, run_write(conn, work), None))
+                    conn.execute("RELEASE write")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(future, None, e) for _, future, _ in batch]
+        finished = time.perf_counter()
+        with self.coordinator._lock:
+            self.stats["batches"] += 1
+            self.stats["writes"] += len(batch)
+            self.stats["errors"] += sum(1 for _, _, error in results if error is not None)
+            self.stats["commit_seconds"] += finished - started
+            self.stats["wait_seconds"] += sum(finished - submitted for _, _, submitted in batch)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class WriteCoordinator:
+    def __init__(
+        self,
+        connect=connect,
+        max_batch=WRITER_MAX_BATCH,
+        max_latency=WRITER_MAX_LATENCY,
+        timeout=WRITER_TIMEOUT,
+        idle_timeout=WRITER_IDLE_TIMEOUT,
+    ):
+        self.connect = connect
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._writers = {}  # db_path -> _Writer
+        self._retired = {}  # db_path -> stats of writers that have exited
+
+    def submit(self, db_path, work):
+        """Queue a write for db_path and return a Future for its result."""
+        future = Future()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Writer threads do not survive a fork
+                self._pid, self._writers = os.getpid(), {}
+            writer = self._writers.get(db_path)
+            if writer is None:
+                writer = self._writers[db_path] = _Writer(self, db_path)
+                writer.start()
+            writer.queue.put((work, future, time.perf_counter()))
+        return future
+
+    def execute(self, db_path, work, timeout=None):
+        """Run a write through the group commit and wait for its result."""
+        return self.submit(db_path, work).result(self.timeout if timeout is None else timeout)
+
+    def _retire(self, writer):
+        # An idle writer exits unless a write slipped in after its timeout
+        with self._lock:
+            if not writer.queue.empty():
+                return False
+            if self._writers.get(writer.db_path) is writer:
+                del self._writers[writer.db_path]
+            self._merge_retired(writer)
+            return True
+
+    def _merge_retired(self, writer):
+        totals = self._retired.setdefault(writer.db_path, dict.fromkeys(writer.stats, 0))
+        for name, value in writer.stats.items():
+            totals[name] = max(totals[name], value) if name == "max_batch" else totals[name] + value
+
+    def close(self, db_path=None):
+        """Stop writer threads (after draining their queues) and close their connections.
+
+        Call this before a database file is renamed or removed.
+        """
+        with self._lock:
+            paths = [db_path] if db_path is not None else list(self._writers)
+            writers = [self._writers.pop(path) for path in paths if path in self._writers]
+        for writer in writers:
+            writer.queue.put(None)
+            writer.join()
+            with self._lock:
+                self._merge_retired(writer)
+
+    def stats(self):
+        """{database file name: counters} for active and retired writers."""
+        with self._lock:
+            result = {}
+            for path, totals in self._retired.items():
+                result[path] = dict(totals, queued=0)
+            for path, writer in self._writers.items():
+                totals = result.setdefault(path, dict.fromkeys(writer.stats, 0) | {"queued": 0})
+                for name, value in writer.stats.items():
+                    totals[name] = max(totals[name], value) if name == "max_batch" else totals[name] + value
+                totals["queued"] = writer.queue.qsize()
+            return {os.path.basename(path): totals for path, totals in result.items()}
+
+
+writer = WriteCoordinator()
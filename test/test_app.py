@@ -56,7 +56,7 @@ def test_delete_database(client):
     # Assuming it's the last in the list
     from sqlflask.app import app
     with app.app_context():
-        from views.databases import get_all_databases
+        from sqlflask.views.databases import get_all_databases
         dbs = get_all_databases()
         db_id = next((d["id"] for d in dbs if d["name"] == "delete_me.sqlite"), None)
     response = client.delete(f"/databases/delete/{db_id}")
@@ -129,3 +129,746 @@ def test_rename_column(client):
 #    response = client.post("/relationships/add", data={"name": "pytest_row"})
 #    assert response.status_code == 200
 #    assert b"pytest_row" in response.data
+
+def _seed_table(db_name, table_name, rows):
+    import sqlite3
+    db_path = os.path.join("data", db_name)
+    with sqlite3.connect(db_path) as db:
+        db.execute(f"DROP TABLE IF EXISTS {table_name}")
+        db.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, name TEXT)")
+        db.executemany(f"INSERT INTO {table_name} (name) VALUES (?)", [(f"row{i}",) for i in range(rows)])
+    return db_path
+
+def _fresh_database(db_name):
+    # Drops what earlier runs left behind, including the _sqlflask_* tables and triggers
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(os.path.join("data", db_name + suffix)):
+            os.remove(os.path.join("data", db_name + suffix))
+
+def test_data_list_keyset_pages(client):
+    _seed_table("db.sqlite", "pytest_pages", 250)
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    response = client.get("/data-list/pytest_pages?limit=100")
+    assert response.status_code == 200
+    assert b"row99" in response.data and b"row100" not in response.data
+    assert b"after=100" in response.data
+    # HTMX "load more" returns only the next slice of rows
+    response = client.get("/data-list/pytest_pages?after=200&limit=100", headers={"HX-Request": "true"})
+    assert b"<html" not in response.data
+    assert b"row200" in response.data and b"row249" in response.data
+    assert b"Load more" not in response.data
+
+def test_data_list_streamed(client):
+    _seed_table("db.sqlite", "pytest_pages", 250)
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    response = client.get("/data-list/pytest_pages?stream=1")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert b"row0<" in response.data and b"row249<" in response.data
+
+def test_pool_reuses_connections(tmp_path):
+    from sqlflask.pool import ConnectionPool, PoolTimeout
+    pool = ConnectionPool(max_per_db=1, max_open=2, wait_timeout=0.05)
+    path = str(tmp_path / "pooled.sqlite")
+    conn = pool.acquire(path)
+    # The single slot for this file is taken, so a second checkout times out
+    with pytest.raises(PoolTimeout):
+        pool.acquire(path)
+    pool.release(path, conn)
+    assert pool.acquire(path) is conn
+    stats = pool.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["timeouts"] == 1
+    pool.release(path, conn)
+    # dispose() closes idle handles so renamed/deleted files are not reused
+    pool.dispose(path)
+    assert pool.stats()["open"] == 0
+    # A file replaced by another process is detected on the very next checkout
+    conn = pool.acquire(path)
+    pool.release(path, conn)
+    os.rename(path, path + ".old")
+    assert pool.acquire(path) is not conn
+    assert pool.stats()["unhealthy"] == 1
+
+def test_new_database_uses_production_profile(client):
+    import sqlite3
+    response = client.post("/databases/add", data={"name": "pytest_wal"})
+    assert response.status_code == 200
+    with sqlite3.connect(os.path.join("data", "pytest_wal.sqlite")) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_schema_cache_follows_schema_version(client):
+    import sqlite3
+    from sqlflask.schema_cache import schema_cache
+    db_path = _seed_table("db.sqlite", "pytest_schema", 1)
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+        sess["current_table"] = "pytest_schema"
+    client.get("/columns/")
+    hits = schema_cache.hits
+    response = client.get("/columns/")
+    assert schema_cache.hits > hits
+    assert b"extra" not in response.data
+    # DDL from another connection bumps schema_version and invalidates the entry
+    with sqlite3.connect(db_path) as db:
+        db.execute("ALTER TABLE pytest_schema ADD COLUMN extra TEXT")
+    response = client.get("/columns/")
+    assert b"extra" in response.data
+    # A database deleted and recreated under its name can start at the same schema_version
+    from sqlflask.app import app
+    from sqlflask.views.databases import get_all_databases
+    with client.session_transaction() as sess:
+        sess["current_database"] = "pytest_recreated.sqlite"
+    for table in ("pytest_first", "pytest_second"):
+        client.post("/databases/add", data={"name": "pytest_recreated"})
+        with sqlite3.connect(os.path.join("data", "pytest_recreated.sqlite")) as db:
+            db.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY)")
+        db.close()
+        assert table.encode() in client.get("/tables/").data
+        with app.app_context():
+            db_id = next(d["id"] for d in get_all_databases() if d["name"] == "pytest_recreated.sqlite")
+        assert client.delete(f"/databases/delete/{db_id}").status_code == 200
+    # Names that are not tables are never cached
+    assert client.get("/data-list/pytest_no_such_table").status_code == 404
+    assert not any("pytest_no_such_table" in entry["columns"] for _, entry in schema_cache._entries.values())
+
+def test_bulk_import_csv(client):
+    import io, sqlite3
+    db_path = _seed_table("db.sqlite", "pytest_import", 0)
+    with sqlite3.connect(db_path) as db:
+        db.execute("CREATE INDEX ix_pytest_import_name ON pytest_import (name)")
+        db.execute("CREATE UNIQUE INDEX ux_pytest_import_name ON pytest_import (name)")
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    csv = "Name,unknown\n" + "".join(f"n{i},x\n" for i in range(1000))
+    response = client.post(
+        "/import/pytest_import",
+        data={"file": (io.BytesIO(csv.encode()), "rows.csv"), "batch_size": "128", "rebuild_indexes": "on"},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    assert b"Imported 1000 rows" in response.data
+    assert b"unknown" in response.data
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT count(*) FROM pytest_import").fetchone()[0] == 1000
+        assert db.execute("SELECT count(*) FROM sqlite_master WHERE name='ix_pytest_import_name'").fetchone()[0] == 1
+    # Only the non-unique index was dropped and rebuilt
+    assert b"Rebuilt 1 index(es)" in response.data
+    response = client.post(
+        "/import/pytest_import",
+        data={"file": (io.BytesIO(csv.encode()), "rows.csv"), "format": "../csv"},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson", "parquet", "arrow"])
+def test_export_streams_table(client, fmt):
+    import io
+    import polars as pl
+    _seed_table("db.sqlite", "pytest_export", 2500)
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    response = client.get(f"/export/pytest_export.{fmt}?batch_size=1000")
+    assert response.status_code == 200
+    assert response.is_streamed
+    data = io.BytesIO(response.data)
+    frame = {
+        "csv": pl.read_csv,
+        "ndjson": pl.read_ndjson,
+        "parquet": pl.read_parquet,
+        "arrow": pl.read_ipc,
+    }[fmt](data)
+    assert frame.columns == ["id", "name"]
+    assert frame.height == 2500
+    assert frame["name"][2499] == "row2499"
+
+def test_parquet_export_handles_mixed_storage(client):
+    import io, sqlite3
+    import polars as pl
+    db_path = _seed_table("db.sqlite", "pytest_mixed", 0)
+    with sqlite3.connect(db_path) as db:
+        db.execute("ALTER TABLE pytest_mixed ADD COLUMN qty INTEGER")
+        db.execute("ALTER TABLE pytest_mixed ADD COLUMN amount INTEGER")
+        db.execute("ALTER TABLE pytest_mixed ADD COLUMN price DECIMAL(8, 2)")
+        db.execute("ALTER TABLE pytest_mixed ADD COLUMN due DATE")
+        db.execute("ALTER TABLE pytest_mixed ADD COLUMN raw")
+        db.executemany("INSERT INTO pytest_mixed (name, qty, amount, price, due, raw) VALUES (?, ?, ?, ?, ?, ?)",
+                       [("a", 1, 1, 5, "2024-01-31", b"\x00"), ("b", "n/a", 2.5, None, None, b"\x01"),
+                        ("c", None, 3, 7, None, None)])
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    frame = pl.read_parquet(io.BytesIO(client.get("/export/pytest_mixed.parquet").data))
+    assert frame["qty"].to_list() == ["1", "n/a", None]
+    assert frame["amount"].to_list() == [1.0, 2.5, 3.0]
+    assert frame["price"].to_list() == [5, None, 7] and frame["price"].dtype == pl.Int64
+    assert frame["due"].to_list() == ["2024-01-31", None, None] and frame["raw"].dtype == pl.Binary
+    # Types come from the first batch; a NUMERIC column that may hold fractions later is a float
+    frame = pl.read_parquet(io.BytesIO(client.get("/export/pytest_mixed.parquet?batch_size=2").data))
+    assert frame["price"].dtype == pl.Float64 and frame["qty"].to_list() == ["1", "n/a", None]
+
+def test_incremental_sync_applies_only_the_diff(tmp_path):
+    import sqlite3
+    import polars as pl
+    from sqlflask.reporting.sync import read_table, sync_frame
+    db = sqlite3.connect(tmp_path / "sync.sqlite")
+    first = sync_frame(db, "report", pl.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"]}))
+    assert first["mode"] == "created" and first["inserted"] == 3
+    # Excel hands integer keys back as floats; only row 2 changed, 3 is gone, 4 is new
+    sheet = pl.DataFrame({"id": [1.0, 2.0, 4.0], "name": ["a", "B", "d"]})
+    stats = sync_frame(db, "report", sheet)
+    assert (stats["mode"], stats["inserted"], stats["updated"], stats["deleted"]) == ("incremental", 1, 1, 1)
+    assert read_table(db, "report").sort("id").rows() == [(1, "a"), (2, "B"), (4, "d")]
+    assert sync_frame(db, "report", sheet)["updated"] == 0
+
+def test_snapshot_store_dedups_and_prunes(tmp_path):
+    from datetime import datetime, timedelta
+    import polars as pl
+    from sqlflask.reporting.snapshots import SnapshotStore
+    store = SnapshotStore(tmp_path, keep_last=1, max_age_days=1)
+    a = pl.DataFrame({"id": [1, 2], "name": ["a", "b"]})
+    b = pl.DataFrame({"id": [1, 2], "name": ["a", "B"]})
+    old = datetime.now() - timedelta(days=3)
+    first, stored = store.save(a, created=old)
+    assert stored
+    assert store.save(a)[1] is False  # unchanged data: no new snapshot
+    store.save(b, created=old + timedelta(seconds=1))
+    reverted, _ = store.save(a)
+    assert reverted["sha256"] == first["sha256"]
+    assert len(list((tmp_path / "objects").glob("*.parquet"))) == 2
+    assert store.load(reverted["id"]).equals(a)
+    result = store.prune()
+    assert result["removed"] == 2 and result["kept"] == 1
+    assert len(list((tmp_path / "objects").glob("*.parquet"))) == 1
+
+def test_query_api_filters_sorts_and_projects(client):
+    _seed_table("db.sqlite", "pytest_query", 50)
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    response = client.get("/query/pytest_query?select=name&id__ge=10&id__lt=13&sort=-id&format=json")
+    assert response.status_code == 200
+    assert response.get_json() == {"columns": ["name"], "rows": [["row11"], ["row10"], ["row9"]]}
+    response = client.get("/query/pytest_query?name__in=row1,row2", headers={"HX-Request": "true"})
+    assert b"row1<" in response.data and b"row2<" in response.data and b"row3<" not in response.data
+    # Identifiers are validated against the schema
+    assert client.get("/query/pytest_query?select=name;DROP TABLE x").status_code == 400
+    assert client.get("/query/pytest_query?nope=1").status_code == 400
+
+def test_analytics_groups_pivots_and_caches(client):
+    import io, sqlite3
+    import polars as pl
+    from sqlflask.analytics import cache
+    db_path = _seed_table("db.sqlite", "pytest_sales", 0)
+    with sqlite3.connect(db_path) as db:
+        db.execute("ALTER TABLE pytest_sales ADD COLUMN region TEXT")
+        db.execute("ALTER TABLE pytest_sales ADD COLUMN amount REAL")
+        db.executemany("INSERT INTO pytest_sales (name, region, amount) VALUES (?, ?, ?)",
+                       [(f"y{i % 2}", "EU" if i % 3 else "US", i) for i in range(30)])
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    response = client.get("/analytics/pytest_sales?group=region&agg=count,sum:amount&amount__ge=10&format=json")
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "columns": ["region", "count", "sum_amount"],
+        "rows": [["EU", 14, 273.0], ["US", 6, 117.0]],
+    }
+    hits = cache.hits
+    client.get("/analytics/pytest_sales?group=region&agg=count,sum:amount&amount__ge=10&format=json")
+    assert cache.hits == hits + 1
+    # A write invalidates the cached frame
+    with sqlite3.connect(db_path) as db:
+        db.execute("INSERT INTO pytest_sales (name, region, amount) VALUES ('y0', 'US', 100)")
+    response = client.get("/analytics/pytest_sales?group=region&agg=count,sum:amount&amount__ge=10&format=json")
+    assert response.get_json()["rows"][1] == ["US", 7, 217.0]
+    frame = pl.read_ipc(io.BytesIO(client.get("/analytics/pytest_sales?group=region&pivot=name&format=arrow").data))
+    assert frame.columns == ["region", "y0", "y1"]
+    assert frame["y0"].to_list() == [10, 6]
+    response = client.get("/analytics/pytest_sales?group=region", headers={"HX-Request": "true"})
+    assert b"<td>EU</td>" in response.data
+    assert client.get("/analytics/pytest_sales?agg=sum:nope").status_code == 400
+    assert client.get("/analytics/pytest_sales?agg=median:amount").status_code == 400
+
+def test_query_api_suggests_indexes(client):
+    from sqlflask.index_advisor import advisor
+    _seed_table("db.sqlite", "pytest_query", 5)
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    for _ in range(advisor.min_hits):
+        client.get("/query/pytest_query?name=row1&format=json")
+    suggestions = client.get("/query/pytest_query/indexes").get_json()["suggestions"]
+    assert [s["columns"][0] for s in suggestions] == ["name"]
+    assert suggestions[0]["est_rows_after"] < suggestions[0]["est_rows_before"]
+    assert client.post("/query/pytest_query/indexes", data={"columns": "name"}).status_code == 200
+    assert client.get("/query/pytest_query/indexes").get_json()["suggestions"] == []
+    client.get("/query/pytest_query?name=row1&format=json")
+    response = client.get("/indexes/")
+    assert response.status_code == 200
+    assert b"ix_pytest_query_name" in response.data
+    # Dropping the index makes the advisor propose it again
+    assert client.delete("/indexes/delete/ix_pytest_query_name").status_code == 200
+    suggestions = client.get("/query/pytest_query/indexes").get_json()["suggestions"]
+    assert [s["columns"][0] for s in suggestions] == ["name"]
+
+
+def test_metrics_and_slow_query_log(client, caplog):
+    from sqlflask.instrumentation import metrics
+    _seed_table("db.sqlite", "pytest_metrics", 3)
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    metrics.slow_seconds = 0
+    try:
+        with caplog.at_level("WARNING", logger="sqlflask.slow_query"):
+            client.get("/query/pytest_metrics?name=row1&format=json")
+    finally:
+        metrics.slow_seconds = 0.1
+    assert any("SCAN pytest_metrics" in r.getMessage() for r in caplog.records)
+    body = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE sqlflask_sql_duration_seconds histogram" in body
+    assert 'route="query.query_table",db="db.sqlite"' in body
+    assert "sqlflask_pool_hits_total" in body
+
+def test_htmx_partials_are_cached_with_etags(client):
+    import sqlite3
+    db_path = _seed_table("db.sqlite", "pytest_cached", 1)
+    with sqlite3.connect(db_path) as db:
+        db.execute("DROP TABLE IF EXISTS pytest_cached_new")
+    with client.session_transaction() as sess:
+        sess["current_database"] = "db.sqlite"
+    headers = {"HX-Request": "true"}
+    first = client.get("/tables/", headers=headers)
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = client.get("/tables/", headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    # A data-only write keeps the fragment valid; a schema change does not
+    with sqlite3.connect(db_path) as db:
+        db.execute("INSERT INTO pytest_cached (name) VALUES ('x')")
+    assert client.get("/tables/", headers={**headers, "If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert client.post("/tables/add", data={"name": "pytest_cached_new"}).status_code == 200
+    changed = client.get("/tables/", headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200 and b"pytest_cached_new" in changed.data
+
+def _asgi_get(asgi_app, path):
+    import asyncio
+    sent, requested, finished = [], [], asyncio.Event()
+
+    async def receive():
+        if requested:
+            await finished.wait()
+            return {"type": "http.disconnect"}
+        requested.append(True)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            finished.set()
+
+    scope = {"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": path,
+             "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+             "client": ("127.0.0.1", 1234), "server": ("testserver", 80)}
+    asyncio.run(asgi_app(scope, receive, send))
+    status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+    return status, b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+
+def test_asgi_streams_exports_and_mounts_flask():
+    from sqlflask.asgi import app as asgi_app
+    _seed_table("db.sqlite", "pytest_asgi", 1200)
+    status, body = _asgi_get(asgi_app, "/export/pytest_asgi.csv")
+    assert status == 200
+    assert body.decode().splitlines()[0] == "id,name" and len(body.decode().splitlines()) == 1201
+    assert _asgi_get(asgi_app, "/export/pytest_missing.csv")[0] == 404
+    status, body = _asgi_get(asgi_app, "/tables/")
+    assert status == 200 and b"pytest_asgi" in body
+
+def test_asgi_runs_flask_requests_in_parallel():
+    import asyncio
+    import time
+    from sqlflask.asgi import ThreadedWSGI
+
+    def slow_app(environ, start_response):
+        time.sleep(0.3)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [environ["PATH_INFO"].encode()]
+
+    wsgi = ThreadedWSGI(slow_app, threads=4)
+
+    async def both():
+        return await asyncio.gather(*(asyncio.to_thread(_asgi_get, wsgi, f"/slow{i}") for i in range(2)))
+
+    started = time.perf_counter()
+    results = asyncio.run(both())
+    assert time.perf_counter() - started < 0.55
+    assert sorted(results) == [(200, b"/slow0"), (200, b"/slow1")]
+    wsgi.shutdown()
+
+    # The body reaches the app as it arrives instead of being read up front
+    messages = [{"type": "http.request", "body": part, "more_body": more}
+                for part, more in ((b"abcd", True), (b"", True), (b"ef", False))]
+    unread = []
+
+    def upload_app(environ, start_response):
+        unread.append(len(messages))
+        chunks = iter(lambda: environ["wsgi.input"].read(3), b"")
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"|".join(chunks)]
+
+    async def upload():
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/upload", "headers": []}
+        await ThreadedWSGI(upload_app, threads=1)(scope, receive, send)
+        return b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+
+    assert asyncio.run(upload()) == b"abc|def" and unread == [3]
+
+def test_rename_database_keeps_wal_data(client):
+    import sqlite3
+    from sqlflask.app import app
+    from sqlflask.views.databases import get_all_databases
+    for name in os.listdir("data"):
+        if name.startswith(("pytest_ren", "pytest_moved")):
+            os.remove(os.path.join("data", name))
+    client.post("/databases/add", data={"name": "pytest_ren"})
+    holder = sqlite3.connect(os.path.join("data", "pytest_ren.sqlite"))
+    holder.execute("CREATE TABLE t (x)")
+    holder.execute("INSERT INTO t VALUES (42)")
+    holder.commit()
+    with app.app_context():
+        db_id = next(d["id"] for d in get_all_databases() if d["name"] == "pytest_ren.sqlite")
+    # Another connection still has the file open
+    assert client.put(f"/databases/update/{db_id}", data={"name": "pytest_moved.sqlite"}).status_code == 409
+    holder.close()
+    with app.app_context():
+        db_id = next(d["id"] for d in get_all_databases() if d["name"] == "pytest_ren.sqlite")
+    assert client.put(f"/databases/update/{db_id}", data={"name": "pytest_moved.sqlite"}).status_code == 200
+    assert not any(name.startswith("pytest_ren") for name in os.listdir("data"))
+    with sqlite3.connect(os.path.join("data", "pytest_moved.sqlite")) as db:
+        assert db.execute("SELECT x FROM t").fetchone()[0] == 42
+
+def test_writer_groups_concurrent_writes(tmp_path):
+    import sqlite3
+    import threading
+    from sqlflask.writer import WriteCoordinator
+    db_path = str(tmp_path / "writer.sqlite")
+    with sqlite3.connect(db_path) as db:
+        db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+    writer = WriteCoordinator(max_latency=0.05)
+    futures = []
+    threads = [
+        threading.Thread(target=lambda i=i: futures.append(writer.submit(db_path, ("INSERT INTO t (name) VALUES (?)", (f"n{i % 15}",)))))
+        for i in range(20)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    outcomes = [f.exception(5) for f in futures]
+    # Duplicates fail on their own without rolling back the rest of the batch
+    assert sum(isinstance(e, sqlite3.IntegrityError) for e in outcomes) == 5
+    stats = writer.stats()["writer.sqlite"]
+    assert stats["writes"] == 20 and stats["errors"] == 5
+    assert stats["batches"] < 20
+    assert writer.execute(db_path, lambda conn: conn.execute("SELECT count(*) FROM t").fetchone()[0]) == 15
+    writer.close()
+
+def test_catalog_ids_are_stable(tmp_path):
+    import sqlite3
+    from sqlflask.catalog import Catalog
+    catalog = Catalog(ttl=0)
+    for name in ("a.sqlite", "b.sqlite"):
+        with sqlite3.connect(tmp_path / name) as db:
+            db.execute("CREATE TABLE t (x)")
+    ids = {d["name"]: d["id"] for d in catalog.databases(str(tmp_path))}
+    version = catalog.version(str(tmp_path))
+    assert catalog.version(str(tmp_path)) == version  # nothing changed, nothing rewritten
+    # New files and sidecars do not renumber existing databases; a rename keeps its id
+    (tmp_path / "0.sqlite-wal").write_bytes(b"")
+    sqlite3.connect(tmp_path / "0.sqlite").close()
+    os.rename(tmp_path / "a.sqlite", tmp_path / "c.sqlite")
+    databases = {d["name"]: d for d in catalog.databases(str(tmp_path))}
+    assert databases["c.sqlite"]["id"] == ids["a.sqlite"]
+    assert databases["b.sqlite"]["id"] == ids["b.sqlite"]
+    assert databases["b.sqlite"]["table_count"] == 1 and databases["b.sqlite"]["page_count"] == 2
+    assert "a.sqlite" not in databases and catalog.version(str(tmp_path)) > version
+
+def test_maintenance_jobs_report_progress_and_savings(client):
+    import sqlite3
+    import time
+    from sqlflask.app import app
+    from sqlflask.views.databases import get_all_databases
+    from sqlflask.maintenance import maintenance
+    client.post("/databases/add", data={"name": "pytest_maint"})
+    path = os.path.join("data", "pytest_maint.sqlite")
+    with sqlite3.connect(path) as db:
+        db.execute("DROP TABLE IF EXISTS t")
+        db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, payload TEXT)")
+        db.executemany("INSERT INTO t (payload) VALUES (?)", (("x" * 1000,) for _ in range(2000)))
+        db.execute("DELETE FROM t")
+    with app.app_context():
+        db_id = next(d["id"] for d in get_all_databases() if d["name"] == "pytest_maint.sqlite")
+    for kind in ("backup", "vacuum", "optimize", "integrity"):
+        assert client.post(f"/databases/maintenance/{db_id}/{kind}").status_code == 200
+    assert client.post(f"/databases/maintenance/{db_id}/defrag").status_code == 400
+    deadline = time.monotonic() + 10
+    while any(job["state"] in ("queued", "running") for job in maintenance.jobs(os.path.abspath(path))):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    jobs = {job["kind"]: job for job in maintenance.jobs(os.path.abspath(path))}
+    assert all(job["state"] == "done" for job in jobs.values()), jobs
+    assert jobs["vacuum"]["saved_bytes"] > 1_000_000
+    response = client.get(f"/databases/maintenance/{db_id}")
+    assert b"saved" in response.data and b"hx-trigger" not in response.data
+    # Files without incremental auto-vacuum are only rewritten by the manual convert job
+    legacy = os.path.abspath(os.path.join("data", "pytest_legacy.sqlite"))
+    if os.path.exists(legacy):
+        os.remove(legacy)
+    with sqlite3.connect(legacy) as db:
+        db.execute("CREATE TABLE t (payload TEXT)")
+        db.executemany("INSERT INTO t VALUES (?)", (("x" * 1000,) for _ in range(500)))
+        db.execute("DELETE FROM t")
+    for kind in ("vacuum", "convert"):
+        maintenance.submit(legacy, kind)
+        while any(job["state"] in ("queued", "running") for job in maintenance.jobs(legacy)):
+            assert time.monotonic() < deadline + 10
+            time.sleep(0.05)
+    jobs = {job["kind"]: job for job in maintenance.jobs(legacy)}
+    assert jobs["vacuum"]["message"].startswith("skipped") and jobs["vacuum"]["saved_bytes"] == 0
+    assert jobs["convert"]["saved_bytes"] > 0
+    with sqlite3.connect(legacy) as db:
+        assert db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def test_large_column_drop_runs_in_background(client):
+    import sqlite3
+    import time
+    from sqlflask.migrations import migrations
+    _fresh_database("pytest_migrate.sqlite")
+    db_path = _seed_table("pytest_migrate.sqlite", "wide", 0)
+    with sqlite3.connect(db_path) as db:
+        db.execute("ALTER TABLE wide ADD COLUMN extra TEXT")
+        db.execute("ALTER TABLE wide ADD COLUMN note TEXT")
+        db.execute("CREATE INDEX wide_note ON wide (note)")
+        db.executemany("INSERT INTO wide (name, extra, note) VALUES (?, ?, ?)", ((f"n{i}", "x", f"{i % 7}") for i in range(3000)))
+    with client.session_transaction() as sess:
+        sess["current_database"] = "pytest_migrate.sqlite"
+        sess["current_table"] = "wide"
+    migrations.background_rows, migrations.chunk_rows, migrations.pause = 1000, 500, 0.05
+    try:
+        # Dropping an indexed column is refused up front, as SQLite would
+        assert client.delete("/columns/delete/3").status_code == 400
+        response = client.delete("/columns/delete/2")
+        assert response.status_code == 200 and b'id="migration"' in response.data
+        with sqlite3.connect(db_path) as db:
+            db.execute("INSERT INTO wide (name, extra, note) VALUES ('late', 'y', '1')")
+            db.execute("DELETE FROM wide WHERE id = 1")
+        assert client.post("/columns/add", data={"name": "blocked"}).status_code == 409
+        deadline = time.monotonic() + 10
+        while b"hx-trigger" in client.get("/columns/migration").data:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+    finally:
+        migrations.background_rows, migrations.chunk_rows, migrations.pause = 100_000, 5_000, 0.01
+    assert migrations.job(os.path.abspath(db_path), "wide")["state"] == "done"
+    with sqlite3.connect(db_path) as db:
+        assert [row[1] for row in db.execute("PRAGMA table_info(wide)")] == ["id", "name", "note"]
+        assert db.execute("SELECT count(*), max(name) FROM wide WHERE id > 1").fetchone() == (3000, "n999")
+        # Only the audit log of the drop is left behind, no shadow table or capture triggers
+        assert db.execute(
+            "SELECT name FROM sqlite_master WHERE name LIKE '_sqlflask_%' "
+            "AND name NOT IN ('_sqlflask_operations', '_sqlflask_changes', '_sqlflask_column_values')"
+        ).fetchall() == []
+        assert db.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall() == [("wide_note",)]
+        # The log holds the dropped values as they were at the swap, including concurrent writes
+        assert db.execute("SELECT count(*), max(value) FROM _sqlflask_column_values").fetchone() == (3000, "y")
+
+def test_profiling_is_incremental_and_shown_in_views(client):
+    import sqlite3
+    from sqlflask.profiling import profile_database, HyperLogLog
+    hll = HyperLogLog()
+    for i in range(20_000):
+        hll.add(f"v{i}")
+    assert abs(hll.count() - 20_000) < 20_000 * 0.05
+    _fresh_database("pytest_profile.sqlite")
+    db_path = _seed_table("pytest_profile.sqlite", "people", 0)
+    with sqlite3.connect(db_path) as db:
+        db.executemany("INSERT INTO people (name) VALUES (?)", [("ann",)] * 50 + [("bob",)] * 30 + [(None,)] * 20)
+    assert profile_database(db_path, lambda *a: None)["message"] == "1 tables profiled, 1 in full"
+    with sqlite3.connect(db_path) as db:
+        db.executemany("INSERT INTO people (name) VALUES (?)", [("cy",)] * 10)
+    # Only the new rows are read and merged into the stored summaries
+    assert profile_database(db_path, lambda *a: None)["message"] == "1 tables profiled, 0 in full"
+    with client.session_transaction() as sess:
+        sess["current_database"] = "pytest_profile.sqlite"
+        sess["current_table"] = "people"
+    response = client.get("/tables/", headers={"HX-Request": "true"})
+    assert b"110 rows" in response.data
+    assert b"_sqlflask_" not in response.data
+    response = client.get("/columns/", headers={"HX-Request": "true"}).data.decode()
+    assert "18% null, ~3 distinct" in response and "top: ann (50), bob (30), cy (10)" in response
+    with sqlite3.connect(db_path) as db:
+        db.execute("DELETE FROM people WHERE name = 'cy'")
+    assert profile_database(db_path, lambda *a: None)["message"] == "1 tables profiled, 1 in full"
+    # Reused rowids and a recreated table are not merged into the old summaries either
+    with sqlite3.connect(db_path) as db:
+        db.execute("DELETE FROM people WHERE id = 100")
+        db.execute("INSERT INTO people (name) VALUES ('dee')")
+    assert profile_database(db_path, lambda *a: None)["message"] == "1 tables profiled, 1 in full"
+    _seed_table("pytest_profile.sqlite", "people", 100)
+    assert profile_database(db_path, lambda *a: None)["message"] == "1 tables profiled, 1 in full"
+    assert profile_database(db_path, lambda *a: None)["message"] == "1 tables profiled, 0 in full"
+
+def test_search_index_follows_writes(client):
+    _fresh_database("pytest_search.sqlite")
+    db_path = _seed_table("pytest_search.sqlite", "notes", 0)
+    with client.session_transaction() as sess:
+        sess["current_database"] = "pytest_search.sqlite"
+        sess["current_table"] = "notes"
+    client.post("/data-entry/notes", data={"name": "quarterly revenue report"})
+    assert b'value="name"' in client.get("/columns/").data
+    assert client.post("/search/index", data={"columns": ["id"]}).status_code == 400
+    assert client.post("/search/index", data={"columns": ["name"]}).status_code == 302
+    # Rows written after the index was built are picked up by its triggers
+    client.post("/data-entry/notes", data={"name": "revenue forecast <draft>"})
+    response = client.get("/search/?q=reven").data.decode()
+    assert response.count("<mark>revenue</mark>") == 2 and "&lt;draft&gt;" in response
+    client.post("/data-delete/notes/1")
+    assert "quarterly" not in client.get("/search/?q=revenue").data.decode()
+    assert b"No matches" in client.get('/search/?q="AND OR').data
+    assert client.delete("/columns/delete/1").status_code == 409
+    client.put("/tables/update/0", data={"name": "memos"})
+    assert "<td>memos</td>" in client.get("/search/?q=forecast").data.decode()
+    # The update trigger fires for the indexed columns and the rowid alias only
+    import sqlite3
+    with sqlite3.connect(db_path) as db:
+        trigger = db.execute("SELECT sql FROM sqlite_master WHERE name = '_sqlflask_fts_memos_update'").fetchone()[0]
+        db.execute("UPDATE memos SET id = 50")
+    assert 'AFTER UPDATE OF "name", "id"' in trigger
+    assert ">50</a>" in client.get("/search/?q=forecast").data.decode()
+
+def test_app_factory_starts_without_heavy_imports(tmp_path):
+    import subprocess
+    import sys
+    from sqlflask.app import create_app
+    other = create_app({"TEMPLATE_CACHE_DIR": str(tmp_path), "DATA_DIR": str(tmp_path)})
+    assert other is not app and "search.index" in {rule.endpoint for rule in other.url_map.iter_rules()}
+    with other.test_client() as client:
+        assert client.get("/databases/").status_code == 200
+    assert any(tmp_path.glob("*.cache"))
+    code = "import sys, sqlflask.app; print(sorted({'polars', 'pyarrow', 'pandas', 'sentry_sdk'} & set(sys.modules)))"
+    env = {**os.environ, "SENTRY_DSN": ""}
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env).stdout.strip() == "[]"
+
+def test_summaries_follow_writes_and_rebuild(client):
+    import sqlite3
+    db_path = _seed_table("pytest_summary.sqlite", "orders", 0)
+    with sqlite3.connect(db_path) as db:
+        db.execute("ALTER TABLE orders ADD COLUMN amount REAL")
+        db.executemany("INSERT INTO orders (name, amount) VALUES (?, ?)", [("ann", 5), ("bob", 3), ("ann", 7)])
+    with client.session_transaction() as sess:
+        sess["current_database"] = "pytest_summary.sqlite"
+        sess["current_table"] = "orders"
+    form = {"name": "by_name", "table": "orders", "group_by": "name", "aggregates": "count, sum:amount, max:amount"}
+    assert client.post("/summaries/declare", data=form).status_code == 200
+    assert client.post("/summaries/declare", data={**form, "aggregates": "avg:amount"}).status_code == 400
+    client.post("/summaries/declare", data={"name": "total", "table": "orders", "aggregates": "count"})
+    client.put("/relationships/update/3", data={"name": "bob"})
+    client.post("/data-delete/orders/2")
+    from sqlflask.summaries import read, check
+    with sqlite3.connect(db_path) as db:
+        assert read(db, "by_name") == [{"group": "ann", "count": 1, "sum_amount": 5.0, "max_amount": 5.0},
+                                       {"group": "bob", "count": 1, "sum_amount": 7.0, "max_amount": 7.0}]
+        # Drift, e.g. from writes made while the triggers were missing, is repaired by a rebuild
+        db.execute("UPDATE _sqlflask_summary_by_name SET n = 99")
+    assert b"2 groups drifted" in client.get("/summaries/check/by_name").data
+    client.post("/summaries/rebuild/by_name")
+    with sqlite3.connect(db_path) as db:
+        assert check(db, "by_name") == []
+    assert b"2 rows" in client.get("/tables/", headers={"HX-Request": "true"}).data
+    assert client.delete("/columns/delete/2").status_code == 409
+
+def test_replica_pulls_page_deltas_and_serves_reads(tmp_path):
+    import sqlite3
+    import subprocess
+    import sys
+    import pytest
+    from sqlflask.app import create_app
+    from sqlflask.replication import ReplicationError, ReplicationServer, read_status
+    db_path = _seed_table("pytest_primary.sqlite", "items", 2000)
+    # Held open like the app's pool does, so the WAL persists between pulls
+    writer = sqlite3.connect(db_path, isolation_level=None)
+    writer.execute("PRAGMA journal_mode = WAL")
+    writer.execute("UPDATE items SET name = 'first' WHERE id = 1")
+    with pytest.raises(ReplicationError):
+        ReplicationServer("data", "0.0.0.0:0").start()
+    primary = ReplicationServer("data", "127.0.0.1:0", secret="s3cret")
+    assert primary.start()
+    replica_dir = tmp_path / "replica"
+    pull = [sys.executable, "-m", "sqlflask.replication", "replica", "--once",
+            "--address", "%s:%d" % primary.address, "--replica-dir", str(replica_dir)]
+    try:
+        assert subprocess.run(pull + ["--secret", "wrong"], capture_output=True).returncode != 0
+        subprocess.run(pull + ["--secret", "s3cret"], check=True, capture_output=True)
+        full = read_status(replica_dir)["pytest_primary.sqlite"]
+        read = primary.stats()["pytest_primary.sqlite"]["pages_read"]
+        writer.execute("UPDATE items SET name = 'changed' WHERE id = 1500")
+        subprocess.run(pull + ["--secret", "s3cret"], check=True, capture_output=True)
+    finally:
+        primary.stop()
+    entry = read_status(replica_dir)["pytest_primary.sqlite"]
+    # The second pull only read and shipped the changed pages
+    assert entry["syncs"] == 2 and 0 < entry["pages"] - full["pages"] < full["pages"] / 4
+    assert primary.stats()["pytest_primary.sqlite"]["pages_read"] - read < full["pages"] / 4
+    with sqlite3.connect(replica_dir / "pytest_primary.sqlite") as db:
+        assert db.execute("SELECT name FROM items WHERE id = 1500").fetchone()[0] == "changed"
+        assert db.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+
+    other = create_app({"REPLICATION_ROLE": "replica", "REPLICATION_REPLICA_DIR": str(replica_dir),
+                        "REPLICATION_MAX_LAG": 3600, "TEMPLATE_CACHE_DIR": None})
+    with other.test_client() as client:
+        with client.session_transaction() as sess:
+            sess["current_database"] = "pytest_primary.sqlite"
+            sess["current_table"] = "items"
+        # Reads come from the replica, writes still go to the primary file
+        writer.execute("DELETE FROM items WHERE id > 10")
+        assert b"row1999" in client.get("/data-list/items?after=1990").data
+        client.post("/data-entry/items", data={"name": "fresh"})
+        with sqlite3.connect(db_path) as db:
+            assert db.execute("SELECT count(*) FROM items").fetchone()[0] == 11
+        assert 'sqlflask_replication_syncs_total{db="pytest_primary.sqlite"} 2' in client.get("/metrics").data.decode()
+    writer.close()
+
+def test_history_undoes_and_redoes_edits(client):
+    import sqlite3
+    from sqlflask.changelog import operations
+    _fresh_database("pytest_history.sqlite")
+    db_path = _seed_table("pytest_history.sqlite", "people", 3)
+    with sqlite3.connect(db_path) as db:
+        db.execute("ALTER TABLE people ADD COLUMN note BLOB")
+        db.execute("UPDATE people SET note = x'00ff' WHERE id = 2")
+    with client.session_transaction() as sess:
+        sess["current_database"] = "pytest_history.sqlite"
+        sess["current_table"] = "people"
+    client.put("/relationships/update/1", data={"name": "renamed"})
+    client.post("/data-delete/people/2")
+    client.delete("/columns/delete/2")
+    with sqlite3.connect(db_path) as db:
+        ops = operations(db)
+    assert [op["label"] for op in ops] == ["drop column people.note", "delete people #2", "update people #1"]
+    # Undo the column drop, then the delete: the row comes back with its blob
+    for op in ops[:2]:
+        assert client.post(f"/history/undo/{op['id']}").status_code == 200
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT name, note FROM people WHERE id = 2").fetchone() == ("row1", b"\x00\xff")
+    assert client.post(f"/history/undo/{ops[1]['id']}").status_code == 409
+    # An operation whose rows were edited later cannot be undone over the newer edit
+    client.put("/relationships/update/1", data={"name": "newer"})
+    assert client.post(f"/history/undo/{ops[2]['id']}").status_code == 409
+    assert client.post(f"/history/redo/{ops[1]['id']}").status_code == 200
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT count(*) FROM people WHERE id = 2").fetchone()[0] == 0
+    assert b"<s>drop column people.note</s>" in client.get("/history/").data